@@ -4,18 +4,64 @@ import os
 import sys
 from pathlib import Path
 
-from flask import Flask, jsonify, send_from_directory
-
-from backend.config import DEBUG, PORT, SECRET_KEY, STATIC_FOLDER
+import redis
+from flask import Flask, Response, jsonify, send_from_directory
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from backend.config import (
+    ASYNC_MODE,
+    DEBUG,
+    PORT,
+    PROFILING_ENABLED,
+    REDIS_TIMEOUT,
+    SECRET_KEY,
+    SOCKETIO_CHANNEL,
+    SOCKETIO_LOGGER,
+    SOCKETIO_MESSAGE_QUEUE,
+    STATIC_FOLDER,
+)
+from backend.database import db
+from backend.database.users import user_cache
+from backend.database.windows import checkpoint_cache
 from backend.extensions import socketio
+from backend.routes.admin import admin_bp
+from backend.routes.analytics import analytics_bp
 from backend.routes.auth import auth_bp
+from backend.routes.formulas import formulas_bp
 from backend.routes.spreadsheet import spreadsheet_bp
+from backend.routes.transfer import transfer_bp
+from backend.routes.workbooks import workbooks_bp
+from backend.utils import compression, metrics, profiling
+from backend.utils.cache import response_cache
 
 # Add the root directory to the Python path
 root_dir = str(Path(__file__).parent.parent)
 sys.path.append(root_dir)
 
 
+def message_queue(url=SOCKETIO_MESSAGE_QUEUE):
+    """Get the Socket.IO message queue to use, or None to emit in-process.
+
+    A Redis queue that cannot be reached at startup is dropped with a warning
+    instead of silently losing every broadcast.
+    """
+    if not url or not url.startswith(("redis://", "rediss://", "unix://")):
+        return url
+    try:
+        client = redis.Redis.from_url(url, socket_connect_timeout=REDIS_TIMEOUT)
+        try:
+            client.ping()
+        finally:
+            client.close()
+    except redis.RedisError as e:
+        print(
+            f"Warning: Socket.IO message queue unreachable, "
+            f"broadcasting to this process only: {str(e)}"
+        )
+        return None
+    return url
+
+
 def create_app():
     """Create and configure the Flask application."""
     # Ensure static folder exists
@@ -28,25 +74,60 @@ def create_app():
     socketio.init_app(
         app,
         cors_allowed_origins="*",
-        async_mode="threading",
+        async_mode=ASYNC_MODE,  # threading, or eventlet/gevent via serve.py
         ping_timeout=20,  # Match frontend timeout
         ping_interval=10,  # More frequent pings
-        logger=True,
-        engineio_logger=True,
+        logger=SOCKETIO_LOGGER,
+        engineio_logger=SOCKETIO_LOGGER,
         allow_upgrades=True,  # Allow WebSocket upgrades
         transports=["websocket", "polling"],  # Match frontend transports
         max_http_buffer_size=1e8,  # Increase buffer size
         async_handlers=True,  # Enable async handlers
+        # Emits go through Redis so every replica delivers them to its clients
+        message_queue=message_queue(),
+        channel=SOCKETIO_CHANNEL,
     )
 
+    # Resolve each request's workbook and return its cursor when the context ends
+    db.init_app(app)
+
+    # Time every request for /metrics
+    metrics.init_app(app)
+
+    # Profile requests on demand (X-Profile header or /admin/profiling)
+    if PROFILING_ENABLED:
+        profiling.init_app(app)
+
+    # gzip/brotli responses for clients that accept them
+    compression.init_app(app)
+
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(spreadsheet_bp)
+    app.register_blueprint(transfer_bp)
+    app.register_blueprint(analytics_bp)
+    app.register_blueprint(formulas_bp)
+    app.register_blueprint(workbooks_bp)
+    app.register_blueprint(admin_bp)
 
     # Add health check endpoint
     @app.route("/health")
     def health():
-        return jsonify({"status": "healthy"}), 200
+        return jsonify(
+            {
+                "status": "healthy",
+                "workbooks": db.workbooks.stats(),
+                "response_cache": response_cache.stats(),
+                "compressed_cache": compression.compressed_cache.stats(),
+                "user_cache": user_cache.stats(),
+                "checkpoint_cache": checkpoint_cache.stats(),
+            }
+        ), 200
+
+    # Prometheus scrape endpoint
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return Response(generate_latest(), content_type=CONTENT_TYPE_LATEST)
 
     # Add route for root URL to serve index.html
     @app.route("/")
@@ -2,16 +2,84 @@
 
 from .config import (
     ACTIVE_USERS_KEY,
+    ADMIN_USERS,
+    ASYNC_MODE,
+    CHANGE_LOG_RETENTION,
+    COMPRESS_BROTLI_QUALITY,
+    COMPRESS_CACHE_MAX_BYTES,
+    COMPRESS_GZIP_LEVEL,
+    COMPRESS_MIN_BYTES,
+    DB_AUTO_MIGRATE,
     DB_PATH,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_ROLE,
+    DB_WORKER_THREADS,
     DEBUG,
+    DEFAULT_WORKBOOK,
+    DELTA_MAX_ROWS,
+    DEVELOPMENT,
+    EXPORT_BATCH_ROWS,
     HOST,
+    IMPORT_DIR,
     LOCK_KEY,
+    MAX_WORKBOOKS,
+    PASSWORD_HASH_TIMEOUT,
+    PASSWORD_HASH_WORKERS,
     PORT,
+    PROFILE_DIR,
+    PROFILE_INTERVAL,
+    PROFILE_MAX_SECONDS,
+    PROFILING_ENABLED,
     REDIS_DB,
+    REDIS_HEALTH_CHECK_INTERVAL,
     REDIS_HOST,
+    REDIS_MAX_CONNECTIONS,
     REDIS_PORT,
+    REDIS_RETRY_INTERVAL,
     REDIS_TIMEOUT,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_REDIS,
+    RESPONSE_CACHE_TTL,
+    ROWS_CHECKPOINT_CACHE_SIZE,
+    ROWS_CHECKPOINT_INTERVAL,
+    SALES_MAX_PAGE_SIZE,
+    SALES_PAGE_SIZE,
+    SEARCH_CANDIDATES,
+    SEARCH_COMPACT_MIN_POSTINGS,
+    SEARCH_MAX_PAGE_SIZE,
+    SEARCH_PAGE_SIZE,
+    SEARCH_UNSORTED_RATIO,
     SECRET_KEY,
+    SNAPSHOT_DIR,
+    SNAPSHOT_INTERVAL,
+    SNAPSHOT_KEEP,
+    SNAPSHOT_MAX_LOAD,
+    SNAPSHOT_POLL_INTERVAL,
+    SNAPSHOT_WAIT_TIMEOUT,
+    SOCKETIO_CHANNEL,
+    SOCKETIO_LOGGER,
+    SOCKETIO_MESSAGE_QUEUE,
     STATIC_FOLDER,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL,
+    WORKBOOK_CACHE_SIZE,
+    WORKBOOK_DIR,
+    WORKBOOK_IDLE_TIMEOUT,
+    WORKBOOKS_PER_USER,
+    WRITE_BATCH_MAX_ROWS,
+    WRITE_LOCK_HANDOFF_TTL,
+    WRITE_LOCK_REQUIRED,
+    WRITE_LOCK_TTL,
     WRITE_QUEUE_KEY,
+    WRITE_QUEUE_SET_KEY,
+    WRITE_QUEUE_SINCE_KEY,
+    WRITE_TIMEOUT,
+    WRITER_AUTHKEY,
+    WRITER_BATCH_DELAY,
+    WRITER_BATCH_MAX,
+    WRITER_HOST,
+    WRITER_MAX_MESSAGE,
+    WRITER_PORT,
+    WRITER_SOCKET,
 )
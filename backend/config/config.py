@@ -1,6 +1,7 @@
 """Configuration settings for the application."""
 
 import os
+import tempfile
 
 # Get the absolute path to the project root directory
 PROJECT_ROOT = os.path.dirname(
@@ -10,9 +11,15 @@ print(f"Project root directory: {PROJECT_ROOT}")
 
 # Flask settings
 SECRET_KEY = os.environ.get("SECRET_KEY", "dev")
+# FLASK_ENV=development allows insecure defaults meant for a local machine
+DEVELOPMENT = os.environ.get("FLASK_ENV") == "development"
 DEBUG = os.environ.get("FLASK_DEBUG", "True").lower() == "true"
 HOST = os.environ.get("FLASK_HOST", "127.0.0.1")
 PORT = int(os.environ.get("FLASK_PORT", 5000))
+# Socket.IO server model: threading (Werkzeug dev server), eventlet or gevent
+ASYNC_MODE = os.environ.get("ASYNC_MODE", "threading")
+# Log every Socket.IO and Engine.IO packet (costly with many connected clients)
+SOCKETIO_LOGGER = os.environ.get("SOCKETIO_LOGGER", "True").lower() == "true"
 
 # Static files
 STATIC_FOLDER = os.path.join(PROJECT_ROOT, "frontend")
@@ -24,18 +31,153 @@ if os.path.exists(STATIC_FOLDER):
 # Database settings
 DB_DIR = os.path.join(PROJECT_ROOT, "database")
 os.makedirs(DB_DIR, exist_ok=True)
-DB_PATH = os.path.join(DB_DIR, "spreadsheet.db")
+DB_PATH = os.environ.get("DB_PATH", os.path.join(DB_DIR, "spreadsheet.db"))
+# Other workbooks are DuckDB files in WORKBOOK_DIR; DEFAULT_WORKBOOK is DB_PATH
+# and also holds the user accounts
+WORKBOOK_DIR = os.environ.get("WORKBOOK_DIR", os.path.join(DB_DIR, "workbooks"))
+DEFAULT_WORKBOOK = os.environ.get("DEFAULT_WORKBOOK", "default")
+# Workbooks kept open per process, and seconds an unused one stays open
+WORKBOOK_CACHE_SIZE = int(os.environ.get("WORKBOOK_CACHE_SIZE", 16))
+WORKBOOK_IDLE_TIMEOUT = int(os.environ.get("WORKBOOK_IDLE_TIMEOUT", 300))
+# Workbooks a user may create, and that may be created in all
+WORKBOOKS_PER_USER = int(os.environ.get("WORKBOOKS_PER_USER", 10))
+MAX_WORKBOOKS = int(os.environ.get("MAX_WORKBOOKS", 500))
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+# Apply pending schema migrations in create_app(); disable when a deploy step
+# runs `python migrate.py` before rollout instead
+DB_AUTO_MIGRATE = os.environ.get("DB_AUTO_MIGRATE", "True").lower() == "true"
+# OS threads that run blocking DuckDB calls off the eventlet/gevent event loop
+DB_WORKER_THREADS = int(os.environ.get("DB_WORKER_THREADS", DB_POOL_SIZE))
+# The writer thread commits whatever writes arrive within this window together
+WRITER_BATCH_DELAY = float(os.environ.get("WRITER_BATCH_DELAY_MS", 2)) / 1000
+WRITER_BATCH_MAX = int(os.environ.get("WRITER_BATCH_MAX", 256))
+# Seconds a request waits for its write to be committed
+WRITE_TIMEOUT = float(os.environ.get("WRITE_TIMEOUT", 30))
+
+# Process role. "standalone" owns the database files and serves everything.
+# To scale reads across workers, run one "writer" (write_server.py), which
+# applies every write and publishes snapshots, and any number of "reader"
+# web workers, which query the snapshots and send writes to the writer.
+DB_ROLE = os.environ.get("DB_ROLE", "standalone")
+WRITER_HOST = os.environ.get("WRITER_HOST", "127.0.0.1")
+WRITER_PORT = int(os.environ.get("WRITER_PORT", 5055))
+# Unix socket path; when set, the writer listens there instead of on TCP
+WRITER_SOCKET = os.environ.get("WRITER_SOCKET") or None
+# Secret shared by the writer and its readers; required outside development
+WRITER_AUTHKEY = os.environ.get("WRITER_AUTHKEY", "")
+# Largest request or reply, in bytes, passed between a reader and the writer
+WRITER_MAX_MESSAGE = int(os.environ.get("WRITER_MAX_MESSAGE", 256 * 1024 * 1024))
+# Snapshots are read-only copies of each workbook, published at most every
+# SNAPSHOT_INTERVAL after a commit; readers look for a newer one at most
+# every SNAPSHOT_POLL_INTERVAL and SNAPSHOT_KEEP are kept per workbook
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(DB_DIR, "snapshots"))
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL_MS", 1000)) / 1000
+SNAPSHOT_POLL_INTERVAL = float(os.environ.get("SNAPSHOT_POLL_INTERVAL_MS", 100)) / 1000
+SNAPSHOT_KEEP = int(os.environ.get("SNAPSHOT_KEEP", 3))
+# Largest share of the writer's time spent copying snapshots, unless a reader
+# is waiting for one; publishing backs off as copies grow slower
+SNAPSHOT_MAX_LOAD = float(os.environ.get("SNAPSHOT_MAX_LOAD", 0.5))
+# How long a read waits for a snapshot holding the version it must see
+SNAPSHOT_WAIT_TIMEOUT = float(os.environ.get("SNAPSHOT_WAIT_TIMEOUT_MS", 10000)) / 1000
+
+# Login fast path: user records cached per process (0 disables the cache),
+# and worker processes that hash passwords (0 hashes on the request thread)
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 1024))
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 300))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 30))
+
+# Sales read paging
+SALES_PAGE_SIZE = int(os.environ.get("SALES_PAGE_SIZE", 1000))
+SALES_MAX_PAGE_SIZE = int(os.environ.get("SALES_MAX_PAGE_SIZE", 5000))
+WRITE_BATCH_MAX_ROWS = int(os.environ.get("WRITE_BATCH_MAX_ROWS", 5000))
+# /rows windows start from a checkpoint taken every this many rows; the
+# checkpoints of this many orderings (and data versions) are kept
+ROWS_CHECKPOINT_INTERVAL = int(os.environ.get("ROWS_CHECKPOINT_INTERVAL", 1000))
+ROWS_CHECKPOINT_CACHE_SIZE = int(os.environ.get("ROWS_CHECKPOINT_CACHE_SIZE", 64))
+SEARCH_PAGE_SIZE = int(os.environ.get("SEARCH_PAGE_SIZE", 20))
+SEARCH_MAX_PAGE_SIZE = int(os.environ.get("SEARCH_MAX_PAGE_SIZE", 200))
+# Newest matches of the rarest query word that a search ranks
+SEARCH_CANDIDATES = int(os.environ.get("SEARCH_CANDIDATES", 10000))
+# The search index is re-sorted once the postings appended since it was last
+# sorted exceed this share of it (and SEARCH_COMPACT_MIN_POSTINGS)
+SEARCH_UNSORTED_RATIO = float(os.environ.get("SEARCH_UNSORTED_RATIO", 0.1))
+SEARCH_COMPACT_MIN_POSTINGS = int(os.environ.get("SEARCH_COMPACT_MIN_POSTINGS", 10000))
+
+# Uploaded import files are written here
+IMPORT_DIR = os.environ.get("IMPORT_DIR", tempfile.gettempdir())
+# Rows per batch when streaming exports
+EXPORT_BATCH_ROWS = int(os.environ.get("EXPORT_BATCH_ROWS", 65536))
+
+# On-demand profiling (see backend/utils/profiling.py); off unless enabled
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "False").lower() == "true"
+PROFILE_DIR = os.environ.get(
+    "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "spreadsheet-profiles")
+)
+# Seconds between stack samples, and the longest process-wide session
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", 2)) / 1000
+PROFILE_MAX_SECONDS = int(os.environ.get("PROFILE_MAX_SECONDS", 300))
+
+# Delta sync: rows are pushed inline with data_updated up to this many, and the
+# change log keeps at least this many versions for /read?since=
+DELTA_MAX_ROWS = int(os.environ.get("DELTA_MAX_ROWS", 50))
+CHANGE_LOG_RETENTION = int(os.environ.get("CHANGE_LOG_RETENTION", 100000))
+
+# Versioned response cache for read endpoints; set RESPONSE_CACHE_REDIS to
+# share entries (and the data version) between pods through Redis
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+)
+RESPONSE_CACHE_REDIS = os.environ.get("RESPONSE_CACHE_REDIS", "False").lower() == "true"
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 300))
+
+# Response compression (gzip, and brotli when the brotli package is installed)
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 5))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 4))
+# Compressed bodies of cached (ETagged) responses are kept for reuse
+COMPRESS_CACHE_MAX_BYTES = int(
+    os.environ.get("COMPRESS_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+)
 
 # Redis settings
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", 6379))
 REDIS_DB = int(os.environ.get("REDIS_DB", 0))
 REDIS_TIMEOUT = int(os.environ.get("REDIS_TIMEOUT", 5))
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 50))
+# Seconds a pooled connection may sit idle before it is pinged on reuse
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", 30))
+# Seconds to wait before reconnecting after Redis was unreachable
+REDIS_RETRY_INTERVAL = int(os.environ.get("REDIS_RETRY_INTERVAL", 5))
 
-# Redis Keys
-LOCK_KEY = "spreadsheet_lock"
+# Socket.IO message queue shared by every replica, e.g. redis://localhost:6379/0
+# (unset for a single process)
+SOCKETIO_MESSAGE_QUEUE = os.environ.get("SOCKETIO_MESSAGE_QUEUE") or None
+SOCKETIO_CHANNEL = os.environ.get("SOCKETIO_CHANNEL", "spreadsheet-socketio")
+
+# Redis Keys (the write lock and queue keys get a ":<workbook>" suffix outside
+# the default workbook)
+LOCK_KEY = "write_lock"
 ACTIVE_USERS_KEY = "active_users"
 WRITE_QUEUE_KEY = "write_queue"
+WRITE_QUEUE_SET_KEY = "write_queue_members"
+WRITE_QUEUE_SINCE_KEY = "write_queue_since"
+
+# Usernames allowed to use the /admin endpoints
+ADMIN_USERS = {
+    name.strip()
+    for name in os.environ.get("ADMIN_USERS", "").split(",")
+    if name.strip()
+}
+
+# Writes are guarded per row by row_version checks. Set WRITE_LOCK_REQUIRED to
+# also require the global write lock (one editor at a time) on every write.
+WRITE_LOCK_REQUIRED = os.environ.get("WRITE_LOCK_REQUIRED", "False").lower() == "true"
+# Write lock lifetime in seconds, and for a lock handed to the next user in line
+WRITE_LOCK_TTL = int(os.environ.get("WRITE_LOCK_TTL", 60))
+WRITE_LOCK_HANDOFF_TTL = int(os.environ.get("WRITE_LOCK_HANDOFF_TTL", 10))
 
 # Application Settings
 DEBUG = True
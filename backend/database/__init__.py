@@ -1,7 +1,17 @@
 """Database package initialization."""
 
-from .db import get_db
+from .db import (
+    get_db,
+    get_pool_stats,
+    get_writer_stats,
+    open_workbook,
+    pooled_connection,
+    workbooks,
+    writer,
+)
 from .redis_client import (
+    check_write_access,
+    get_queue_position,
     get_queue_status,
     get_redis,
     release_write_access,
@@ -10,8 +20,16 @@ from .redis_client import (
 
 __all__ = [
     "get_db",
+    "get_pool_stats",
+    "get_writer_stats",
+    "open_workbook",
+    "pooled_connection",
+    "workbooks",
+    "writer",
     "get_redis",
     "get_queue_status",
+    "get_queue_position",
+    "check_write_access",
     "request_write_access",
     "release_write_access",
 ]
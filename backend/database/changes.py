@@ -0,0 +1,123 @@
+"""Sales change log and data versioning for incremental client sync."""
+
+import json
+
+from backend.config.config import CHANGE_LOG_RETENTION
+from backend.database.sales import ID_INDEX, READ_COLUMNS
+from backend.utils.metrics import timed_query
+
+# Prune the change log once every this many versions
+PRUNE_INTERVAL = 1000
+
+
+@timed_query("get_data_version", lambda version: 1)
+def get_data_version(db):
+    """Get the current data version (0 before the first change)."""
+    row = db.execute("SELECT COALESCE(MAX(version), 0) FROM sales_changes").fetchone()
+    return row[0]
+
+
+@timed_query("record_changes", lambda version: 1)
+def record_changes(db, sale_ids, operation):
+    """Log a change for each sale id and return the new data version.
+
+    Call inside the transaction that modifies ``sales`` so the rows and their
+    versions commit together.
+    """
+    if not sale_ids:
+        return get_data_version(db)
+    versions = db.execute(
+        """
+        INSERT INTO sales_changes (version, sale_id, operation)
+        SELECT nextval('sales_change_seq'), unnest(from_json(?, '["BIGINT"]')), ?
+        RETURNING version
+        """,
+        (json.dumps(list(sale_ids)), operation),
+    ).fetchall()
+    version = max(v[0] for v in versions)
+    if version // PRUNE_INTERVAL != (version - len(versions)) // PRUNE_INTERVAL:
+        prune_changes(db, version)
+    return version
+
+
+def record_reset(db):
+    """Log a bulk change that clients should answer with a full reload.
+
+    Used where logging every row would cost more than re-reading, such as
+    file imports.
+    """
+    version = db.execute(
+        """
+        INSERT INTO sales_changes (version, sale_id, operation)
+        VALUES (nextval('sales_change_seq'), 0, 'reset')
+        RETURNING version
+        """
+    ).fetchone()[0]
+    return version
+
+
+def prune_changes(db, version):
+    """Drop change log entries older than the retention window."""
+    db.execute(
+        "DELETE FROM sales_changes WHERE version <= ?",
+        (version - CHANGE_LOG_RETENTION,),
+    )
+
+
+@timed_query("get_rows")
+def get_rows(db, sale_ids):
+    """Fetch the current grid rows for the given sale ids."""
+    if not sale_ids:
+        return []
+    return db.execute(
+        f"""
+        SELECT {", ".join(READ_COLUMNS)}
+        FROM sales
+        WHERE id IN (SELECT unnest(from_json(?, '["BIGINT"]')))
+        """,
+        (json.dumps(list(sale_ids)),),
+    ).fetchall()
+
+
+@timed_query("get_changes_since", lambda result: len(result[1]))
+def get_changes_since(db, since):
+    """Get everything that changed after ``since``.
+
+    Returns ``(version, changes, reset)``. ``changes`` holds one entry per sale
+    with its latest operation and current row. ``reset`` is True when the
+    client's version has fallen out of the change log and it must reload.
+    """
+    version, oldest = db.execute(
+        "SELECT COALESCE(MAX(version), 0), MIN(version) FROM sales_changes"
+    ).fetchone()
+    if since >= version:
+        return version, [], False
+    if oldest is not None and since < oldest - 1:
+        return version, [], True
+
+    changed = db.execute(
+        """
+        SELECT sale_id, arg_max(operation, version)
+        FROM sales_changes
+        WHERE version > ? AND version <= ?
+        GROUP BY sale_id
+        """,
+        (since, version),
+    ).fetchall()
+    operations = dict(changed)
+    if "reset" in operations.values():
+        return version, [], True
+    return version, build_changes(db, operations), False
+
+
+def build_changes(db, operations):
+    """Turn a {sale_id: operation} mapping into change entries for clients."""
+    rows = {row[ID_INDEX]: row for row in get_rows(db, list(operations))}
+    changes = []
+    for sale_id, operation in operations.items():
+        row = rows.get(sale_id)
+        if row is None:
+            changes.append({"op": "delete", "id": sale_id})
+        else:
+            changes.append({"op": operation, "id": sale_id, "row": row})
+    return changes
@@ -0,0 +1,112 @@
+"""Columnar encoding of sales pages for ``/read?format=columnar``.
+
+The row format sends one JSON array per row, so field names are implicit
+and each cell becomes a Python object before jsonify walks it. The columnar
+format sends one array per column. Low-cardinality string columns are
+dictionary-encoded as ``{"dictionary": [...], "codes": [...]}``. The page
+is fetched from DuckDB as Arrow and encoded with ``orjson`` when it is
+installed. Both come with the ``columnar`` extra.
+"""
+
+import json
+
+from backend.config.config import SALES_PAGE_SIZE
+from backend.database.sales import QueryError, build_page_query, encode_cursor
+from backend.utils.metrics import timed_query
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Same columns and order as READ_COLUMNS, but volume_sold is a JSON number
+COLUMNAR_COLUMNS = [
+    "strftime('%Y-%m-%d', date) AS date",
+    "invoice_number",
+    "customer_name",
+    "location",
+    "product_name",
+    "category",
+    "CAST(volume_sold AS DOUBLE) AS volume_sold",
+    "unit",
+    "created_by",
+    "id",
+    "row_version",
+]
+
+
+def column_names(columns):
+    """Get the output names of SELECT expressions."""
+    return [column.split(" AS ")[-1].strip('"') for column in columns]
+
+
+COLUMN_NAMES = column_names(COLUMNAR_COLUMNS)
+# Columns with few distinct values, sent as a dictionary plus codes
+DICTIONARY_COLUMNS = {"location", "category", "unit", "created_by"}
+
+
+# Response layouts for /read and /rows
+FORMATS = ("rows", "columnar")
+
+
+def parse_format(args):
+    """Read the response layout from request arguments."""
+    fmt = args.get("format", "rows")
+    if fmt not in FORMATS:
+        raise QueryError(f"format must be one of: {', '.join(FORMATS)}")
+    if fmt == "columnar" and pyarrow is None:
+        raise QueryError("The columnar format requires the pyarrow package")
+    return fmt
+
+
+def _encode_column(name, column):
+    """Turn an Arrow column into a JSON-ready list, dictionary-encoding if set."""
+    if name in DICTIONARY_COLUMNS:
+        encoded = column.combine_chunks().dictionary_encode()
+        return {
+            "dictionary": encoded.dictionary.to_pylist(),
+            "codes": encoded.indices.to_pylist(),
+        }
+    return column.to_pylist()
+
+
+@timed_query("query_sales_columnar", lambda result: result[1])
+def query_sales_columnar(
+    db,
+    filters=None,
+    sort="date",
+    direction="desc",
+    limit=SALES_PAGE_SIZE,
+    cursor=None,
+    offset=0,
+    columns=COLUMNAR_COLUMNS,
+):
+    """Fetch one page of sales by column; return (columns, row_count, next_cursor)."""
+    sql, params = build_page_query(
+        filters, sort, direction, limit, cursor, columns, offset
+    )
+    table = db.execute(sql, params).fetch_record_batch().read_all()
+
+    next_cursor = None
+    if table.num_rows > limit:
+        table = table.slice(0, limit)
+        next_cursor = encode_cursor(
+            table.column("_cursor_sort")[-1].as_py(),
+            table.column("_cursor_id")[-1].as_py(),
+        )
+    encoded = {
+        name: _encode_column(name, table.column(name)) for name in column_names(columns)
+    }
+    return encoded, table.num_rows, next_cursor
+
+
+def dumps(payload):
+    """Serialize a payload to JSON bytes, with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode()
@@ -1,87 +1,908 @@
-"""Database connection and schema management."""
+"""Database connection management.
+
+Each workbook is its own DuckDB file with its own cursor pool and writer
+thread, so writes to one never queue behind another's. Open workbooks are
+kept in a per-process LRU; see WorkbookCache.
+
+DB_ROLE splits this across processes: the "writer" owns the files and
+publishes snapshots of them, and "reader" processes query those snapshots
+read-only and send their writes to the writer (see remote.py).
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 
 import duckdb
+from flask import g, has_request_context, jsonify, request, session
+from werkzeug.local import LocalProxy
 
-from backend.config.config import DB_PATH
+from backend.config.config import (
+    ASYNC_MODE,
+    DB_AUTO_MIGRATE,
+    DB_PATH,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_ROLE,
+    DB_WORKER_THREADS,
+    DEFAULT_WORKBOOK,
+    MAX_WORKBOOKS,
+    SNAPSHOT_MAX_LOAD,
+    SNAPSHOT_POLL_INTERVAL,
+    SNAPSHOT_WAIT_TIMEOUT,
+    WORKBOOK_CACHE_SIZE,
+    WORKBOOK_DIR,
+    WORKBOOK_IDLE_TIMEOUT,
+    WORKBOOKS_PER_USER,
+)
+from backend.database.migrations import run_migrations
+from backend.database.remote import RemoteWriter, WriterClient
+from backend.database.snapshots import (
+    has_snapshot,
+    list_snapshot_workbooks,
+    manifest_mtime,
+    publish_snapshot,
+    read_manifest,
+)
+from backend.database.writer import Writer
 
+# Workbook names double as file names and Redis key suffixes
+WORKBOOK_NAME_PATTERN = re.compile(r"[a-z0-9][a-z0-9_-]{0,62}")
 
-def get_db():
-    """Get database connection."""
-    db = duckdb.connect(DB_PATH)
-    init_schema(db)
-    return db
 
+class PoolTimeoutError(Exception):
+    """Raised when no pooled cursor becomes available in time."""
 
-def init_schema(db):
-    """Initialize database schema."""
-    # Create users table
-    db.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id BIGINT PRIMARY KEY,
-            username VARCHAR NOT NULL UNIQUE,
-            password_hash VARCHAR NOT NULL,
-            email VARCHAR NOT NULL UNIQUE,
-            name VARCHAR NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+
+class WorkbookNotFoundError(Exception):
+    """Raised for a workbook name that is invalid or has no file."""
+
+
+class ConnectionPool:
+    """Bounded pool of cursors over a single long-lived DuckDB connection.
+
+    The database file is opened once per process. Each borrower gets its own
+    cursor (a DuckDB connection sharing the same database instance), so
+    request threads never share transaction state.
+    """
+
+    def __init__(self, path, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._conn = None
+        self._idle = []
+        self._in_use = 0
+        self._waiting = 0
+        self._created = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._wait_time = 0.0
+        self._cond = threading.Condition()
+
+    def _open(self):
+        """Open the shared database connection on first use."""
+        if self._conn is None:
+            self._conn = duckdb.connect(self.path)
+        return self._conn
+
+    def acquire(self, timeout=None):
+        """Borrow a cursor, waiting up to ``timeout`` seconds for one to free up."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._idle and self._in_use >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No database cursor available after {timeout}s"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            if self._idle:
+                cursor = self._idle.pop()
+            else:
+                cursor = self._new_cursor()
+                self._created += 1
+            self._in_use += 1
+            self._acquired += 1
+            self._wait_time += time.monotonic() - started
+            return cursor
+
+    def _new_cursor(self):
+        """Open another cursor on the shared connection; call with the lock held."""
+        return self._open().cursor()
+
+    def dedicated(self):
+        """Open a cursor outside the pool for a long-lived owner like the writer."""
+        with self._cond:
+            self._created += 1
+            return self._open().cursor()
+
+    def release(self, cursor):
+        """Return a cursor to the pool, rolling back anything left uncommitted."""
+        try:
+            cursor.rollback()
+        except duckdb.Error:
+            # No transaction was open, which is the normal case
+            pass
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append(cursor)
+            self._cond.notify()
+
+    def stats(self):
+        """Return current pool usage counters."""
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "created": self._created,
+                "acquired": self._acquired,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": (
+                    round(self._wait_time / self._acquired * 1000, 3)
+                    if self._acquired
+                    else 0.0
+                ),
+            }
+
+    def close(self):
+        """Close every cursor and the shared connection."""
+        with self._cond:
+            for cursor in self._idle:
+                cursor.close()
+            self._idle.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SnapshotPool(ConnectionPool):
+    """Pool of read-only cursors over the newest snapshot of a workbook.
+
+    Used by reader processes. Before lending a cursor the pool looks, at most
+    every ``poll_interval`` seconds, for a newer snapshot; new cursors then
+    come from it, and the previous snapshot is closed once its last borrowed
+    cursor is returned.
+    """
+
+    def __init__(self, workbook, poll_interval=SNAPSHOT_POLL_INTERVAL, **kwargs):
+        super().__init__(None, **kwargs)
+        self.workbook = workbook
+        self.poll_interval = poll_interval
+        self.version = None
+        self._mtime = None
+        self._checked = 0.0
+        self._switches = 0
+        # Cursor -> the snapshot connection it came from
+        self._owners = {}
+        # Replaced snapshot connection -> cursors still borrowed from it
+        self._retired = {}
+
+    def _open(self):
+        """Open the current snapshot read-only on first use."""
+        if self._conn is None:
+            self._mtime = manifest_mtime(self.workbook)
+            manifest = read_manifest(self.workbook)
+            try:
+                self._conn = duckdb.connect(manifest["path"], read_only=True)
+            except duckdb.IOException:
+                # Pruned between reading the manifest and opening; try the newer one
+                manifest = read_manifest(self.workbook)
+                self._conn = duckdb.connect(manifest["path"], read_only=True)
+            self.path = manifest["path"]
+            self.version = manifest["version"]
+        return self._conn
+
+    def _new_cursor(self):
+        cursor = super()._new_cursor()
+        self._owners[cursor] = self._conn
+        return cursor
+
+    def refresh(self):
+        """Move on to a newer snapshot if one was published."""
+        now = time.monotonic()
+        if now - self._checked < self.poll_interval:
+            return
+        self._checked = now
+        mtime = manifest_mtime(self.workbook)
+        with self._cond:
+            if self._conn is None or mtime is None or mtime == self._mtime:
+                return
+            self._mtime = mtime
+            if read_manifest(self.workbook)["path"] == self.path:
+                return
+            old = self._conn
+            for cursor in self._idle:
+                del self._owners[cursor]
+                cursor.close()
+            self._idle.clear()
+            borrowed = sum(1 for conn in self._owners.values() if conn is old)
+            if borrowed:
+                self._retired[old] = borrowed
+            else:
+                old.close()
+            self._conn = None
+            self._switches += 1
+            self._open()
+
+    def snapshot_version(self):
+        """Get the data version of the snapshot new cursors come from."""
+        self.refresh()
+        with self._cond:
+            self._open()
+            return self.version
+
+    def wait_for(self, version, timeout):
+        """Wait until the snapshot holds data ``version``; return whether it does."""
+        deadline = time.monotonic() + timeout
+        while self.snapshot_version() < version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+        return True
+
+    def acquire(self, timeout=None):
+        self.refresh()
+        return super().acquire(timeout)
+
+    def release(self, cursor):
+        try:
+            cursor.rollback()
+        except duckdb.Error:
+            pass
+        with self._cond:
+            self._in_use -= 1
+            owner = self._owners[cursor]
+            if owner is self._conn:
+                self._idle.append(cursor)
+            else:
+                # Borrowed before the pool moved on to a newer snapshot
+                del self._owners[cursor]
+                cursor.close()
+                self._retired[owner] -= 1
+                if not self._retired[owner]:
+                    del self._retired[owner]
+                    owner.close()
+            self._cond.notify()
+
+    def stats(self):
+        stats = super().stats()
+        with self._cond:
+            stats.update(
+                snapshot_version=self.version,
+                snapshot_switches=self._switches,
+                retired_snapshots=len(self._retired),
+            )
+        return stats
+
+    def close(self):
+        with self._cond:
+            for conn in self._retired:
+                conn.close()
+            self._retired.clear()
+            self._owners.clear()
+        super().close()
+
+
+class OffloadedCursor:
+    """Cursor proxy that runs DuckDB's blocking calls on a worker thread.
+
+    Under eventlet or gevent a query would otherwise stall the event loop,
+    and every socket it serves, until it finished.
+    """
+
+    BLOCKING = frozenset(
+        {
+            "execute",
+            "executemany",
+            "fetchone",
+            "fetchmany",
+            "fetchall",
+            "begin",
+            "commit",
+            "rollback",
+        }
+    )
+
+    def __init__(self, cursor, run):
+        self.cursor = cursor
+        self._run = run
+
+    def __getattr__(self, name):
+        attr = getattr(self.cursor, name)
+        if name not in self.BLOCKING:
+            return attr
+
+        def call(*args, **kwargs):
+            result = self._run(attr, *args, **kwargs)
+            # Keep chained calls like execute(...).fetchall() offloaded
+            return self if result is self.cursor else result
+
+        return call
+
+
+def _offloader():
+    """Get the function that runs a blocking call for ASYNC_MODE, if any."""
+    if ASYNC_MODE == "eventlet":
+        from eventlet import tpool
+
+        tpool.set_num_threads(DB_WORKER_THREADS)
+        return tpool.execute
+    if ASYNC_MODE == "gevent":
+        import gevent
+
+        threadpool = gevent.get_hub().threadpool
+        threadpool.maxsize = DB_WORKER_THREADS
+        return lambda func, *args, **kwargs: threadpool.apply(func, args, kwargs)
+    return None
+
+
+def _wrap(cursor):
+    """Wrap a cursor for offloading under an async server."""
+    return OffloadedCursor(cursor, run_blocking) if run_blocking else cursor
+
+
+def _unwrap(cursor):
+    """Get the DuckDB cursor behind a possibly wrapped one."""
+    return cursor.cursor if isinstance(cursor, OffloadedCursor) else cursor
+
+
+def workbook_path(name):
+    """Get the DuckDB file of a workbook."""
+    if name == DEFAULT_WORKBOOK:
+        return DB_PATH
+    return os.path.join(WORKBOOK_DIR, f"{name}.duckdb")
+
+
+def validate_workbook_name(name):
+    """Raise WorkbookNotFoundError unless ``name`` can name a workbook."""
+    if not isinstance(name, str) or not WORKBOOK_NAME_PATTERN.fullmatch(name):
+        raise WorkbookNotFoundError(
+            "Workbook names are 1-63 lowercase letters, digits, '-' or '_'"
+        )
+
+
+def workbook_exists(name):
+    """Whether a workbook has been created (and, for readers, published)."""
+    if name == DEFAULT_WORKBOOK:
+        return True
+    if not (isinstance(name, str) and WORKBOOK_NAME_PATTERN.fullmatch(name)):
+        return False
+    if DB_ROLE == "reader":
+        return has_snapshot(name)
+    return os.path.exists(workbook_path(name))
+
+
+def list_workbooks():
+    """Get the names of every workbook, the default one first."""
+    names = []
+    if DB_ROLE == "reader":
+        names = list_snapshot_workbooks()
+    elif os.path.isdir(WORKBOOK_DIR):
+        names = sorted(
+            name[: -len(".duckdb")]
+            for name in os.listdir(WORKBOOK_DIR)
+            if name.endswith(".duckdb")
         )
+    return [DEFAULT_WORKBOOK] + [name for name in names if name != DEFAULT_WORKBOOK]
+
+
+class Workbook:
+    """An open workbook: its cursor pool and its writer.
+
+    In a reader process these are a SnapshotPool and a RemoteWriter.
+    ``borrowers`` counts the requests using it; WorkbookCache only closes a
+    workbook nobody borrows.
+    """
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        if DB_ROLE == "reader":
+            self.pool = SnapshotPool(name)
+            self.writer = RemoteWriter(name, writer_client)
+        else:
+            self.pool = ConnectionPool(path)
+            self.writer = Writer(
+                lambda: _wrap(self.pool.dedicated()), name=f"duckdb-writer-{name}"
+            )
+        self.borrowers = 0
+        self.last_used = time.monotonic()
+        self._prepared = False
+        self._prepare_lock = threading.Lock()
+        self._published_commits = None
+        self._publish_lock = threading.Lock()
+        self._next_publish = 0.0
+        self._publish_wanted = False
+        self._closed = False
+
+    def prepare(self):
+        """Apply pending migrations the first time the workbook is used.
+
+        A writer process also publishes a first snapshot, so readers see the
+        workbook as it is now even if the last run stopped before publishing.
         """
-    )
+        if self._prepared:
+            return
+        with self._prepare_lock:
+            if self._prepared:
+                return
+            # Readers leave migrations to the writer, which owns the file
+            if DB_AUTO_MIGRATE and DB_ROLE != "reader":
+                cursor = self.pool.acquire()
+                try:
+                    run_migrations(cursor)
+                finally:
+                    self.pool.release(cursor)
+            if DB_ROLE == "writer":
+                self.publish()
+            self._prepared = True
 
-    # Create categories table
-    db.execute(
+    def publish(self, force=True):
+        """Publish a snapshot for readers; unless ``force``, only after commits.
+
+        Each copy reads the whole workbook, so unless ``force`` or a reader
+        is waiting (want_publish()), the next one is held back long enough
+        to keep copying under SNAPSHOT_MAX_LOAD of the time. Returns whether
+        one was published.
         """
-        CREATE TABLE IF NOT EXISTS categories (
-            id BIGINT PRIMARY KEY,
-            name VARCHAR NOT NULL UNIQUE,
-            description VARCHAR,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
+        with self._publish_lock:
+            return self._publish(force)
+
+    def want_publish(self):
+        """Publish new commits at the next chance, without backing off."""
+        self._publish_wanted = True
+
+    def _publish(self, force):
+        """Publish a snapshot; call with the publish lock held."""
+        commits = self.writer.stats()["commits"]
+        if self._closed or (not force and commits == self._published_commits):
+            return False
+        if (
+            not (force or self._publish_wanted)
+            and time.monotonic() < self._next_publish
+        ):
+            return False
+        self._publish_wanted = False
+        started = time.monotonic()
+        cursor = self.pool.acquire()
+        try:
+            publish_snapshot(cursor, self.name)
+        finally:
+            self.pool.release(cursor)
+        elapsed = time.monotonic() - started
+        self._next_publish = time.monotonic() + elapsed * (1 / SNAPSHOT_MAX_LOAD - 1)
+        self._published_commits = commits
+        return True
+
+    def close(self):
+        """Let the writer finish its queue, then close the file."""
+        self.writer.close()
+        with self._publish_lock:
+            if DB_ROLE == "writer" and self._prepared:
+                # Publish the last commits before readers lose their source
+                self._publish_wanted = True
+                self._publish(force=False)
+            self._closed = True
+            self.pool.close()
+
+    def stats(self):
+        """Get pool, writer and usage statistics."""
+        return {
+            "borrowers": self.borrowers,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+            "pool": self.pool.stats(),
+            "writer": self.writer.stats(),
+        }
+
+
+class WorkbookCache:
+    """LRU of open workbooks, bounded in size and closing idle ones.
+
+    Opening a workbook past ``max_open`` closes the least recently used one
+    that nobody borrows, and any workbook unused for ``idle_timeout``
+    seconds is closed on the next acquire. The default workbook holds the
+    user accounts and always stays open.
+    """
+
+    def __init__(
+        self, max_open=WORKBOOK_CACHE_SIZE, idle_timeout=WORKBOOK_IDLE_TIMEOUT
+    ):
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+
+    def acquire(self, name, create=False):
+        """Borrow a workbook, opening (or creating) it if needed.
+
+        Pair with release().
         """
+        with self._lock:
+            workbook = self._open.get(name)
+            if workbook is None:
+                if not create and not workbook_exists(name):
+                    raise WorkbookNotFoundError(f"Workbook not found: {name}")
+                workbook = Workbook(name, workbook_path(name))
+                self._open[name] = workbook
+                self.opened += 1
+            self._open.move_to_end(name)
+            workbook.borrowers += 1
+            workbook.last_used = time.monotonic()
+            closing = self._evict()
+        # Closing checkpoints the file, so it happens outside the lock
+        for evicted in closing:
+            evicted.close()
+        try:
+            workbook.prepare()
+        except Exception:
+            self.release(workbook)
+            raise
+        return workbook
+
+    def release(self, workbook):
+        """Return a borrowed workbook."""
+        with self._lock:
+            workbook.borrowers -= 1
+            workbook.last_used = time.monotonic()
+
+    def _evict(self):
+        """Remove and return the workbooks to close; call with the lock held."""
+        now = time.monotonic()
+        closing = []
+        # Least recently used first
+        for name, workbook in list(self._open.items()):
+            if (
+                name == DEFAULT_WORKBOOK
+                or workbook.borrowers
+                or not workbook.writer.idle()
+            ):
+                continue
+            if (
+                len(self._open) > self.max_open
+                or now - workbook.last_used > self.idle_timeout
+            ):
+                del self._open[name]
+                closing.append(workbook)
+        self.closed += len(closing)
+        return closing
+
+    def open_workbooks(self):
+        """Get the workbooks open right now."""
+        with self._lock:
+            return list(self._open.values())
+
+    def close_all(self):
+        """Close every open workbook, e.g. at shutdown."""
+        with self._lock:
+            closing = list(self._open.values())
+            self._open.clear()
+        for workbook in closing:
+            workbook.close()
+
+    def stats(self):
+        """Get cache counters and per-workbook statistics."""
+        with self._lock:
+            return {
+                "max_open": self.max_open,
+                "opened": self.opened,
+                "closed": self.closed,
+                "workbooks": {
+                    name: workbook.stats() for name, workbook in self._open.items()
+                },
+            }
+
+
+run_blocking = _offloader()
+# Connections to the writer process, shared by a reader's workbooks
+writer_client = WriterClient(run=run_blocking) if DB_ROLE == "reader" else None
+workbooks = WorkbookCache()
+
+
+def requested_workbook():
+    """Get the workbook a request addresses.
+
+    Clients name it in the X-Workbook header or the ``workbook`` argument
+    (Socket.IO connections pass it in the connection URL). Outside a
+    request, e.g. in a bare app context, it is the default workbook.
+    """
+    if not has_request_context():
+        return DEFAULT_WORKBOOK
+    return (
+        request.headers.get("X-Workbook")
+        or request.args.get("workbook")
+        or DEFAULT_WORKBOOK
     )
 
-    # Create sales table
+
+def current_workbook():
+    """Get the current request's workbook, borrowed until the request ends."""
+    if "workbook" not in g:
+        g.workbook = workbooks.acquire(requested_workbook())
+    return g.workbook
+
+
+# Every mutation goes through the workbook's writer. DuckDB aborts the later
+# of two overlapping transactions that touch the same row, and every write
+# touches shared rollup rows, so one writer committing in groups beats many.
+writer = LocalProxy(lambda: current_workbook().writer)
+
+
+def get_db():
+    """Get the pooled cursor of the request's workbook."""
+    if "db" not in g:
+        g.db = _wrap(current_workbook().pool.acquire())
+    return g.db
+
+
+def stream_cursor():
+    """Borrow a cursor of the request's workbook for a streamed response.
+
+    A streamed body is still being sent after the request context ends and
+    get_db()'s cursor has gone back to the pool, so it needs its own cursor.
+    Returns (cursor, release); call release() once the stream is done.
+    """
+    workbook = workbooks.acquire(requested_workbook())
+    try:
+        cursor = workbook.pool.acquire()
+    except Exception:
+        workbooks.release(workbook)
+        raise
+
+    def release():
+        workbook.pool.release(cursor)
+        workbooks.release(workbook)
+
+    return _wrap(cursor), release
+
+
+def close_db(exception=None):
+    """Return the request's cursor to its pool and release its workbook."""
+    db = g.pop("db", None)
+    workbook = g.pop("workbook", None)
+    if db is not None:
+        workbook.pool.release(_unwrap(db))
+    if workbook is not None:
+        workbooks.release(workbook)
+
+
+@contextmanager
+def open_workbook(name=DEFAULT_WORKBOOK, create=False):
+    """Borrow a workbook outside of a request."""
+    workbook = workbooks.acquire(name, create)
+    try:
+        yield workbook
+    finally:
+        workbooks.release(workbook)
+
+
+@contextmanager
+def pooled_connection(name=DEFAULT_WORKBOOK):
+    """Borrow a cursor of a workbook outside of a Flask app context."""
+    with open_workbook(name) as workbook:
+        cursor = workbook.pool.acquire()
+        try:
+            yield _wrap(cursor)
+        finally:
+            workbook.pool.release(cursor)
+
+
+def find_member(db, username):
+    """Get a user's role in the workbook of ``db``.
+
+    That is "owner" or "member", None for anyone else, or "shared" when the
+    workbook has no members: the default workbook, and workbooks created
+    before they had owners, are open to every user.
+    """
+    role, members = db.execute(
+        """
+        SELECT max(role) FILTER (WHERE username = ?), COUNT(*)
+        FROM workbook_members
+        """,
+        (username,),
+    ).fetchone()
+    return role if members else "shared"
+
+
+def add_member(db, username, role, added_by):
+    """Give a user a role in the workbook of ``db``; return False if they had one."""
+    if db.execute(
+        "SELECT 1 FROM workbook_members WHERE username = ?", (username,)
+    ).fetchone():
+        return False
     db.execute(
         """
-        CREATE TABLE IF NOT EXISTS sales (
-            id BIGINT PRIMARY KEY,
-            date DATE NOT NULL,
-            invoice_number VARCHAR NOT NULL UNIQUE,
-            customer_name VARCHAR NOT NULL,
-            location VARCHAR NOT NULL,
-            product_name VARCHAR NOT NULL,
-            category VARCHAR NOT NULL,
-            volume_sold DECIMAL(10,2) NOT NULL,
-            unit VARCHAR NOT NULL,
-            created_by VARCHAR NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
+        INSERT INTO workbook_members (username, role, added_by)
+        VALUES (?, ?, ?)
+        """,
+        (username, role, added_by),
+    )
+    return True
+
+
+def list_members(db):
+    """Get ``[{"username", "role"}]`` for the workbook of ``db``, owners first."""
+    rows = db.execute(
+        """
+        SELECT username, role FROM workbook_members
+        ORDER BY role = 'owner' DESC, username
+        """
+    ).fetchall()
+    return [{"username": username, "role": role} for username, role in rows]
+
+
+def register_workbook(db, name, owner):
+    """Record the owner of a new workbook in the default workbook.
+
+    Run through the default workbook's writer, so concurrent creations are
+    counted one at a time. Returns "exists" if the name is taken, "limit"
+    if the owner has WORKBOOKS_PER_USER workbooks or there are
+    MAX_WORKBOOKS, else None.
+    """
+    owned, total, taken = db.execute(
         """
+        SELECT COUNT(*) FILTER (WHERE owner = ?), COUNT(*),
+            COUNT(*) FILTER (WHERE workbook = ?)
+        FROM workbook_owners
+        """,
+        (owner, name),
+    ).fetchone()
+    if taken:
+        return "exists"
+    if owned >= WORKBOOKS_PER_USER or total >= MAX_WORKBOOKS:
+        return "limit"
+    db.execute(
+        "INSERT INTO workbook_owners (workbook, owner) VALUES (?, ?)", (name, owner)
     )
+    return None
 
-    # Insert default categories if they don't exist
-    default_categories = [
-        (1, "Soft Drinks", "Carbonated soft drinks and colas"),
-        (2, "Soda", "Soda water and carbonated beverages"),
-        (3, "Coffee", "Coffee and coffee-based beverages"),
-        (4, "Beverages", "General beverages"),
-        (5, "Beer", "Beer and alcoholic beverages"),
-        (6, "Creamers", "Coffee creamers and dairy alternatives"),
-        (7, "Mineral Water", "Mineral and spring water"),
-        (8, "Juice", "Fruit juices and juice drinks"),
-        (9, "Tea", "Bottled and canned tea"),
-        (10, "Milk", "Dairy milk and milk-based drinks"),
-        (11, "Dairy", "Other dairy products like yogurt drinks and kefir"),
-        (12, "Energy Drinks", "Energy and sports drinks"),
-        (13, "Other", "Other types of beverages"),
-    ]
-
-    for category in default_categories:
-        db.execute(
-            """
-            INSERT OR IGNORE INTO categories (id, name, description)
-            VALUES (?, ?, ?)
-            """,
-            category,
-        )
+
+def unregister_workbook(db, name):
+    """Forget a workbook whose file could not be created."""
+    db.execute("DELETE FROM workbook_owners WHERE workbook = ?", (name,))
+
+
+def workbook_role(name, username):
+    """Get a user's role in a workbook; see find_member()."""
+    if name == DEFAULT_WORKBOOK:
+        return "shared"
+    with pooled_connection(name) as db:
+        return find_member(db, username)
+
+
+def create_workbook(name, owner):
+    """Create an empty workbook owned by ``owner``.
+
+    Returns None, or "exists" or "limit" as register_workbook() does.
+    """
+    validate_workbook_name(name)
+    if workbook_exists(name):
+        return "exists"
+    if DB_ROLE == "reader":
+        # The writer creates the file and publishes its first snapshot
+        return RemoteWriter(name, writer_client).create(owner)
+    with open_workbook() as registry:
+        outcome = registry.writer.run(register_workbook, name, owner)
+        if outcome:
+            return outcome
+        try:
+            os.makedirs(WORKBOOK_DIR, exist_ok=True)
+            # The owner goes in before the file is opened and published, so
+            # no snapshot shows the workbook open to everyone
+            db = duckdb.connect(workbook_path(name))
+            try:
+                run_migrations(db)
+                add_member(db, owner, "owner", owner)
+            finally:
+                db.close()
+            with open_workbook(name, create=True):
+                pass
+        except Exception:
+            registry.writer.run(unregister_workbook, name)
+            raise
+    return None
+
+
+def get_pool_stats(name=DEFAULT_WORKBOOK):
+    """Get connection pool statistics of an open workbook."""
+    with open_workbook(name) as workbook:
+        return workbook.pool.stats()
+
+
+def get_writer_stats(name=DEFAULT_WORKBOOK):
+    """Get group-commit writer statistics of an open workbook."""
+    with open_workbook(name) as workbook:
+        return workbook.writer.stats()
+
+
+def required_version():
+    """Get the data version a read must see, or None.
+
+    That is the newer of the client's X-Min-Version header (or
+    ``min_version`` argument) and the last version this session wrote to the
+    workbook. Raises ValueError for a malformed client version.
+    """
+    wanted = request.headers.get("X-Min-Version") or request.args.get("min_version")
+    wanted = int(wanted) if wanted else None
+    written = session.get("written_versions", {}).get(requested_workbook())
+    if written is not None and (wanted is None or written > wanted):
+        wanted = written
+    return wanted
+
+
+def remember_write(version):
+    """Have this session's later reads see the write that made ``version``."""
+    written = session.get("written_versions", {})
+    workbook = requested_workbook()
+    if version > written.get(workbook, 0):
+        session["written_versions"] = {**written, workbook: version}
+
+
+def wait_for_snapshot():
+    """In a reader, hold a read until the snapshot has what it must see.
+
+    Snapshots trail the writer, so without this a client could miss its own
+    write. The writer is asked to publish now rather than back off. Answers
+    503 if no such snapshot arrives within SNAPSHOT_WAIT_TIMEOUT.
+    """
+    if DB_ROLE != "reader" or request.method not in ("GET", "HEAD"):
+        return None
+    try:
+        version = required_version()
+    except ValueError:
+        return jsonify({"error": "min_version must be an integer version"}), 400
+    if version is None:
+        return None
+    workbook = current_workbook()
+    if workbook.pool.snapshot_version() >= version:
+        return None
+    try:
+        workbook.writer.want_publish()
+    except Exception as e:
+        print(f"Error asking the writer to publish {workbook.name}: {str(e)}")
+    if workbook.pool.wait_for(version, SNAPSHOT_WAIT_TIMEOUT):
+        return None
+    response = jsonify({"error": f"Data version {version} is not readable yet"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
+def check_workbook():
+    """Reject requests for a missing workbook, or one the user may not open."""
+    name = requested_workbook()
+    try:
+        validate_workbook_name(name)
+    except WorkbookNotFoundError as e:
+        return jsonify({"error": str(e)}), 400
+    if not workbook_exists(name):
+        return jsonify({"error": f"Workbook not found: {name}"}), 404
+    if workbook_role(name, session.get("username")) is None:
+        if not session.get("username"):
+            return jsonify({"error": "Please login first"}), 401
+        return jsonify({"error": f"No access to workbook: {name}"}), 403
+    return None
+
+
+def init_app(app):
+    """Open the default workbook and register per-request workbook handling."""
+    with open_workbook():
+        pass
+    app.before_request(check_workbook)
+    app.before_request(wait_for_snapshot)
+    app.teardown_appcontext(close_db)
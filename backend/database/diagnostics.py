@@ -0,0 +1,165 @@
+"""Query plan diagnostics for the application's canonical queries.
+
+Each canonical query is run through the same function the routes use, on a
+cursor that also profiles every statement with ``EXPLAIN ANALYZE``. The
+report lists operator timings and rows scanned per statement, so a plan that
+stops using an index or starts scanning far more rows shows up as data grows.
+"""
+
+import datetime
+import json
+import re
+
+from backend.database.changes import get_changes_since, get_data_version
+from backend.database.rollups import aggregate
+from backend.database.sales import query_sales
+from backend.database.search import search_sales, tokenize
+
+# extra_info entries too verbose to be useful in a report
+HIDDEN_DETAILS = {"Projections", "Estimated Cardinality"}
+
+
+class ProfilingCursor:
+    """Cursor proxy that records an EXPLAIN ANALYZE profile of each statement.
+
+    The statement is then run again normally, so callers get their results.
+    """
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.profiles = []
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def execute(self, sql, params=None):
+        params = params or []
+        plan = self.cursor.execute(
+            f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params
+        ).fetchall()[0][1]
+        self.profiles.append(summarize_profile(sql, json.loads(plan)))
+        return self.cursor.execute(sql, params)
+
+
+def _operators(node, depth=0):
+    """Flatten a profile tree into one entry per operator, depth first."""
+    operators = []
+    if node.get("operator_type") not in (None, "EXPLAIN_ANALYZE"):
+        details = {
+            key: value
+            for key, value in node.get("extra_info", {}).items()
+            if key not in HIDDEN_DETAILS and value
+        }
+        operators.append(
+            {
+                "operator": node["operator_name"].strip(),
+                "depth": depth,
+                "timing_ms": round(node.get("operator_timing", 0) * 1000, 3),
+                "rows": node.get("operator_cardinality", 0),
+                "rows_scanned": node.get("operator_rows_scanned", 0),
+                "details": details,
+            }
+        )
+        depth += 1
+    for child in node.get("children", []):
+        operators.extend(_operators(child, depth))
+    return operators
+
+
+def summarize_profile(sql, profile):
+    """Reduce a JSON query profile to timings, row counts and index use.
+
+    DuckDB 1.3 and earlier leave the query-level totals at zero under
+    EXPLAIN ANALYZE, so they fall back to sums over the operators.
+    """
+    operators = _operators(profile)
+    latency = profile.get("latency") or sum(op["timing_ms"] for op in operators) / 1000
+    return {
+        "sql": re.sub(r"\s+", " ", sql).strip(),
+        "latency_ms": round(latency * 1000, 3),
+        "rows_scanned": profile.get("cumulative_rows_scanned")
+        or sum(op["rows_scanned"] for op in operators),
+        "index_scans": sum(
+            op["details"].get("Type") == "Index Scan" for op in operators
+        ),
+        "operators": operators,
+    }
+
+
+def _samples(db, username):
+    """Pick filter values from the current data for the canonical queries."""
+    latest, category, customer = db.execute(
+        """
+        SELECT MAX(date), arg_max(category, id), arg_max(customer_name, id)
+        FROM sales
+        """
+    ).fetchone()
+    latest = latest or datetime.date.today()
+    words = tokenize(customer or "")[:2]
+    if not words:
+        # The name has no searchable words, e.g. only punctuation
+        term = db.execute("SELECT term FROM sales_search_terms LIMIT 1").fetchone()
+        words = list(term or ())
+    return {
+        "date_from": latest.replace(day=1).isoformat(),
+        "date_to": latest.isoformat(),
+        "category": category or "",
+        "customer": customer or "unknown",
+        "words": words,
+        "created_by": username,
+        "version": get_data_version(db),
+    }
+
+
+def _month(s):
+    """Date filters covering the sample month."""
+    return {"date_from": s["date_from"], "date_to": s["date_to"]}
+
+
+# Name -> call the routes make, given a cursor and sample filter values
+CANONICAL_QUERIES = {
+    "read_first_page": lambda db, s: query_sales(db),
+    "read_date_range": lambda db, s: query_sales(db, filters=_month(s)),
+    "read_category": lambda db, s: query_sales(db, filters={"category": s["category"]}),
+    "read_customer": lambda db, s: query_sales(db, filters={"customer": s["customer"]}),
+    "read_created_by": lambda db, s: query_sales(
+        db, filters={"created_by": s["created_by"]}
+    ),
+    "aggregate_daily_category": lambda db, s: aggregate(
+        db, ["date", "category"], ["sum", "count"], filters=_month(s)
+    ),
+    "aggregate_monthly_by_creator": lambda db, s: aggregate(
+        db, ["month"], ["sum", "count"], filters={"created_by": s["created_by"]}
+    ),
+    # Skipped, with no statements to report, while nothing is indexed
+    "search_customer": lambda db, s: s["words"] and search_sales(db, s["words"]),
+    "changes_since": lambda db, s: get_changes_since(db, max(s["version"] - 100, 0)),
+}
+
+
+def explain_canonical_queries(db, username, names=None):
+    """Profile the canonical queries; return {name: [statement profile, ...]}.
+
+    ``names`` limits the report to some of them.
+    """
+    samples = _samples(db, username)
+    report = {}
+    for name, run in CANONICAL_QUERIES.items():
+        if names and name not in names:
+            continue
+        cursor = ProfilingCursor(db)
+        run(cursor, samples)
+        report[name] = cursor.profiles
+    return report
+
+
+def get_indexes(db):
+    """List the secondary indexes on user tables."""
+    rows = db.execute(
+        """
+        SELECT table_name, index_name, sql
+        FROM duckdb_indexes()
+        ORDER BY table_name, index_name
+        """
+    ).fetchall()
+    return [{"table": table, "name": name, "sql": sql} for table, name, sql in rows]
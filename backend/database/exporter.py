@@ -0,0 +1,171 @@
+"""Streaming export of sales in CSV, NDJSON, Parquet and Arrow IPC formats.
+
+Every format is streamed as the query produces it, EXPORT_BATCH_ROWS rows
+at a time, so the first bytes go out at once and server memory and disk
+stay flat for any table size. CSV and NDJSON are formatted from fetched
+rows; Parquet and Arrow IPC are written from DuckDB's record batches and
+need the optional ``pyarrow`` package. Under eventlet or gevent every batch
+is read on the DuckDB worker threads rather than the event loop.
+"""
+
+import csv
+import datetime
+import decimal
+import io
+import json
+
+from backend.config.config import EXPORT_BATCH_ROWS
+from backend.database.db import run_blocking
+from backend.database.sales import build_where
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_COLUMNS = [
+    "id",
+    "date",
+    "invoice_number",
+    "customer_name",
+    "location",
+    "product_name",
+    "category",
+    "volume_sold",
+    "unit",
+    "created_by",
+    "created_at",
+    "updated_at",
+]
+
+# format -> (mimetype, file extension, whether it needs pyarrow)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv", False),
+    "ndjson": ("application/x-ndjson", "ndjson", False),
+    "parquet": ("application/vnd.apache.parquet", "parquet", True),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows", True),
+}
+
+
+class ExportError(ValueError):
+    """Raised for an unknown or unavailable export format."""
+
+
+def build_export_query(filters=None, sort="date", direction="desc"):
+    """Build the SELECT for an export; return (sql, params)."""
+    clauses, params = build_where(filters or {})
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = direction.upper()
+    sql = f"""
+        SELECT {", ".join(EXPORT_COLUMNS)}
+        FROM sales
+        {where}
+        ORDER BY {sort} {order}, id {order}
+    """
+    return sql, params
+
+
+def check_format(fmt):
+    """Validate an export format name."""
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported export format: {fmt}")
+    if EXPORT_FORMATS[fmt][2] and pyarrow is None:
+        raise ExportError(f"{fmt} export requires the pyarrow package")
+    return fmt
+
+
+def _blocking(func, *args):
+    """Run a blocking DuckDB call off the event loop when there is one."""
+    return run_blocking(func, *args) if run_blocking else func(*args)
+
+
+def _json_value(value):
+    """Encode the values json cannot, the way DuckDB's JSON export does."""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} as JSON")
+
+
+def _format_rows(fmt, rows):
+    """Format fetched rows as CSV lines or NDJSON records."""
+    if fmt == "csv":
+        out = io.StringIO()
+        csv.writer(out, lineterminator="\n").writerows(rows)
+        return out.getvalue().encode()
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=_json_value) + "\n"
+        for row in rows
+    ).encode()
+
+
+def iter_rows(db, fmt):
+    """Yield the executed query as CSV or NDJSON, one batch of rows at a time."""
+    if fmt == "csv":
+        yield _format_rows(fmt, [EXPORT_COLUMNS])
+    # fetchmany goes through the cursor, which offloads it itself
+    while rows := db.fetchmany(EXPORT_BATCH_ROWS):
+        yield _format_rows(fmt, rows)
+
+
+class _ChunkSink:
+    """Minimal writable file that hands back whatever was written since last drain."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _next_batch(reader):
+    """Read the next record batch, or None at the end."""
+    try:
+        return reader.read_next_batch()
+    except StopIteration:
+        return None
+
+
+def iter_batches(db, fmt):
+    """Yield the executed query as Parquet or Arrow IPC, one batch at a time.
+
+    Parquet row groups are written as their batches arrive; only the footer
+    waits for the end.
+    """
+    reader = _blocking(db.fetch_record_batch, EXPORT_BATCH_ROWS)
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(sink, reader.schema)
+    else:
+        writer = pyarrow.ipc.new_stream(sink, reader.schema)
+    with writer:
+        while (batch := _blocking(_next_batch, reader)) is not None:
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_export(db, fmt, sql, params):
+    """Run an export query; return an iterator over its output in ``fmt``.
+
+    The query runs here, before the response starts, so its errors can still
+    be answered with an error status.
+    """
+    db.execute(sql, params)
+    if EXPORT_FORMATS[fmt][2]:
+        return iter_batches(db, fmt)
+    return iter_rows(db, fmt)
@@ -0,0 +1,976 @@
+"""Formula columns and summary cells over sales.
+
+A formula is a spreadsheet-style expression such as ``volume_sold * 3.785``
+or ``SUM(volume_sold)``. It is parsed here and compiled to a DuckDB
+expression, so it is evaluated vectorized over whole columns:
+
+* A column formula reads row values. It is compiled into the SELECT that
+  reads a page, so it costs nothing to keep up to date.
+* A summary cell aggregates rows, either once or per ``group_by`` dimension.
+  Each group keeps the partial state of its aggregates (sum and count) in
+  ``formula_states``, so written rows are folded in, or taken out, without
+  rescanning the group. Its values are computed from those states and
+  stored in ``formula_values``, each with the data version at which it
+  last changed.
+
+Formulas may reference sales columns, and formulas and cells defined before
+them, so definition order is a topological order of the dependency graph. A
+write recomputes only the cells that read the columns it touched, and only
+for the groups its rows are in; cells that depend on them follow only when a
+value actually changed. Recalculation runs in the writing transaction, like
+the rollups.
+"""
+
+import json
+import re
+
+import duckdb
+
+from backend.database.changes import record_reset
+from backend.database.rollups import DIMENSION_COLUMNS, DIMENSIONS, IDS_PREDICATE
+from backend.database.sales import SALE_FIELDS, QueryError
+from backend.utils.metrics import timed_query
+
+# Sales columns a formula can read, with the type each yields
+FORMULA_COLUMNS = {field: sql_type for field, sql_type in SALE_FIELDS}
+FORMULA_COLUMNS["created_by"] = "VARCHAR"
+
+# Function name -> (SQL function, fewest arguments, most arguments or None)
+FUNCTIONS = {
+    "ABS": ("abs", 1, 1),
+    "ROUND": ("round", 1, 2),
+    "COALESCE": ("coalesce", 1, None),
+    "LEAST": ("least", 2, None),
+    "GREATEST": ("greatest", 2, None),
+    "LOWER": ("lower", 1, 1),
+    "UPPER": ("upper", 1, 1),
+    "LEN": ("length", 1, 1),
+    "YEAR": ("year", 1, 1),
+    "MONTH": ("month", 1, 1),
+}
+# IF(condition, then, else) becomes a CASE expression
+CONDITIONAL = "IF"
+AGGREGATES = {"SUM": "sum", "AVG": "avg", "MIN": "min", "MAX": "max", "COUNT": "count"}
+KEYWORDS = {"AND", "OR", "NOT", "TRUE", "FALSE", "NULL"}
+
+COMPARISONS = {
+    "=": "=",
+    "<>": "<>",
+    "!=": "<>",
+    "<": "<",
+    "<=": "<=",
+    ">": ">",
+    ">=": ">=",
+}
+
+# Output types of column formulas, and how each is sent to clients
+VALUE_TYPES = {
+    "number": "CAST({} AS DOUBLE)",
+    "text": "CAST({} AS VARCHAR)",
+    "boolean": "{}",
+}
+
+NUMERIC_TYPES = {
+    "TINYINT",
+    "SMALLINT",
+    "INTEGER",
+    "BIGINT",
+    "HUGEINT",
+    "UTINYINT",
+    "USMALLINT",
+    "UINTEGER",
+    "UBIGINT",
+    "UHUGEINT",
+    "FLOAT",
+    "DOUBLE",
+}
+
+NAME_PATTERN = re.compile(r"[a-z][a-z0-9_]{0,62}")
+MAX_EXPRESSION_LENGTH = 1000
+# Most groups a grouped summary cell may have
+MAX_GROUPS = 1000
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<number>\d+(?:\.\d*)?|\.\d+)
+      | (?P<string>'(?:[^']|'')*')
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op><>|!=|<=|>=|[-+*/%&=<>(),])
+    )""",
+    re.VERBOSE,
+)
+
+
+def tokenize(expression):
+    """Split an expression into (kind, text) tokens."""
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if match is None:
+            raise QueryError(f"Unexpected character at position {position + 1}")
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing a tuple tree.
+
+    Precedence, loosest first: OR, AND, NOT, comparisons, ``&`` (text
+    concatenation), ``+ -``, ``* / %``, unary minus.
+    """
+
+    def __init__(self, expression):
+        self.tokens = tokenize(expression)
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def keyword(self, *words):
+        kind, text = self.peek()
+        if kind == "name" and text.upper() in words:
+            self.position += 1
+            return text.upper()
+        return None
+
+    def op(self, *ops):
+        kind, text = self.peek()
+        if kind == "op" and text in ops:
+            self.position += 1
+            return text
+        return None
+
+    def expect(self, op):
+        if not self.op(op):
+            found = self.peek()[1]
+            raise QueryError(
+                f"Expected '{op}' but found '{found}'"
+                if found
+                else f"Expected '{op}' at the end of the formula"
+            )
+
+    def parse(self):
+        if not self.tokens:
+            raise QueryError("Formula is empty")
+        tree = self.disjunction()
+        if self.position < len(self.tokens):
+            raise QueryError(f"Unexpected '{self.peek()[1]}'")
+        return tree
+
+    def disjunction(self):
+        node = self.conjunction()
+        while self.keyword("OR"):
+            node = ("op", "OR", node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.keyword("AND"):
+            node = ("op", "AND", node, self.negation())
+        return node
+
+    def negation(self):
+        if self.keyword("NOT"):
+            return ("not", self.negation())
+        return self.comparison()
+
+    def comparison(self):
+        node = self.concatenation()
+        op = self.op(*COMPARISONS)
+        if op:
+            node = ("op", COMPARISONS[op], node, self.concatenation())
+        return node
+
+    def concatenation(self):
+        node = self.additive()
+        while self.op("&"):
+            node = ("concat", node, self.additive())
+        return node
+
+    def additive(self):
+        node = self.term()
+        while True:
+            op = self.op("+", "-")
+            if not op:
+                return node
+            node = ("op", op, node, self.term())
+
+    def term(self):
+        node = self.unary()
+        while True:
+            op = self.op("*", "/", "%")
+            if not op:
+                return node
+            node = ("op", op, node, self.unary())
+
+    def unary(self):
+        if self.op("-"):
+            return ("neg", self.unary())
+        if self.op("+"):
+            return self.unary()
+        return self.primary()
+
+    def primary(self):
+        kind, text = self.peek()
+        if kind is None:
+            raise QueryError("Unexpected end of formula")
+        self.position += 1
+        if kind == "number":
+            return ("number", text)
+        if kind == "string":
+            return ("string", text[1:-1].replace("''", "'"))
+        if kind == "op":
+            if text != "(":
+                raise QueryError(f"Unexpected '{text}'")
+            node = self.disjunction()
+            self.expect(")")
+            return node
+        word = text.upper()
+        if word in ("TRUE", "FALSE", "NULL"):
+            return ("literal", word)
+        if word in KEYWORDS:
+            raise QueryError(f"Unexpected '{text}'")
+        if self.op("("):
+            args = []
+            if not self.op(")"):
+                args.append(self.disjunction())
+                while self.op(","):
+                    args.append(self.disjunction())
+                self.expect(")")
+            return ("call", word, args)
+        return ("ref", text.lower())
+
+
+def parse(expression):
+    """Parse a formula expression into a tuple tree."""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise QueryError(f"Formulas are limited to {MAX_EXPRESSION_LENGTH} characters")
+    return _Parser(expression).parse()
+
+
+def validate_name(name):
+    """Raise QueryError unless ``name`` can name a new formula."""
+    if not isinstance(name, str) or not NAME_PATTERN.fullmatch(name):
+        raise QueryError(
+            "Formula names must start with a lowercase letter and contain only "
+            "lowercase letters, digits and underscores"
+        )
+    reserved = set(FORMULA_COLUMNS) | {"id", "row_version", "group_key"}
+    reserved |= {word.lower() for word in KEYWORDS | set(FUNCTIONS) | set(AGGREGATES)}
+    if name in reserved or name == CONDITIONAL.lower():
+        raise QueryError(f"{name} is a reserved name")
+
+
+def _quote(text):
+    """Quote text as a SQL string literal."""
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _value_type(sql_type):
+    """Map a DuckDB result type onto a formula value type."""
+    name = str(sql_type).upper()
+    if name == "BOOLEAN":
+        return "boolean"
+    if name.startswith("DECIMAL") or name in NUMERIC_TYPES:
+        return "number"
+    return "text"
+
+
+def _cell_lookup(name, key):
+    """SQL reading one stored value of a summary cell."""
+    return (
+        f"(SELECT fv.value FROM formula_values fv "
+        f"WHERE fv.name = {_quote(name)} AND fv.group_key = {key})"
+    )
+
+
+def _keys_predicate(keys):
+    """Match the group keys bound as one JSON array."""
+    predicate = "group_key IN (SELECT unnest(from_json(?, '[\"VARCHAR\"]')))"
+    return predicate, [json.dumps(sorted(keys))]
+
+
+def _state_value(function, position):
+    """An aggregate's value, read from its stored state columns."""
+    total, count = f"total_{position}", f"count_{position}"
+    if function == "COUNT":
+        return count
+    if function == "SUM":
+        return f"(CASE WHEN {count} > 0 THEN {total} END)"
+    if function == "AVG":
+        return f"({total} / NULLIF({count}, 0))"
+    return total
+
+
+def _state_sql(function, argument):
+    """SQL aggregating (total, count) state for one aggregate over sales rows."""
+    if argument is None:
+        return "0", "count(*)"
+    value = f"CAST({argument} AS DOUBLE)"
+    if function == "COUNT":
+        return "0", f"count({argument})"
+    if function in ("SUM", "AVG"):
+        return f"coalesce(sum({value}), 0)", f"count({argument})"
+    return f"{AGGREGATES[function]}({value})", f"count({argument})"
+
+
+class Formula:
+    """A parsed formula and what it reads."""
+
+    def __init__(self, name, expression, group_by=None, value_type=None):
+        self.name = name
+        self.expression = expression
+        self.group_by = group_by
+        self.value_type = value_type
+        self.tree = parse(expression)
+        # Formulas referenced directly
+        self.refs = set()
+        # Sales columns read, directly or through column formulas
+        self.columns = set()
+        # Cells whose values are used, directly or through column formulas;
+        # in a summary cell, per group or per row (inside an aggregate)
+        self.cells = set()
+        self.group_cells = set()
+        self.row_cells = set()
+        # (function, argument SQL) of each aggregate, in state position order
+        self.aggregates = []
+        self.has_aggregates = False
+        # Whether row values are read outside any aggregate
+        self.reads_rows = False
+        self.kind = None
+        # DuckDB expression, before the output cast
+        self.sql = None
+
+    @property
+    def is_cell(self):
+        return self.kind == "cell"
+
+    @property
+    def incremental(self):
+        """Whether written rows can be folded into the stored states.
+
+        A minimum or maximum cannot take a row back out, so cells using
+        them recompute the groups a write touches instead.
+        """
+        return all(function not in ("MIN", "MAX") for function, _ in self.aggregates)
+
+    def reads(self, fields):
+        """Whether updating ``fields`` (None for any insert) changes this cell."""
+        if fields is None:
+            return True
+        columns = set(self.columns)
+        if self.group_by is not None:
+            columns.add(DIMENSION_COLUMNS.get(self.group_by, self.group_by))
+        return bool(columns & set(fields))
+
+    def column_sql(self):
+        """The column formula as a SELECT expression over sales."""
+        return VALUE_TYPES[self.value_type].format(self.sql) + f' AS "{self.name}"'
+
+    def describe(self):
+        """Get the definition as a JSON-ready dict."""
+        return {
+            "name": self.name,
+            "expression": self.expression,
+            "kind": self.kind,
+            "group_by": self.group_by,
+            "value_type": self.value_type,
+            "depends_on": sorted(self.refs),
+        }
+
+
+class FormulaGraph:
+    """Formulas in definition order, with their references resolved.
+
+    ``definitions`` holds the (name, expression, group_by, value_type) rows
+    the graph was built from.
+    """
+
+    def __init__(self, definitions=()):
+        self.definitions = tuple(definitions)
+        self.formulas = {}
+        for name, expression, group_by, value_type in self.definitions:
+            self.add(name, expression, group_by, value_type)
+
+    def __contains__(self, name):
+        return name in self.formulas
+
+    def __getitem__(self, name):
+        return self.formulas[name]
+
+    def cells(self):
+        """Get the summary cells, in definition order."""
+        return [formula for formula in self.formulas.values() if formula.is_cell]
+
+    def dependents(self, name):
+        """Get the names of the formulas that reference ``name`` directly."""
+        return [f.name for f in self.formulas.values() if name in f.refs]
+
+    def add(self, name, expression, group_by=None, value_type=None):
+        """Parse a formula, resolve it against the graph and add it.
+
+        A formula that reads row values outside an aggregate is a column
+        formula; anything else is a summary cell.
+        """
+        if group_by is not None and group_by not in DIMENSIONS:
+            raise QueryError(f"Cannot group by: {group_by}")
+        formula = Formula(name, expression, group_by, value_type)
+        self._analyze(formula, formula.tree, False)
+        if formula.reads_rows:
+            if formula.has_aggregates:
+                raise QueryError(
+                    "A formula cannot mix row values with aggregates; define "
+                    "the aggregate as a summary cell and reference it"
+                )
+            if group_by is not None:
+                raise QueryError("Only summary cells can be grouped")
+            formula.kind = "column"
+        else:
+            formula.kind = "cell"
+            for cell in formula.group_cells:
+                if self.formulas[cell].group_by not in (None, group_by):
+                    raise QueryError(
+                        f"{cell} is grouped by {self.formulas[cell].group_by}; "
+                        "only a cell grouped the same way or a column formula "
+                        "can reference it"
+                    )
+        formula.sql = self._compile(formula, formula.tree, not formula.is_cell)
+        self.formulas[name] = formula
+        return formula
+
+    def _analyze(self, formula, node, in_aggregate):
+        """Record what a formula reads and check its function calls."""
+        kind = node[0]
+        if kind == "ref":
+            name = node[1]
+            target = self.formulas.get(name)
+            if name in FORMULA_COLUMNS:
+                formula.columns.add(name)
+                formula.reads_rows |= not in_aggregate
+            elif target is None:
+                raise QueryError(f"Unknown column or formula: {name}")
+            elif target.is_cell:
+                formula.refs.add(name)
+                formula.cells.add(name)
+                (formula.row_cells if in_aggregate else formula.group_cells).add(name)
+            else:
+                formula.refs.add(name)
+                formula.columns |= target.columns
+                formula.cells |= target.cells
+                formula.row_cells |= target.cells
+                formula.reads_rows |= not in_aggregate
+        elif kind == "call":
+            name, args = node[1], node[2]
+            if name in AGGREGATES:
+                if in_aggregate:
+                    raise QueryError("Aggregates cannot be nested")
+                if len(args) > 1 or (not args and name != "COUNT"):
+                    raise QueryError(f"{name} takes one argument")
+                formula.has_aggregates = True
+                in_aggregate = True
+            elif name == CONDITIONAL:
+                if len(args) not in (2, 3):
+                    raise QueryError(
+                        "IF takes a condition, a value and an optional else value"
+                    )
+            elif name in FUNCTIONS:
+                _, fewest, most = FUNCTIONS[name]
+                if len(args) < fewest or (most is not None and len(args) > most):
+                    raise QueryError(f"Wrong number of arguments to {name}")
+            else:
+                raise QueryError(f"Unknown function: {name}")
+            for arg in args:
+                self._analyze(formula, arg, in_aggregate)
+        elif kind in ("op", "concat", "neg", "not"):
+            for child in node[1:]:
+                if isinstance(child, tuple):
+                    self._analyze(formula, child, in_aggregate)
+
+    def _compile(self, formula, node, row):
+        """Compile a tree to DuckDB SQL.
+
+        ``row`` is True where the expression is evaluated per sales row (a
+        column formula or an aggregate's argument) and False where it is
+        evaluated per group of a summary cell, from the group's stored
+        aggregate states.
+        """
+        kind = node[0]
+        if kind == "number":
+            return node[1]
+        if kind == "string":
+            return _quote(node[1])
+        if kind == "literal":
+            return node[1]
+        if kind == "ref":
+            name = node[1]
+            if name in FORMULA_COLUMNS:
+                return name
+            target = self.formulas[name]
+            if not target.is_cell:
+                return f"({target.sql})"
+            if target.group_by is None:
+                return _cell_lookup(name, "''")
+            if row:
+                key = f"CAST({DIMENSIONS[target.group_by]} AS VARCHAR)"
+                return _cell_lookup(name, key)
+            return _cell_lookup(name, "states.group_key")
+        if kind == "neg":
+            return f"(-{self._compile(formula, node[1], row)})"
+        if kind == "not":
+            return f"(NOT {self._compile(formula, node[1], row)})"
+        if kind == "concat":
+            left = self._compile(formula, node[1], row)
+            return f"concat({left}, {self._compile(formula, node[2], row)})"
+        if kind == "op":
+            op = node[1]
+            left = self._compile(formula, node[2], row)
+            right = self._compile(formula, node[3], row)
+            # Spreadsheet-style: dividing by zero gives an empty value, not inf
+            if op == "/":
+                return f"({left} / NULLIF({right}, 0))"
+            return f"({left} {op} {right})"
+
+        name, args = node[1], node[2]
+        if name in AGGREGATES:
+            argument = self._compile(formula, args[0], True) if args else None
+            formula.aggregates.append((name, argument))
+            return _state_value(name, len(formula.aggregates))
+        compiled = [self._compile(formula, arg, row) for arg in args]
+        if name == CONDITIONAL:
+            otherwise = compiled[2] if len(compiled) == 3 else "NULL"
+            return f"(CASE WHEN {compiled[0]} THEN {compiled[1]} ELSE {otherwise} END)"
+        return f"{FUNCTIONS[name][0]}({', '.join(compiled)})"
+
+    def states_query(self, name, where=None, params=()):
+        """Build the query aggregating a cell's states from sales.
+
+        Rows are (group_key, position, total, count). Position 0 counts the
+        group's rows; position i holds the i-th aggregate. ``where`` limits
+        the sales rows read, and may use ``group_key``.
+        """
+        formula = self.formulas[name]
+        totals, counts = ["0"], ["count(*)"]
+        for function, argument in formula.aggregates:
+            total, count = _state_sql(function, argument)
+            totals.append(total)
+            counts.append(count)
+        if formula.group_by is None:
+            # One row even when no sales match, so the cell reads as empty
+            key, group = "''", ""
+        else:
+            key = f"CAST({DIMENSIONS[formula.group_by]} AS VARCHAR)"
+            group = "GROUP BY group_key"
+        sql = f"""
+            SELECT {"group_key" if group else "'' AS group_key"},
+                unnest(range({len(totals)})) AS position,
+                unnest([{", ".join(totals)}]::DOUBLE[]) AS total,
+                unnest([{", ".join(counts)}]) AS count
+            FROM (SELECT *, {key} AS group_key FROM sales) sales
+            {f"WHERE {where}" if where else ""}
+            {group}
+        """
+        return sql, list(params)
+
+    def value_query(self, name, keys=None, value="CAST({} AS DOUBLE)"):
+        """Build the query computing a cell from its states; return (sql, params).
+
+        Rows are (group_key, value); an ungrouped cell has one row with an
+        empty key. ``keys`` limits the groups computed.
+        """
+        formula = self.formulas[name]
+        columns = ["max(count) FILTER (WHERE position = 0) AS count_0"]
+        for position in range(1, len(formula.aggregates) + 1):
+            columns.append(
+                f"max(total) FILTER (WHERE position = {position}) AS total_{position}"
+            )
+            columns.append(
+                f"max(count) FILTER (WHERE position = {position}) AS count_{position}"
+            )
+        where, params = "name = ?", [name]
+        if keys is not None:
+            predicate, key_params = _keys_predicate(keys)
+            where += f" AND {predicate}"
+            params += key_params
+        sql = f"""
+            SELECT group_key, {value.format(formula.sql)}
+            FROM (
+                SELECT group_key, {", ".join(columns)}
+                FROM formula_states
+                WHERE {where}
+                GROUP BY group_key
+            ) states
+        """
+        return sql, params
+
+    def column_selects(self, names):
+        """Get SELECT expressions for the named column formulas."""
+        selects = []
+        for name in names:
+            formula = self.formulas.get(name)
+            if formula is None:
+                raise QueryError(f"Unknown formula: {name}")
+            if formula.is_cell:
+                raise QueryError(f"{name} is a summary cell, not a column")
+            selects.append(formula.column_sql())
+        return selects
+
+
+_graph = FormulaGraph()
+
+
+@timed_query("load_formulas", lambda graph: len(graph.formulas))
+def load_graph(db):
+    """Get the dependency graph of the formulas ``db`` sees.
+
+    The definitions are a few rows, so they are read on every call, in the
+    caller's snapshot; they are parsed again only when they changed.
+    """
+    global _graph
+    definitions = tuple(
+        db.execute(
+            "SELECT name, expression, group_by, value_type FROM formulas ORDER BY id"
+        ).fetchall()
+    )
+    graph = _graph
+    if graph.definitions != definitions:
+        graph = FormulaGraph(definitions)
+        _graph = graph
+    return graph
+
+
+def parse_formula_columns(args):
+    """Read the column formulas requested with a page of sales."""
+    return [
+        name.strip() for name in args.get("formulas", "").split(",") if name.strip()
+    ]
+
+
+def affected_groups(db, graph, where, params):
+    """Get the group keys of the sales matching ``where``, per grouping in use."""
+    dimensions = sorted({cell.group_by for cell in graph.cells() if cell.group_by})
+    if not dimensions:
+        return {}
+    selects = [f"list(DISTINCT CAST({DIMENSIONS[d]} AS VARCHAR))" for d in dimensions]
+    row = db.execute(
+        f"SELECT {', '.join(selects)} FROM sales WHERE {where}", params
+    ).fetchone()
+    return {dimension: set(keys or ()) for dimension, keys in zip(dimensions, row)}
+
+
+def _add_states(db, graph, cell, where, params, sign=1):
+    """Fold the sales rows matching ``where`` into a cell's states.
+
+    A ``sign`` of -1 takes the rows back out, e.g. before they are updated.
+    """
+    sql, params = graph.states_query(cell.name, where, params)
+    db.execute(
+        f"""
+        INSERT INTO formula_states (name, group_key, position, total, count)
+        SELECT ?, group_key, position, {sign} * total, {sign} * count
+        FROM ({sql})
+        ON CONFLICT (name, group_key, position) DO UPDATE SET
+            total = total + excluded.total,
+            count = count + excluded.count
+        """,
+        [cell.name] + params,
+    )
+
+
+def _drop_empty_groups(db, cell):
+    """Remove the states of groups an update moved every row out of."""
+    db.execute(
+        """
+        DELETE FROM formula_states
+        WHERE name = ? AND group_key IN (
+            SELECT group_key FROM formula_states
+            WHERE name = ? AND position = 0 AND count = 0
+        )
+        """,
+        (cell.name, cell.name),
+    )
+
+
+def _rebuild_states(db, graph, cell, keys=None):
+    """Recompute a cell's states from sales, for some groups or (None) all."""
+    where, params = "name = ?", [cell.name]
+    source_where, source_params = None, []
+    if keys is not None and cell.group_by is not None:
+        source_where, source_params = _keys_predicate(keys)
+        predicate, key_params = _keys_predicate(keys)
+        where += f" AND {predicate}"
+        params += key_params
+    db.execute(f"DELETE FROM formula_states WHERE {where}", params)
+    sql, source_params = graph.states_query(cell.name, source_where, source_params)
+    db.execute(
+        f"""
+        INSERT INTO formula_states (name, group_key, position, total, count)
+        SELECT ?, * FROM ({sql})
+        """,
+        [cell.name] + source_params,
+    )
+
+
+def _store_values(db, graph, cell, keys, version):
+    """Compute a cell's values, store the ones that changed and return them.
+
+    ``keys`` are the groups to compute, or None for all of them. Returns
+    {group_key: value}, with None for groups that no longer have rows.
+    """
+    sql, params = graph.value_query(cell.name, keys)
+    new = dict(db.execute(sql, params).fetchall())
+
+    where, params = "name = ?", [cell.name]
+    if keys is not None:
+        predicate, key_params = _keys_predicate(keys)
+        where += f" AND {predicate}"
+        params += key_params
+    old = dict(
+        db.execute(
+            f"SELECT group_key, value FROM formula_values WHERE {where}", params
+        ).fetchall()
+    )
+
+    changed = {
+        key: value for key, value in new.items() if key not in old or old[key] != value
+    }
+    removed = [key for key in old if key not in new]
+    if changed:
+        db.execute(
+            """
+            INSERT INTO formula_values (name, group_key, value, version)
+            SELECT ?, unnest(from_json(?, '["VARCHAR"]')),
+                unnest(from_json(?, '["DOUBLE"]')), ?
+            ON CONFLICT (name, group_key) DO UPDATE SET
+                value = excluded.value,
+                version = excluded.version
+            """,
+            (
+                cell.name,
+                json.dumps(list(changed)),
+                json.dumps(list(changed.values())),
+                version,
+            ),
+        )
+    if removed:
+        predicate, key_params = _keys_predicate(removed)
+        db.execute(
+            f"DELETE FROM formula_values WHERE name = ? AND {predicate}",
+            [cell.name] + key_params,
+        )
+    changed.update(dict.fromkeys(removed))
+    return changed
+
+
+def _union(keys, more):
+    """Union of two key sets, where None stands for every key."""
+    if keys is None or more is None:
+        return None
+    return keys | set(more)
+
+
+@timed_query("recalculate", lambda changed: sum(len(v) for v in changed.values()))
+def recalculate(db, graph, version, groups, fields=None, where=None, params=()):
+    """Bring every summary cell up to date after a write.
+
+    ``where`` matches the written rows and ``groups`` maps each grouping in
+    use to their group keys (see affected_groups()). ``fields`` are the
+    columns an update changed, or None for inserts. Incremental cells fold
+    the rows into their states; other cells recompute the groups touched.
+    Returns {cell: {group_key: value}} for the values that changed.
+    """
+    changed = {}
+    for cell in graph.cells():
+        written = set()
+        if cell.has_aggregates and cell.reads(fields):
+            written = set(groups.get(cell.group_by, ())) if cell.group_by else {""}
+        rebuild = set()
+        if written:
+            if cell.incremental:
+                _add_states(db, graph, cell, where, params)
+                if fields is not None and cell.group_by is not None:
+                    _drop_empty_groups(db, cell)
+            else:
+                rebuild |= written
+
+        evaluate = set(written)
+        for dependency in cell.cells & changed.keys():
+            keys = None
+            if (
+                cell.group_by is not None
+                and graph[dependency].group_by == cell.group_by
+            ):
+                # Looked up by the same group key, so only those groups move
+                keys = changed[dependency]
+            if dependency in cell.row_cells:
+                rebuild = _union(rebuild, keys)
+            if dependency in cell.group_cells:
+                evaluate = _union(evaluate, keys)
+
+        if rebuild is None or rebuild:
+            _rebuild_states(db, graph, cell, rebuild)
+            evaluate = _union(evaluate, rebuild)
+        if evaluate is None or evaluate:
+            values = _store_values(db, graph, cell, evaluate, version)
+            if values:
+                changed[cell.name] = values
+    return changed
+
+
+def recalculate_range(db, first_id, last_id, version):
+    """Bring the cells up to date after inserting a contiguous id range."""
+    graph = load_graph(db)
+    if not graph.cells():
+        return {}
+    where, params = "id BETWEEN ? AND ?", [first_id, last_id]
+    groups = affected_groups(db, graph, where, params)
+    return recalculate(db, graph, version, groups, None, where, params)
+
+
+def retract_rows(db, graph, sale_ids, fields):
+    """Take sales about to be updated out of the cells' states.
+
+    Call before the update and pass the result, the groups the rows were
+    in, to recalculate_rows() after it.
+    """
+    where, params = IDS_PREDICATE, [json.dumps(sale_ids)]
+    for cell in graph.cells():
+        if cell.has_aggregates and cell.incremental and cell.reads(fields):
+            _add_states(db, graph, cell, where, params, sign=-1)
+    return affected_groups(db, graph, where, params)
+
+
+def recalculate_rows(db, graph, sale_ids, fields, before, version):
+    """Bring the cells up to date after updating ``fields`` of some sales."""
+    if not graph.cells():
+        return {}
+    where, params = IDS_PREDICATE, [json.dumps(sale_ids)]
+    groups = affected_groups(db, graph, where, params)
+    for dimension, keys in before.items():
+        groups.setdefault(dimension, set()).update(keys)
+    return recalculate(db, graph, version, groups, fields, where, params)
+
+
+def _describe_type(db, sql, params=()):
+    """Get the value type of a query's last column, without running it."""
+    try:
+        # DESCRIBE names the SQL type; on DuckDB 1.3 and earlier
+        # cursor.description only says NUMBER or STRING
+        columns = db.execute(f"DESCRIBE {sql}", params).fetchall()
+    except duckdb.Error as e:
+        # Type errors surface when DuckDB binds the expression
+        raise QueryError(str(e).splitlines()[0]) from e
+    return _value_type(columns[-1][1])
+
+
+def define_formula(db, name, expression, group_by, username):
+    """Add a formula and compute its cell values, inside the writer.
+
+    Returns (definition, data version). A new formula changes the columns
+    and cells clients show, so it is logged as a reset.
+    """
+    validate_name(name)
+    if not isinstance(expression, str) or not expression.strip():
+        raise QueryError("expression is required")
+    graph = load_graph(db)
+    if name in graph:
+        raise QueryError(f"A formula named {name} already exists")
+
+    # Extend a copy; the cached graph belongs to the committed definitions
+    graph = FormulaGraph(graph.definitions)
+    formula = graph.add(name, expression.strip(), group_by or None)
+    if formula.is_cell:
+        for function, argument in formula.aggregates:
+            if argument is None or function == "COUNT":
+                continue
+            if _describe_type(db, f"SELECT {argument} FROM sales") != "number":
+                raise QueryError(f"{function} needs a number")
+        sql, params = graph.value_query(name, value="{}")
+        formula.value_type = _describe_type(db, sql, params)
+        if formula.value_type != "number":
+            raise QueryError(
+                f"A summary cell must be a number, not {formula.value_type}"
+            )
+        if group_by:
+            groups = db.execute(
+                f"SELECT COUNT(DISTINCT {DIMENSIONS[group_by]}) FROM sales"
+            ).fetchone()[0]
+            if groups > MAX_GROUPS:
+                raise QueryError(f"{group_by} has more than {MAX_GROUPS} groups")
+    else:
+        formula.value_type = _describe_type(db, f"SELECT {formula.sql} FROM sales")
+
+    db.execute(
+        """
+        INSERT INTO formulas
+            (id, name, expression, group_by, kind, value_type, created_by)
+        VALUES (nextval('formulas_id_seq'), ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            name,
+            formula.expression,
+            formula.group_by,
+            formula.kind,
+            formula.value_type,
+            username,
+        ),
+    )
+    version = record_reset(db)
+    if formula.is_cell:
+        graph = load_graph(db)
+        _rebuild_states(db, graph, graph[name])
+        _store_values(db, graph, graph[name], None, version)
+    return formula.describe(), version
+
+
+def delete_formula(db, name):
+    """Remove a formula and its values, inside the writer.
+
+    Returns (outcome, detail): ("missing", None), ("in_use", dependents) or
+    (None, data version).
+    """
+    graph = load_graph(db)
+    if name not in graph:
+        return "missing", None
+    dependents = graph.dependents(name)
+    if dependents:
+        return "in_use", dependents
+    for table in ("formula_values", "formula_states", "formulas"):
+        db.execute(f"DELETE FROM {table} WHERE name = ?", (name,))
+    return None, record_reset(db)
+
+
+@timed_query("list_formulas", len)
+def list_formulas(db):
+    """Get every formula, with the stored values of summary cells.
+
+    A grouped cell's ``values`` maps group keys to values; an ungrouped
+    cell has a single ``value``. ``version`` is the data version at which a
+    cell's values last changed.
+    """
+    graph = load_graph(db)
+    values = {}
+    versions = {}
+    for name, key, value, version in db.execute(
+        "SELECT name, group_key, value, version FROM formula_values "
+        "ORDER BY name, group_key"
+    ).fetchall():
+        values.setdefault(name, {})[key] = value
+        versions[name] = max(versions.get(name, 0), version)
+
+    formulas = []
+    for formula in graph.formulas.values():
+        entry = formula.describe()
+        if formula.is_cell:
+            cell_values = values.get(formula.name, {})
+            if formula.group_by is None:
+                entry["value"] = cell_values.get("")
+            else:
+                entry["values"] = cell_values
+            entry["version"] = versions.get(formula.name)
+        formulas.append(entry)
+    return formulas
@@ -0,0 +1,215 @@
+"""Bulk import of sales from CSV and Parquet files.
+
+Files are loaded by DuckDB's native readers into a staging table, validated
+with set-wise queries and merged into ``sales`` with a single INSERT, so rows
+never pass through Python regardless of file size.
+"""
+
+import os
+import uuid
+
+from backend.database.changes import record_reset
+from backend.database.formulas import recalculate_range
+from backend.database.rollups import add_range_to_rollups
+from backend.database.sales import SALE_FIELDS
+from backend.database.search import index_range
+
+FORMATS = {
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+
+# How many offending source rows to report per validation rule
+ERROR_SAMPLE_SIZE = 10
+
+
+class SalesImportError(ValueError):
+    """Raised when an import file cannot be staged or fails validation."""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def detect_format(filename, fmt=None):
+    """Resolve the file format from an explicit value or the file extension."""
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in FORMATS.values():
+            raise SalesImportError(f"Unsupported format: {fmt}")
+        return fmt
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in FORMATS:
+        raise SalesImportError(
+            f"Cannot detect format of {filename}; pass csv or parquet"
+        )
+    return FORMATS[ext]
+
+
+def stage_file(db, path, fmt):
+    """Load a file into a new temporary staging table and return its name."""
+    table = f"sales_import_{uuid.uuid4().hex}"
+    reader = (
+        "read_csv(?, header=true, all_varchar=true)"
+        if fmt == "csv"
+        else "read_parquet(?)"
+    )
+    db.execute(
+        f"""
+        CREATE TEMP TABLE {table} AS
+        SELECT row_number() OVER () AS source_row, *
+        FROM {reader}
+        """,
+        (path,),
+    )
+
+    columns = stage_columns(db, table)
+    missing = [field for field, _ in SALE_FIELDS if field not in columns]
+    if missing:
+        drop_stage(db, table)
+        raise SalesImportError(f"File is missing columns: {', '.join(missing)}")
+    return table
+
+
+def stage_columns(db, table):
+    """Get the column names of a staging table."""
+    return {row[0] for row in db.execute(f"DESCRIBE {table}").fetchall()}
+
+
+def drop_stage(db, table):
+    """Drop a staging table."""
+    db.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def _validation_rules(table):
+    """Return (description, predicate) pairs that flag invalid staged rows."""
+    rules = []
+    for field, sql_type in SALE_FIELDS:
+        rules.append(
+            (
+                f"Missing required field: {field}",
+                f"{field} IS NULL OR trim(CAST({field} AS VARCHAR)) = ''",
+            )
+        )
+        if sql_type != "VARCHAR":
+            rules.append(
+                (
+                    f"{field} is not a valid {sql_type}",
+                    f"{field} IS NOT NULL AND TRY_CAST({field} AS {sql_type}) IS NULL",
+                )
+            )
+    rules.append(
+        (
+            "Duplicate invoice number in file",
+            f"""invoice_number IN (
+                SELECT invoice_number FROM {table}
+                GROUP BY invoice_number HAVING COUNT(*) > 1
+            )""",
+        )
+    )
+    rules.append(
+        (
+            "Invoice number already exists",
+            "invoice_number IN (SELECT invoice_number FROM sales)",
+        )
+    )
+    return rules
+
+
+def validate_stage(db, table):
+    """Check every staged row against the sales schema.
+
+    Returns ``(row_count, errors)``, where each error names a rule, how many
+    rows broke it and a sample of their 1-based source row numbers.
+    """
+    row_count = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    errors = []
+    for description, predicate in _validation_rules(table):
+        count, sample = db.execute(
+            f"""
+            SELECT COUNT(*), list(source_row ORDER BY source_row)[1:{ERROR_SAMPLE_SIZE}]
+            FROM {table}
+            WHERE {predicate}
+            """
+        ).fetchone()
+        if count:
+            errors.append({"error": description, "rows": count, "sample": sample})
+    return row_count, errors
+
+
+def merge_stage(db, table, username):
+    """Insert every staged row into sales in one statement.
+
+    Returns ``(first_id, count)``. Ids come from ``sales_id_seq`` in file
+    order; they are consecutive because only the writer thread inserts sales.
+    """
+    if "created_by" in stage_columns(db, table):
+        created_by = "COALESCE(NULLIF(trim(created_by), ''), ?)"
+    else:
+        created_by = "?"
+
+    columns = [field for field, _ in SALE_FIELDS]
+    casts = [f"CAST({field} AS {sql_type})" for field, sql_type in SALE_FIELDS]
+    count = db.execute(
+        f"""
+        INSERT INTO sales (id, {", ".join(columns)}, created_by)
+        SELECT
+            nextval('sales_id_seq'),
+            {", ".join(casts)},
+            {created_by}
+        FROM (SELECT * FROM {table} ORDER BY source_row)
+        """,
+        (username,),
+    ).fetchone()[0]
+    if not count:
+        return None, 0
+    last_id = db.execute("SELECT currval('sales_id_seq')").fetchone()[0]
+    return last_id - count + 1, count
+
+
+def load_file(db, path, username, fmt=None, progress=None):
+    """Stage, validate and merge a sales file inside the caller's transaction.
+
+    ``progress`` is called as ``progress(stage, **details)`` after each step.
+    Returns a summary dict; raises SalesImportError when validation fails.
+    """
+    report = progress or (lambda stage, **details: None)
+    fmt = detect_format(path, fmt)
+
+    table = stage_file(db, path, fmt)
+    report("staged")
+    row_count, errors = validate_stage(db, table)
+    report("validated", rows=row_count, errors=len(errors))
+    if errors:
+        drop_stage(db, table)
+        raise SalesImportError("Import rejected", errors)
+
+    first_id, inserted = merge_stage(db, table, username)
+    drop_stage(db, table)
+    if inserted:
+        add_range_to_rollups(db, first_id, first_id + inserted - 1)
+        index_range(db, first_id, first_id + inserted - 1)
+    version = record_reset(db)
+    if inserted:
+        recalculate_range(db, first_id, first_id + inserted - 1, version)
+    return {"rows": inserted, "version": version, "format": fmt}
+
+
+def import_file(db, path, username, fmt=None, progress=None):
+    """Load a sales file in its own transaction, for use outside the server.
+
+    The running application submits ``load_file`` to its writer instead.
+    """
+    report = progress or (lambda stage, **details: None)
+    db.begin()
+    try:
+        result = load_file(db, path, username, fmt, report)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    report("merged", rows=result["rows"], version=result["version"])
+    return result
@@ -0,0 +1,386 @@
+"""Versioned schema migrations.
+
+Migrations run once per workbook file: at application startup for the default
+workbook, when another workbook is first opened, or from the command line
+before a rollout::
+
+    python migrate.py                  # apply pending migrations
+    python migrate.py --status         # show the applied version
+    python migrate.py --all-workbooks  # migrate every workbook file
+"""
+
+import argparse
+import glob
+import os
+
+import duckdb
+
+from backend.config.config import DB_PATH, WORKBOOK_DIR
+
+DEFAULT_CATEGORIES = [
+    (1, "Soft Drinks", "Carbonated soft drinks and colas"),
+    (2, "Soda", "Soda water and carbonated beverages"),
+    (3, "Coffee", "Coffee and coffee-based beverages"),
+    (4, "Beverages", "General beverages"),
+    (5, "Beer", "Beer and alcoholic beverages"),
+    (6, "Creamers", "Coffee creamers and dairy alternatives"),
+    (7, "Mineral Water", "Mineral and spring water"),
+    (8, "Juice", "Fruit juices and juice drinks"),
+    (9, "Tea", "Bottled and canned tea"),
+    (10, "Milk", "Dairy milk and milk-based drinks"),
+    (11, "Dairy", "Other dairy products like yogurt drinks and kefir"),
+    (12, "Energy Drinks", "Energy and sports drinks"),
+    (13, "Other", "Other types of beverages"),
+]
+
+
+def _create_id_sequences(db):
+    """Create id sequences that continue after the highest existing ids."""
+    for table in ("users", "sales"):
+        start = db.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()
+        db.execute(f"CREATE SEQUENCE IF NOT EXISTS {table}_id_seq START {start[0]}")
+
+
+# Ordered (version, description, statements). Never edit an applied migration;
+# append a new one instead. Statements in the first migration use IF NOT EXISTS
+# so databases created before versioning adopt the history cleanly.
+MIGRATIONS = [
+    (
+        1,
+        "Create users, categories and sales tables",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id BIGINT PRIMARY KEY,
+                username VARCHAR NOT NULL UNIQUE,
+                password_hash VARCHAR NOT NULL,
+                email VARCHAR NOT NULL UNIQUE,
+                name VARCHAR NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS categories (
+                id BIGINT PRIMARY KEY,
+                name VARCHAR NOT NULL UNIQUE,
+                description VARCHAR,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS sales (
+                id BIGINT PRIMARY KEY,
+                date DATE NOT NULL,
+                invoice_number VARCHAR NOT NULL UNIQUE,
+                customer_name VARCHAR NOT NULL,
+                location VARCHAR NOT NULL,
+                product_name VARCHAR NOT NULL,
+                category VARCHAR NOT NULL,
+                volume_sold DECIMAL(10,2) NOT NULL,
+                unit VARCHAR NOT NULL,
+                created_by VARCHAR NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        ],
+    ),
+    (
+        2,
+        "Seed default categories",
+        [
+            (
+                "INSERT OR IGNORE INTO categories (id, name, description) "
+                "VALUES (?, ?, ?)",
+                DEFAULT_CATEGORIES,
+            ),
+        ],
+    ),
+    (
+        3,
+        "Add the sales change log for delta sync",
+        [
+            "CREATE SEQUENCE IF NOT EXISTS sales_change_seq START 1",
+            """
+            CREATE TABLE IF NOT EXISTS sales_changes (
+                version BIGINT PRIMARY KEY,
+                sale_id BIGINT NOT NULL,
+                operation VARCHAR NOT NULL,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        ],
+    ),
+    (
+        4,
+        "Add daily and location rollups of volume sold by category",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS sales_daily_category (
+                date DATE NOT NULL,
+                category VARCHAR NOT NULL,
+                total_volume DECIMAL(18,2) NOT NULL,
+                row_count BIGINT NOT NULL,
+                PRIMARY KEY (date, category)
+            )
+            """,
+            """
+            INSERT INTO sales_daily_category
+            SELECT date, category, SUM(volume_sold), COUNT(*)
+            FROM sales
+            GROUP BY date, category
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS sales_location_category (
+                location VARCHAR NOT NULL,
+                category VARCHAR NOT NULL,
+                total_volume DECIMAL(18,2) NOT NULL,
+                row_count BIGINT NOT NULL,
+                PRIMARY KEY (location, category)
+            )
+            """,
+            """
+            INSERT INTO sales_location_category
+            SELECT location, category, SUM(volume_sold), COUNT(*)
+            FROM sales
+            GROUP BY location, category
+            """,
+        ],
+    ),
+    (
+        5,
+        "Add per-row versions to sales for optimistic concurrency",
+        [
+            "ALTER TABLE sales ADD COLUMN IF NOT EXISTS row_version BIGINT DEFAULT 1",
+        ],
+    ),
+    (
+        6,
+        "Allocate user and sale ids from sequences",
+        [_create_id_sequences],
+    ),
+    (
+        7,
+        "Add the sales search term index",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS sales_search_terms (
+                term VARCHAR NOT NULL,
+                sale_id BIGINT NOT NULL
+            )
+            """,
+            r"""
+            INSERT INTO sales_search_terms (term, sale_id)
+            SELECT DISTINCT term, sale_id
+            FROM (
+                SELECT
+                    unnest(regexp_split_to_array(
+                        lower(concat_ws(' ', invoice_number, customer_name,
+                                        location, product_name)),
+                        '[^\pL\pN]+'
+                    )) AS term,
+                    id AS sale_id
+                FROM sales
+            )
+            WHERE term <> ''
+            ORDER BY term, sale_id
+            """,
+        ],
+    ),
+    (
+        8,
+        "Index sales by customer",
+        # DuckDB only uses an ART index for an equality filter matching few
+        # rows, so date ranges, categories and the few creators are left to
+        # the per-row-group min/max statistics instead. Updating an indexed
+        # column needs DuckDB 1.2; earlier versions report a duplicate key
+        ["CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales (customer_name)"],
+    ),
+    (
+        9,
+        "Add formula definitions and stored summary cell values and states",
+        [
+            "CREATE SEQUENCE IF NOT EXISTS formulas_id_seq START 1",
+            """
+            CREATE TABLE IF NOT EXISTS formulas (
+                id BIGINT PRIMARY KEY,
+                name VARCHAR NOT NULL UNIQUE,
+                expression VARCHAR NOT NULL,
+                group_by VARCHAR,
+                kind VARCHAR NOT NULL,
+                value_type VARCHAR NOT NULL,
+                created_by VARCHAR NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS formula_values (
+                name VARCHAR NOT NULL,
+                group_key VARCHAR NOT NULL,
+                value DOUBLE,
+                version BIGINT NOT NULL,
+                PRIMARY KEY (name, group_key)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS formula_states (
+                name VARCHAR NOT NULL,
+                group_key VARCHAR NOT NULL,
+                position INTEGER NOT NULL,
+                total DOUBLE,
+                count BIGINT NOT NULL,
+                PRIMARY KEY (name, group_key, position)
+            )
+            """,
+        ],
+    ),
+    (
+        10,
+        "Re-sort the sales search term index and track its unsorted postings",
+        [
+            """
+            CREATE TEMP TABLE sorted_search_terms AS
+            SELECT term, sale_id FROM sales_search_terms ORDER BY term, sale_id
+            """,
+            """
+            CREATE OR REPLACE TABLE sales_search_terms (
+                term VARCHAR NOT NULL,
+                sale_id BIGINT NOT NULL
+            )
+            """,
+            """
+            INSERT INTO sales_search_terms
+            SELECT term, sale_id FROM sorted_search_terms ORDER BY term, sale_id
+            """,
+            "DROP TABLE sorted_search_terms",
+            """
+            CREATE TABLE IF NOT EXISTS sales_search_state (
+                sorted_postings BIGINT NOT NULL,
+                unsorted_postings BIGINT NOT NULL
+            )
+            """,
+            """
+            INSERT INTO sales_search_state
+            SELECT COUNT(*), 0 FROM sales_search_terms
+            """,
+        ],
+    ),
+    (
+        11,
+        "Add workbook members and the registry of workbook owners",
+        [
+            # In each workbook's own file, so a snapshot always carries the
+            # access list of the data in it. Empty means open to every user.
+            """
+            CREATE TABLE IF NOT EXISTS workbook_members (
+                username VARCHAR PRIMARY KEY,
+                role VARCHAR NOT NULL,
+                added_by VARCHAR NOT NULL,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            # In the default workbook only, for the creation limits
+            """
+            CREATE TABLE IF NOT EXISTS workbook_owners (
+                workbook VARCHAR PRIMARY KEY,
+                owner VARCHAR NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        ],
+    ),
+]
+
+
+def _execute(db, statement):
+    """Run a plain statement, a (sql, rows) bulk statement or a callable."""
+    if callable(statement):
+        statement(db)
+    elif isinstance(statement, tuple):
+        sql, rows = statement
+        db.executemany(sql, rows)
+    else:
+        db.execute(statement)
+
+
+def get_schema_version(db):
+    """Get the highest applied migration version, or 0 for a fresh database."""
+    exists = db.execute(
+        """
+        SELECT 1 FROM information_schema.tables
+        WHERE table_name = 'schema_version'
+        """
+    ).fetchone()
+    if not exists:
+        return 0
+    row = db.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()
+    return row[0]
+
+
+def run_migrations(db):
+    """Apply every pending migration in order; return the versions applied."""
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    current = get_schema_version(db)
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        db.begin()
+        try:
+            for statement in statements:
+                _execute(db, statement)
+            db.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description),
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        print(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+
+def main():
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Manage database schema migrations")
+    parser.add_argument("--db", default=DB_PATH, help="Path to the DuckDB file")
+    parser.add_argument(
+        "--status", action="store_true", help="Show the schema version and exit"
+    )
+    parser.add_argument(
+        "--all-workbooks",
+        action="store_true",
+        help="Also process every workbook file in WORKBOOK_DIR",
+    )
+    args = parser.parse_args()
+
+    paths = [args.db]
+    if args.all_workbooks:
+        paths += sorted(glob.glob(os.path.join(WORKBOOK_DIR, "*.duckdb")))
+    for path in paths:
+        if len(paths) > 1:
+            print(f"{path}:")
+        db = duckdb.connect(path)
+        try:
+            if args.status:
+                latest = MIGRATIONS[-1][0]
+                print(f"Schema version: {get_schema_version(db)} (latest: {latest})")
+                continue
+            applied = run_migrations(db)
+            if not applied:
+                print("Schema is up to date")
+        except duckdb.Error as e:
+            print(f"Migration failed: {str(e)}")
+            raise SystemExit(1)
+        finally:
+            db.close()
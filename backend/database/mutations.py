@@ -0,0 +1,101 @@
+"""Sales write jobs, run by the writer inside its shared transaction.
+
+Each job takes the writer's cursor first, then JSON-compatible arguments,
+and returns a JSON-compatible result, so a reader process can ask the writer
+process to run it (see write_service.OPERATIONS). A job also returns the
+rows its broadcast carries: a reader's snapshot may not show the write yet,
+so it cannot read them back afterwards.
+"""
+
+from backend.config.config import DELTA_MAX_ROWS
+from backend.database.changes import build_changes, get_rows, record_changes
+from backend.database.formulas import (
+    load_graph,
+    recalculate_range,
+    recalculate_rows,
+    retract_rows,
+)
+from backend.database.rollups import (
+    add_range_to_rollups,
+    add_rows_to_rollups,
+    remove_rows_from_rollups,
+)
+from backend.database.sales import (
+    find_existing_invoices,
+    get_row_version,
+    insert_sales,
+    update_sale,
+)
+from backend.database.search import SEARCH_FIELDS, index_range, index_rows, unindex_rows
+
+
+def delta_changes(db, sale_ids, operation):
+    """Get the change entries a data_updated broadcast carries, if few enough."""
+    if len(sale_ids) > DELTA_MAX_ROWS:
+        return None
+    return build_changes(db, {sale_id: operation for sale_id in sale_ids})
+
+
+def add_sale(db, data, username):
+    """Insert a sale unless its invoice number is taken.
+
+    Returns None for a taken invoice, else (id, version, cells, changes).
+    """
+    if find_existing_invoices(db, [str(data["invoice_number"])]):
+        return None
+    sale_id = insert_sales(db, [data], username)[0]
+    add_range_to_rollups(db, sale_id, sale_id)
+    index_range(db, sale_id, sale_id)
+    version = record_changes(db, [sale_id], "insert")
+    cells = recalculate_range(db, sale_id, sale_id, version)
+    return sale_id, version, cells, delta_changes(db, [sale_id], "insert")
+
+
+def add_sales(db, rows, username, errors, invoices):
+    """Insert validated rows unless any of them, or ``errors``, is rejected.
+
+    ``invoices`` maps each row's invoice number to its index. Returns
+    (None, errors, None, None) for a rejected batch, else
+    (ids, version, cells, changes).
+    """
+    errors = list(errors)
+    for invoice in find_existing_invoices(db, invoices):
+        errors.append(
+            {"index": invoices[invoice], "error": "Invoice number already exists"}
+        )
+    if errors:
+        return None, errors, None, None
+    ids = insert_sales(db, rows, username)
+    add_range_to_rollups(db, ids[0], ids[-1])
+    index_range(db, ids[0], ids[-1])
+    version = record_changes(db, ids, "insert")
+    cells = recalculate_range(db, ids[0], ids[-1], version)
+    return ids, version, cells, delta_changes(db, ids, "insert")
+
+
+def edit_sale(db, sale_id, row_version, changes):
+    """Update a sale unless another editor changed it since ``row_version``.
+
+    Returns ("missing", ...), ("duplicate", ...), ("stale", current row, ...)
+    or (new row version, version, cells, change entries).
+    """
+    current = get_row_version(db, sale_id)
+    if current is None:
+        return "missing", None, None, None
+    if current != row_version:
+        return "stale", get_rows(db, [sale_id])[0], None, None
+    if "invoice_number" in changes and find_existing_invoices(
+        db, [str(changes["invoice_number"])], exclude_id=sale_id
+    ):
+        return "duplicate", None, None, None
+    graph = load_graph(db)
+    before = retract_rows(db, graph, [sale_id], list(changes))
+    remove_rows_from_rollups(db, [sale_id])
+    new_row_version = update_sale(db, sale_id, row_version, changes)
+    add_rows_to_rollups(db, [sale_id])
+    if any(field in changes for field in SEARCH_FIELDS):
+        unindex_rows(db, [sale_id])
+        index_rows(db, [sale_id])
+    version = record_changes(db, [sale_id], "update")
+    cells = recalculate_rows(db, graph, [sale_id], list(changes), before, version)
+    return new_row_version, version, cells, delta_changes(db, [sale_id], "update")
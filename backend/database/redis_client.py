@@ -1,73 +1,231 @@
-"""Redis connection management."""
+"""Redis connection management and the write-access lock queue.
+
+A single process-wide connection pool backs every client. Each lock operation
+(acquire, extend, release-and-hand-off, queue position) is one server-side Lua
+script, so it costs one round trip and cannot interleave with another
+client's operation. Queue membership is tracked in a set alongside the FIFO
+list, so enqueueing does not scan the queue, and a hash records when each
+waiting user joined, so the wait can be measured when the lock is granted.
+Every workbook has its own lock and queue.
+"""
+
+import threading
+import time
 
 import redis
 
-from backend.config.config import REDIS_DB, REDIS_HOST, REDIS_PORT
+from backend.config.config import (
+    DEFAULT_WORKBOOK,
+    LOCK_KEY,
+    REDIS_DB,
+    REDIS_HEALTH_CHECK_INTERVAL,
+    REDIS_HOST,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_PORT,
+    REDIS_RETRY_INTERVAL,
+    REDIS_TIMEOUT,
+    WRITE_LOCK_HANDOFF_TTL,
+    WRITE_LOCK_TTL,
+    WRITE_QUEUE_KEY,
+    WRITE_QUEUE_SET_KEY,
+    WRITE_QUEUE_SINCE_KEY,
+)
+from backend.utils.metrics import observe_lock, timed_redis
 
+LOCK_KEYS = [LOCK_KEY, WRITE_QUEUE_KEY, WRITE_QUEUE_SET_KEY, WRITE_QUEUE_SINCE_KEY]
 
-def get_redis():
-    """Get Redis connection."""
-    try:
-        client = redis.Redis(
-            host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True
+
+def lock_keys(workbook=DEFAULT_WORKBOOK):
+    """Get a workbook's lock, queue, queue member and join time keys."""
+    if workbook == DEFAULT_WORKBOOK:
+        return LOCK_KEYS
+    return [f"{key}:{workbook}" for key in LOCK_KEYS]
+
+
+# Milliseconds since a user joined the queue (0 if never queued); forgets them
+WAITED_FUNCTION = """
+local function waited_ms(user)
+    local since = redis.call('HGET', KEYS[4], user)
+    if not since then
+        return 0
+    end
+    redis.call('HDEL', KEYS[4], user)
+    local now = redis.call('TIME')
+    return now[1] * 1000 + math.floor(now[2] / 1000) - tonumber(since)
+end
+"""
+
+# Returns {granted, position, outcome, queue length, waited ms}
+ACQUIRE_SCRIPT = (
+    WAITED_FUNCTION
+    + """
+local holder = redis.call('GET', KEYS[1])
+if holder == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return {1, 0, 'extended', redis.call('LLEN', KEYS[2]), 0}
+end
+if not holder then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    local waited = 0
+    if redis.call('SREM', KEYS[3], ARGV[1]) == 1 then
+        redis.call('LREM', KEYS[2], 0, ARGV[1])
+        waited = waited_ms(ARGV[1])
+    end
+    return {1, 0, 'granted', redis.call('LLEN', KEYS[2]), waited}
+end
+if redis.call('SADD', KEYS[3], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+    local now = redis.call('TIME')
+    redis.call('HSET', KEYS[4], ARGV[1], now[1] * 1000 + math.floor(now[2] / 1000))
+end
+local length = redis.call('LLEN', KEYS[2])
+return {0, redis.call('LPOS', KEYS[2], ARGV[1]) + 1, 'queued', length, 0}
+"""
+)
+
+# Returns 1 if the caller holds the lock (and extends it), else 0
+EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Returns {released, next_holder or false, queue length, next holder's wait ms}
+RELEASE_SCRIPT = (
+    WAITED_FUNCTION
+    + """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return {0, false, redis.call('LLEN', KEYS[2]), 0}
+end
+redis.call('DEL', KEYS[1])
+local next_user = redis.call('LPOP', KEYS[2])
+local waited = 0
+if next_user then
+    redis.call('SREM', KEYS[3], next_user)
+    redis.call('SET', KEYS[1], next_user, 'EX', ARGV[2])
+    waited = waited_ms(next_user)
+end
+return {1, next_user, redis.call('LLEN', KEYS[2]), waited}
+"""
+)
+
+# Returns 0 for the holder, 1-based queue position, or -1 if not waiting
+POSITION_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return 0
+end
+local position = redis.call('LPOS', KEYS[2], ARGV[1])
+if position then
+    return position + 1
+end
+return -1
+"""
+
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client that records the latency of every command it sends."""
+
+    def execute_command(self, *args, **options):
+        with timed_redis(str(args[0]).upper()):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
         )
-        # Test connection
-        client.ping()
-        return client
-    except redis.ConnectionError as e:
-        print(f"Warning: Redis connection failed: {str(e)}")
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    """Pipeline that records each batch as one round trip."""
+
+    def execute(self, raise_on_error=True):
+        with timed_redis("PIPELINE"):
+            return super().execute(raise_on_error)
+
+
+_pool = redis.ConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=REDIS_DB,
+    decode_responses=True,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    socket_timeout=REDIS_TIMEOUT,
+    socket_connect_timeout=REDIS_TIMEOUT,
+    health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+)
+_client = None
+_scripts = {}
+_retry_at = 0.0
+_client_lock = threading.Lock()
+
+
+def get_redis():
+    """Get the shared Redis client, or None while Redis is unreachable.
+
+    The client is created and pinged once; afterwards connections come from
+    the pool, which health-checks idle connections before reuse. After a
+    failed connect, no new attempt is made for REDIS_RETRY_INTERVAL seconds.
+    """
+    global _client, _retry_at
+    if _client is not None:
+        return _client
+    if time.monotonic() < _retry_at:
         return None
-    except Exception as e:
-        print(f"Error: Redis connection error: {str(e)}")
+    with _client_lock:
+        if _client is not None:
+            return _client
+        try:
+            client = InstrumentedRedis(connection_pool=_pool)
+            # Test connection
+            client.ping()
+            _scripts.update(
+                acquire=client.register_script(ACQUIRE_SCRIPT),
+                extend=client.register_script(EXTEND_SCRIPT),
+                release=client.register_script(RELEASE_SCRIPT),
+                position=client.register_script(POSITION_SCRIPT),
+            )
+            _client = client
+            return client
+        except redis.ConnectionError as e:
+            print(f"Warning: Redis connection failed: {str(e)}")
+        except Exception as e:
+            print(f"Error: Redis connection error: {str(e)}")
+        _retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
         return None
 
 
-def request_write_access(redis_client, username):
-    """Request write access for a user."""
+def request_write_access(
+    redis_client, username, ttl=WRITE_LOCK_TTL, workbook=DEFAULT_WORKBOOK
+):
+    """Request write access to a workbook for a user."""
     try:
-        # Check if user already has write access
-        current_lock = redis_client.get("write_lock")
-        if current_lock == username:
-            # User already has access, extend the lock
-            redis_client.expire("write_lock", 10)  # 10 seconds timeout
+        granted, position, outcome, queued, waited = _scripts["acquire"](
+            keys=lock_keys(workbook), args=[username, ttl], client=redis_client
+        )
+        observe_lock(queued, waited if outcome == "granted" else None)
+        if outcome == "extended":
             return True, "Write access extended"
-
-        # Check if any user has write access
-        if current_lock:
-            # Add user to queue if not already in it
-            if username not in redis_client.lrange("write_queue", 0, -1):
-                redis_client.rpush("write_queue", username)
-            queue_position = redis_client.llen("write_queue")
-            return (
-                False,
-                f"Write access is currently held by another user. You are #{queue_position} in queue",
-            )
-
-        # No one has write access, grant it to this user
-        redis_client.set("write_lock", username)
-        redis_client.expire("write_lock", 10)  # 10 seconds timeout
-        return True, "Write access granted"
+        if granted:
+            return True, "Write access granted"
+        return (
+            False,
+            f"Write access is currently held by another user. You are #{position} in queue",
+        )
     except Exception as e:
         print(f"Error requesting write access: {str(e)}")
         return False, str(e)
 
 
-def get_next_user_in_queue(redis_client):
-    """Get the next user in the write access queue."""
+def check_write_access(
+    redis_client, username, ttl=WRITE_LOCK_TTL, workbook=DEFAULT_WORKBOOK
+):
+    """Check if user has write access to a workbook."""
     try:
-        return redis_client.lpop("write_queue")
-    except Exception as e:
-        print(f"Error getting next user in queue: {str(e)}")
-        return None
-
-
-def check_write_access(redis_client, username):
-    """Check if user has write access."""
-    try:
-        current_lock = redis_client.get("write_lock")
-        if current_lock == username:
-            # Extend the lock
-            redis_client.expire("write_lock", 10)  # 10 seconds timeout
+        if _scripts["extend"](
+            keys=lock_keys(workbook), args=[username, ttl], client=redis_client
+        ):
             return True, "Write access maintained"
         return False, "You do not have write access"
     except Exception as e:
@@ -75,28 +233,56 @@ def check_write_access(redis_client, username):
         return False, str(e)
 
 
-def release_write_access(redis_client, username):
-    """Release write access for a user."""
+def release_write_access(
+    redis_client,
+    username,
+    handoff_ttl=WRITE_LOCK_HANDOFF_TTL,
+    workbook=DEFAULT_WORKBOOK,
+):
+    """Release write access to a workbook and hand it to the next user in line.
+
+    Returns ``(success, message, next_user)``; ``next_user`` is None when
+    nobody was waiting.
+    """
     try:
-        current_lock = redis_client.get("write_lock")
-        if current_lock == username:
-            redis_client.delete("write_lock")
-            return True, "Write access released"
-        return False, "You do not have write access"
+        released, next_user, queued, waited = _scripts["release"](
+            keys=lock_keys(workbook),
+            args=[username, handoff_ttl],
+            client=redis_client,
+        )
+        observe_lock(queued, waited if next_user else None)
+        if not released:
+            return False, "You do not have write access", None
+        if next_user:
+            return True, f"Write access released and granted to {next_user}", next_user
+        return True, "Write access released", None
     except Exception as e:
         print(f"Error releasing write access: {str(e)}")
-        return False, str(e)
+        return False, str(e), None
+
+
+def get_queue_position(redis_client, username, workbook=DEFAULT_WORKBOOK):
+    """Get a user's position: 0 if holding the lock, None if not queued."""
+    position = _scripts["position"](
+        keys=lock_keys(workbook), args=[username], client=redis_client
+    )
+    return None if position < 0 else position
 
 
-def get_queue_status(redis_client):
-    """Get current queue status."""
+def get_queue_status(redis_client, workbook=DEFAULT_WORKBOOK):
+    """Get a workbook's lock holder and queue."""
     if not redis_client:
         return [], []
 
-    current_lock = redis_client.get("write_lock")
-    queue = redis_client.lrange("write_queue", 0, -1)
+    # Read the lock holder and queue as one atomic round trip
+    lock_key, queue_key = lock_keys(workbook)[:2]
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.get(lock_key)
+    pipe.lrange(queue_key, 0, -1)
+    current_lock, queue = pipe.execute()
 
     active_users = [current_lock] if current_lock else []
     queue_users = queue
+    observe_lock(len(queue))
 
     return active_users, queue_users
@@ -0,0 +1,213 @@
+"""Client side of the writer process, used when DB_ROLE is "reader".
+
+A reader cannot open the database files for writing, so it sends each write
+job to the writer process (write_server.py) and waits for the commit. Only
+the jobs in write_service.OPERATIONS can be sent, by name, and arguments,
+results and errors travel as JSON, so neither side unpickles anything:
+``writer.run(create_user, username, password_hash, email, name)``.
+"""
+
+import json
+import threading
+import time
+from multiprocessing.connection import Client
+
+from backend.config.config import (
+    DEVELOPMENT,
+    WRITE_TIMEOUT,
+    WRITER_AUTHKEY,
+    WRITER_HOST,
+    WRITER_MAX_MESSAGE,
+    WRITER_PORT,
+    WRITER_SOCKET,
+)
+from backend.database.importer import SalesImportError
+from backend.database.sales import QueryError
+
+# Used when WRITER_AUTHKEY is unset in development only
+DEVELOPMENT_AUTHKEY = b"development-writer-key"
+
+# Errors raised again in the reader under their own type; others arrive as
+# RemoteWriteError
+REMOTE_ERRORS = {
+    "QueryError": QueryError,
+    "TimeoutError": TimeoutError,
+}
+
+
+class RemoteWriteError(Exception):
+    """Raised for a failure in the writer process, or in talking to it."""
+
+
+def writer_address():
+    """Get the writer's Unix socket path, or its (host, port)."""
+    return WRITER_SOCKET or (WRITER_HOST, WRITER_PORT)
+
+
+def writer_authkey():
+    """Get the key readers prove to the writer.
+
+    Outside development an unset WRITER_AUTHKEY stops the process at startup.
+    """
+    if WRITER_AUTHKEY:
+        return WRITER_AUTHKEY.encode()
+    if DEVELOPMENT:
+        return DEVELOPMENT_AUTHKEY
+    raise RuntimeError(
+        "WRITER_AUTHKEY must be set to a secret shared by the writer and readers"
+    )
+
+
+def send_message(conn, message):
+    """Send a JSON message."""
+    conn.send_bytes(json.dumps(message).encode())
+
+
+def recv_message(conn):
+    """Receive a JSON message, refusing one over WRITER_MAX_MESSAGE bytes."""
+    return json.loads(conn.recv_bytes(WRITER_MAX_MESSAGE))
+
+
+def error_reply(error):
+    """Describe an exception for the reader that made the request."""
+    reply = {"error": type(error).__name__, "message": str(error)}
+    if isinstance(error, SalesImportError):
+        reply["errors"] = error.errors
+    return reply
+
+
+def raise_error(reply):
+    """Raise the exception an error reply describes."""
+    name, message = reply["error"], reply["message"]
+    if name == "SalesImportError":
+        raise SalesImportError(message, reply.get("errors"))
+    if name in REMOTE_ERRORS:
+        raise REMOTE_ERRORS[name](message)
+    raise RemoteWriteError(f"{name}: {message}")
+
+
+class WriterClient:
+    """Pool of authenticated connections to the writer process.
+
+    A connection carries one call at a time; idle ones are reused.
+    """
+
+    def __init__(self, address=None, authkey=None, run=None):
+        self.address = address or writer_address()
+        self.authkey = authkey or writer_authkey()
+        self._run = run
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """Reuse an idle connection or open a new one."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return Client(self.address, authkey=self.authkey)
+
+    def _call(self, message, timeout):
+        """Send a request and wait up to ``timeout`` seconds for its reply."""
+        conn = self._connect()
+        try:
+            send_message(conn, message)
+            if timeout is not None and not conn.poll(timeout):
+                raise TimeoutError(f"No reply from the writer after {timeout}s")
+            reply = recv_message(conn)
+        except BaseException:
+            # The reply may still arrive, so the connection cannot be reused
+            conn.close()
+            raise
+        with self._lock:
+            self._idle.append(conn)
+        if "error" in reply:
+            raise_error(reply)
+        return reply["result"]
+
+    def call(self, message, timeout=WRITE_TIMEOUT):
+        """Make a request, off the event loop under eventlet or gevent."""
+        if self._run:
+            return self._run(self._call, message, timeout)
+        return self._call(message, timeout)
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class RemoteWriter:
+    """Stands in for a workbook's Writer in a reader process."""
+
+    def __init__(self, workbook, client):
+        self.workbook = workbook
+        self.client = client
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._calls = 0
+        self._errors = 0
+        self._wait_time = 0.0
+
+    def run(self, work, *args, timeout=WRITE_TIMEOUT, **kwargs):
+        """Have the writer run ``work(db, *args, **kwargs)``; return its result.
+
+        ``work`` is sent by name, so it must be one of the writer's OPERATIONS.
+        Tuples in the result come back as lists.
+        """
+        started = time.monotonic()
+        with self._lock:
+            self._pending += 1
+        try:
+            return self.client.call(
+                {
+                    "op": work.__name__,
+                    "workbook": self.workbook,
+                    "args": args,
+                    "kwargs": kwargs,
+                    "timeout": timeout,
+                },
+                timeout,
+            )
+        except Exception:
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._calls += 1
+                self._wait_time += time.monotonic() - started
+
+    def create(self, owner):
+        """Have the writer create the workbook; see db.create_workbook()."""
+        return self.client.call(
+            {"op": "create", "workbook": self.workbook, "owner": owner}
+        )
+
+    def want_publish(self):
+        """Have the writer publish the workbook's new commits without backing off."""
+        self.client.call({"op": "publish", "workbook": self.workbook})
+
+    def idle(self):
+        """Whether no call is waiting on the writer."""
+        return not self._pending
+
+    def close(self):
+        """Nothing to stop; the connections are shared between workbooks."""
+
+    def stats(self):
+        """Return counters for calls made to the writer."""
+        with self._lock:
+            return {
+                "remote": True,
+                "pending": self._pending,
+                "calls": self._calls,
+                "errors": self._errors,
+                "avg_wait_ms": (
+                    round(self._wait_time / self._calls * 1000, 3)
+                    if self._calls
+                    else 0.0
+                ),
+            }
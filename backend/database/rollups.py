@@ -0,0 +1,202 @@
+"""Aggregation queries and incrementally maintained rollup tables.
+
+Group-by and pivot requests are answered from a rollup table when its keys
+cover the requested dimensions and filters, and from ``sales`` otherwise.
+Rollups are updated in the same transaction as every insert into ``sales``.
+"""
+
+import json
+
+from backend.database.sales import FILTERS, QueryError, build_where
+from backend.utils.metrics import timed_query
+
+# Dimension name -> SQL expression over a table that has the source column
+DIMENSIONS = {
+    "date": "strftime(date, '%Y-%m-%d')",
+    "month": "strftime(date, '%Y-%m')",
+    "year": "year(date)",
+    "category": "category",
+    "location": "location",
+    "customer_name": "customer_name",
+    "product_name": "product_name",
+    "unit": "unit",
+    "created_by": "created_by",
+}
+
+# Source column each dimension needs
+DIMENSION_COLUMNS = {"date": "date", "month": "date", "year": "date"}
+
+# Metric name -> (expression over sales, expression over a rollup table)
+METRICS = {
+    "sum": ("SUM(volume_sold)", "SUM(total_volume)"),
+    "count": ("COUNT(*)", "SUM(row_count)"),
+    "avg": ("AVG(volume_sold)", "SUM(total_volume) / SUM(row_count)"),
+    "min": ("MIN(volume_sold)", None),
+    "max": ("MAX(volume_sold)", None),
+}
+
+# Rollup table -> key columns
+ROLLUPS = {
+    "sales_daily_category": ["date", "category"],
+    "sales_location_category": ["location", "category"],
+}
+
+# Matches the sales whose ids are bound as one JSON array
+IDS_PREDICATE = "id IN (SELECT unnest(from_json(?, '[\"BIGINT\"]')))"
+
+# Most distinct pivot values turned into columns
+MAX_PIVOT_COLUMNS = 100
+
+# Filter name -> source column it constrains
+FILTER_COLUMNS = {
+    "date_from": "date",
+    "date_to": "date",
+    "category": "category",
+    "location": "location",
+    "customer": "customer_name",
+    "created_by": "created_by",
+}
+
+
+def _split_list(value):
+    """Split a comma-separated argument into its non-empty items."""
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def parse_aggregate_query(args):
+    """Build aggregation options from request arguments."""
+    group_by = _split_list(args.get("group_by"))
+    metrics = _split_list(args.get("metrics")) or ["sum", "count"]
+    pivot = args.get("pivot") or None
+
+    for dimension in group_by + ([pivot] if pivot else []):
+        if dimension not in DIMENSIONS:
+            raise QueryError(f"Cannot group by: {dimension}")
+    if pivot and pivot in group_by:
+        raise QueryError("The pivot dimension cannot also be a group_by dimension")
+    for metric in metrics:
+        if metric not in METRICS:
+            raise QueryError(f"Unknown metric: {metric}")
+
+    filters = {name: args.get(name) for name in FILTERS if args.get(name)}
+    return {
+        "group_by": group_by,
+        "metrics": metrics,
+        "pivot": pivot,
+        "filters": filters,
+    }
+
+
+def choose_source(dimensions, metrics, filters):
+    """Pick the smallest table that can answer the query."""
+    if all(METRICS[m][1] is not None for m in metrics):
+        needed = {DIMENSION_COLUMNS.get(d, d) for d in dimensions}
+        needed |= {FILTER_COLUMNS[f] for f in filters}
+        for table, keys in ROLLUPS.items():
+            if needed <= set(keys):
+                return table
+    return "sales"
+
+
+@timed_query("aggregate", lambda result: len(result[1]))
+def aggregate(db, group_by, metrics, pivot=None, filters=None):
+    """Run a group-by (optionally pivoted) aggregation.
+
+    Returns ``(columns, rows, source)``.
+    """
+    filters = filters or {}
+    dimensions = group_by + ([pivot] if pivot else [])
+    source = choose_source(dimensions, metrics, filters)
+    metric_index = 0 if source == "sales" else 1
+    clauses, params = build_where(filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    selects = [f"{DIMENSIONS[d]} AS {d}" for d in group_by]
+    columns = list(group_by)
+
+    if pivot:
+        pivot_values = [
+            row[0]
+            for row in db.execute(
+                f"""
+                SELECT DISTINCT {DIMENSIONS[pivot]} AS value
+                FROM {source} {where}
+                ORDER BY value
+                LIMIT {MAX_PIVOT_COLUMNS + 1}
+                """,
+                params,
+            ).fetchall()
+        ]
+        if len(pivot_values) > MAX_PIVOT_COLUMNS:
+            raise QueryError(
+                f"{pivot} has more than {MAX_PIVOT_COLUMNS} values to pivot on"
+            )
+        pivot_params = []
+        for value in pivot_values:
+            for metric in metrics:
+                expression = METRICS[metric][metric_index]
+                selects.append(f"{expression} FILTER (WHERE {DIMENSIONS[pivot]} = ?)")
+                pivot_params.append(value)
+                columns.append(str(value) if len(metrics) == 1 else f"{value}_{metric}")
+        params = pivot_params + params
+    else:
+        for metric in metrics:
+            selects.append(METRICS[metric][metric_index])
+            columns.append(metric)
+
+    group = "GROUP BY ALL" if group_by else ""
+    positions = ", ".join(str(i + 1) for i in range(len(group_by)))
+    order = f"ORDER BY {positions}" if group_by else ""
+    rows = db.execute(
+        f"""
+        SELECT {", ".join(selects)}
+        FROM {source}
+        {where}
+        {group}
+        {order}
+        """,
+        params,
+    ).fetchall()
+    return columns, rows, source
+
+
+def _rollup_upsert(table, keys, where, sign=1):
+    """SQL that folds the sales rows matching ``where`` into a rollup table.
+
+    A ``sign`` of -1 takes the rows back out, e.g. before they are updated.
+    """
+    key_list = ", ".join(keys)
+    return f"""
+        INSERT INTO {table} ({key_list}, total_volume, row_count)
+        SELECT {key_list}, {sign} * SUM(volume_sold), {sign} * COUNT(*)
+        FROM sales
+        WHERE {where}
+        GROUP BY {key_list}
+        ON CONFLICT ({key_list}) DO UPDATE SET
+            total_volume = total_volume + excluded.total_volume,
+            row_count = row_count + excluded.row_count
+    """
+
+
+def add_range_to_rollups(db, first_id, last_id):
+    """Fold a contiguous id range of new sales into every rollup table."""
+    for table, keys in ROLLUPS.items():
+        db.execute(
+            _rollup_upsert(table, keys, "id BETWEEN ? AND ?"), (first_id, last_id)
+        )
+
+
+def add_rows_to_rollups(db, sale_ids):
+    """Fold the current values of the given sales into every rollup table."""
+    for table, keys in ROLLUPS.items():
+        db.execute(_rollup_upsert(table, keys, IDS_PREDICATE), (json.dumps(sale_ids),))
+
+
+def remove_rows_from_rollups(db, sale_ids):
+    """Take the current values of the given sales out of every rollup table."""
+    for table, keys in ROLLUPS.items():
+        db.execute(
+            _rollup_upsert(table, keys, IDS_PREDICATE, sign=-1),
+            (json.dumps(sale_ids),),
+        )
+        db.execute(f"DELETE FROM {table} WHERE row_count = 0")
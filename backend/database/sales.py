@@ -0,0 +1,363 @@
+"""Sales queries with server-side filtering, sorting and keyset pagination."""
+
+import base64
+import datetime
+import decimal
+import json
+import re
+
+from backend.config.config import SALES_MAX_PAGE_SIZE, SALES_PAGE_SIZE
+from backend.utils.metrics import timed_query
+
+# Columns returned to the spreadsheet grid, in display order. Values are
+# JSON-ready so rows can go out over Socket.IO as well as through jsonify.
+READ_COLUMNS = [
+    "strftime('%Y-%m-%d', date) AS date",
+    "invoice_number",
+    "customer_name",
+    "location",
+    "product_name",
+    "category",
+    "CAST(volume_sold AS VARCHAR) AS volume_sold",
+    "unit",
+    "created_by",
+    "id",
+    "row_version",
+]
+# Position of the sale id in a READ_COLUMNS row
+ID_INDEX = 9
+
+# Query-string parameter -> SQL predicate
+FILTERS = {
+    "date_from": "date >= ?",
+    "date_to": "date <= ?",
+    "category": "category = ?",
+    "location": "location = ?",
+    "customer": "customer_name = ?",
+    "created_by": "created_by = ?",
+}
+DATE_FILTERS = {"date_from", "date_to"}
+# Filters backed by an index (see migration 8)
+INDEXED_FILTERS = {"customer"}
+
+SORTABLE_COLUMNS = {
+    "date",
+    "invoice_number",
+    "customer_name",
+    "location",
+    "product_name",
+    "category",
+    "volume_sold",
+    "unit",
+    "created_by",
+    "created_at",
+}
+
+
+# Fields a client supplies for each sale, with the SQL type used for bulk insert
+SALE_FIELDS = [
+    ("date", "DATE"),
+    ("invoice_number", "VARCHAR"),
+    ("customer_name", "VARCHAR"),
+    ("location", "VARCHAR"),
+    ("product_name", "VARCHAR"),
+    ("category", "VARCHAR"),
+    ("volume_sold", "DECIMAL(10,2)"),
+    ("unit", "VARCHAR"),
+]
+
+
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+# Plain decimal notation: no exponent, NaN or infinity
+VOLUME_PATTERN = re.compile(r"-?\d+(\.\d+)?")
+# Largest value DECIMAL(10,2) holds
+MAX_VOLUME = decimal.Decimal("99999999.99")
+
+
+class QueryError(ValueError):
+    """Raised for invalid filter, sort or paging parameters."""
+
+
+def encode_cursor(sort_value, row_id):
+    """Encode the last row's sort key as an opaque cursor."""
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _parse_decimal(value):
+    """Parse a DECIMAL sort value, rejecting NaN and infinities."""
+    number = decimal.Decimal(value)
+    if not number.is_finite():
+        raise ValueError(f"Not a finite number: {value}")
+    return number
+
+
+# Sort column -> parser its cursor value must pass; other columns are text.
+# Cursor values are the sort column cast to VARCHAR (see build_page_query).
+CURSOR_PARSERS = {
+    "date": datetime.date.fromisoformat,
+    "volume_sold": _parse_decimal,
+    "created_at": datetime.datetime.fromisoformat,
+}
+
+
+def decode_cursor(cursor, sort=None):
+    """Decode a cursor produced by encode_cursor().
+
+    With ``sort``, the sort value must also fit that column, so a cursor
+    made for another sort is rejected here rather than failing in DuckDB.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(row_id, bool):
+            raise TypeError("Cursor id must be an integer")
+        row_id = int(row_id)
+        if sort is not None:
+            if not isinstance(sort_value, str):
+                raise TypeError("Cursor sort value must be a string")
+            CURSOR_PARSERS.get(sort, str)(sort_value)
+        return sort_value, row_id
+    except (ValueError, TypeError, ArithmeticError) as e:
+        raise QueryError("Invalid cursor") from e
+
+
+def parse_sales_query(args):
+    """Build query options from request arguments."""
+    filters = {}
+    for name in FILTERS:
+        value = args.get(name)
+        if not value:
+            continue
+        if name in DATE_FILTERS:
+            try:
+                datetime.date.fromisoformat(value)
+            except ValueError as e:
+                raise QueryError(f"{name} must be a YYYY-MM-DD date") from e
+        filters[name] = value
+
+    sort = args.get("sort", "date")
+    if sort not in SORTABLE_COLUMNS:
+        raise QueryError(f"Cannot sort by: {sort}")
+
+    direction = args.get("direction", "desc").lower()
+    if direction not in ("asc", "desc"):
+        raise QueryError("Direction must be 'asc' or 'desc'")
+
+    try:
+        limit = int(args.get("limit", SALES_PAGE_SIZE))
+    except ValueError as e:
+        raise QueryError("Limit must be an integer") from e
+    if limit < 1:
+        raise QueryError("Limit must be positive")
+    limit = min(limit, SALES_MAX_PAGE_SIZE)
+
+    cursor = args.get("cursor")
+    return {
+        "filters": filters,
+        "sort": sort,
+        "direction": direction,
+        "limit": limit,
+        "cursor": decode_cursor(cursor, sort) if cursor else None,
+    }
+
+
+def build_where(filters):
+    """Build a WHERE clause and parameters from validated filters."""
+    clauses = []
+    params = []
+    for name, value in filters.items():
+        clauses.append(FILTERS[name])
+        params.append(value)
+    return clauses, params
+
+
+def build_page_query(
+    filters=None,
+    sort="date",
+    direction="desc",
+    limit=SALES_PAGE_SIZE,
+    cursor=None,
+    columns=READ_COLUMNS,
+    offset=0,
+):
+    """Build the SELECT for one page of sales; return (sql, params).
+
+    Pages are addressed by the (sort column, id) of the last row seen rather
+    than an OFFSET, so every page costs the same regardless of depth; a small
+    ``offset`` past the cursor is allowed for windows (see windows.py). One
+    extra row is selected to tell whether there is a next page, and every
+    row ends with its cursor key (``_cursor_sort``, ``_cursor_id``).
+    """
+    clauses, params = build_where(filters or {})
+
+    op = "<" if direction == "desc" else ">"
+    if cursor is not None:
+        sort_value, row_id = cursor
+        clauses.append(
+            f"(sales.{sort} {op} ? OR (sales.{sort} = ? AND sales.id {op} ?))"
+        )
+        params.extend([sort_value, sort_value, row_id])
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    source = "sales"
+    if INDEXED_FILTERS & set(filters or {}):
+        # DuckDB skips the index when the scan feeds a top-N directly, so
+        # fetch the (few) matching rows on their own first
+        source = (
+            f"(WITH matched AS MATERIALIZED (SELECT * FROM sales {where}) "
+            "SELECT * FROM matched) sales"
+        )
+        where = ""
+    order = direction.upper()
+    # Pick the page first and format only its rows; otherwise DuckDB evaluates
+    # the output expressions for every row before the top-N
+    sql = f"""
+        SELECT {", ".join(columns)},
+            CAST(sales.{sort} AS VARCHAR) AS _cursor_sort, sales.id AS _cursor_id
+        FROM (
+            SELECT * FROM {source}
+            {where}
+            ORDER BY sales.{sort} {order}, sales.id {order}
+            LIMIT ? OFFSET ?
+        ) sales
+        ORDER BY sales.{sort} {order}, sales.id {order}
+        """
+    return sql, params + [limit + 1, offset]
+
+
+@timed_query("query_sales", lambda result: len(result[0]))
+def query_sales(
+    db,
+    filters=None,
+    sort="date",
+    direction="desc",
+    limit=SALES_PAGE_SIZE,
+    cursor=None,
+    columns=READ_COLUMNS,
+    offset=0,
+):
+    """Fetch one page of sales rows; return (rows, next_cursor)."""
+    sql, params = build_page_query(
+        filters, sort, direction, limit, cursor, columns, offset
+    )
+    rows = db.execute(sql, params).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+    return [row[:-2] for row in rows], next_cursor
+
+
+def validate_sale(data, partial=False):
+    """Return an error message for an invalid sale, or None if it is valid.
+
+    With ``partial``, only the fields present in ``data`` are checked.
+    """
+    if not isinstance(data, dict):
+        return "Row must be an object"
+    for field, _ in SALE_FIELDS:
+        if partial and field not in data:
+            continue
+        if field not in data or not data[field]:
+            return f"Missing required field: {field}"
+    if "date" in data:
+        date = data["date"]
+        try:
+            if not isinstance(date, str) or not DATE_PATTERN.fullmatch(date):
+                raise ValueError(date)
+            datetime.date.fromisoformat(date)
+        except ValueError:
+            return "date must be a YYYY-MM-DD date"
+    if "volume_sold" in data:
+        volume = data["volume_sold"]
+        # Bound as text and cast by DuckDB, which turns anything else into NULL
+        if isinstance(volume, bool) or not VOLUME_PATTERN.fullmatch(str(volume)):
+            return "volume_sold must be a number"
+        if abs(decimal.Decimal(str(volume))) > MAX_VOLUME:
+            return f"volume_sold must be at most {MAX_VOLUME} in magnitude"
+    return None
+
+
+@timed_query("find_existing_invoices")
+def find_existing_invoices(db, invoice_numbers, exclude_id=None):
+    """Return the subset of invoice numbers already present in sales.
+
+    ``exclude_id`` ignores one sale, so an update can keep its own invoice.
+    """
+    rows = db.execute(
+        """
+        SELECT invoice_number FROM sales
+        WHERE invoice_number IN (SELECT unnest(from_json(?, '["VARCHAR"]')))
+        AND id IS DISTINCT FROM ?
+        """,
+        (json.dumps(list(invoice_numbers)), exclude_id),
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+@timed_query("get_row_version", lambda version: int(version is not None))
+def get_row_version(db, sale_id):
+    """Get a sale's current row version, or None if it does not exist."""
+    row = db.execute(
+        "SELECT row_version FROM sales WHERE id = ?", (sale_id,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+@timed_query("update_sale", lambda version: int(version is not None))
+def update_sale(db, sale_id, row_version, changes):
+    """Update a sale only if it is still at ``row_version``.
+
+    Returns the new row version, or None when the row was changed or deleted
+    since the caller read it. The new version is read back with a SELECT in
+    the same transaction: UPDATE ... RETURNING on a table with a primary key
+    fails with a duplicate-key error on DuckDB 0.10.
+    """
+    fields = [(field, sql_type) for field, sql_type in SALE_FIELDS if field in changes]
+    assignments = [f"{field} = CAST(? AS {sql_type})" for field, sql_type in fields]
+    (updated,) = db.execute(
+        f"""
+        UPDATE sales
+        SET {", ".join(assignments)},
+            row_version = row_version + 1,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND row_version = ?
+        """,
+        [str(changes[field]) for field, _ in fields] + [sale_id, row_version],
+    ).fetchone()
+    if not updated:
+        return None
+    return get_row_version(db, sale_id)
+
+
+@timed_query("insert_sales")
+def insert_sales(db, sales, username):
+    """Insert validated sales in a single statement; return their new ids.
+
+    Each column is bound as one JSON array and unnested server-side, so a batch
+    of any size is one round trip through DuckDB's vectorized insert with no
+    per-value conversion in Python. Ids come from ``sales_id_seq``; they are
+    consecutive because only the writer thread inserts sales.
+    """
+    columns = [field for field, _ in SALE_FIELDS] + ["created_by"]
+    selects = []
+    params = []
+    for field, sql_type in SALE_FIELDS:
+        selects.append(f"unnest(from_json(?, '[\"{sql_type}\"]'))")
+        params.append(json.dumps([str(sale[field]) for sale in sales]))
+    selects.append("unnest(from_json(?, '[\"VARCHAR\"]'))")
+    params.append(json.dumps([username] * len(sales)))
+
+    # nextval sits outside the unnest so it runs once per row, not per list
+    db.execute(
+        f"""
+        INSERT INTO sales (id, {", ".join(columns)})
+        SELECT nextval('sales_id_seq'), *
+        FROM (SELECT {", ".join(selects)})
+        """,
+        params,
+    )
+    last_id = db.execute("SELECT currval('sales_id_seq')").fetchone()[0]
+    return list(range(last_id - len(sales) + 1, last_id + 1))
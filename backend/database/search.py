@@ -0,0 +1,312 @@
+"""Prefix and fuzzy search over the text fields of sales.
+
+``sales_search_terms`` holds one row per distinct lowercase word of a sale's
+searchable fields. It is kept in (term, sale_id) order, so DuckDB's
+per-row-group min/max statistics skip every group outside a word's prefix
+range and a type-ahead lookup reads only a few row groups. Writes index and
+unindex just the sales they touch, inside their own transaction. Their
+postings are appended after the sorted ones, and once they make up more than
+SEARCH_UNSORTED_RATIO of the index it is rewritten in order.
+"""
+
+import json
+import re
+
+from backend.config.config import (
+    SEARCH_CANDIDATES,
+    SEARCH_COMPACT_MIN_POSTINGS,
+    SEARCH_MAX_PAGE_SIZE,
+    SEARCH_PAGE_SIZE,
+    SEARCH_UNSORTED_RATIO,
+)
+from backend.database.sales import (
+    READ_COLUMNS,
+    QueryError,
+    decode_cursor,
+    encode_cursor,
+)
+from backend.utils.metrics import timed_query
+
+SEARCH_FIELDS = ["invoice_number", "customer_name", "location", "product_name"]
+
+# Words of a sale's searchable fields; keep in step with tokenize()
+TERMS_SQL = (
+    f"unnest(regexp_split_to_array("
+    f"lower(concat_ws(' ', {', '.join(SEARCH_FIELDS)})), '[^\\pL\\pN]+'))"
+)
+SALE_IDS_PREDICATE = "sale_id IN (SELECT unnest(from_json(?, '[\"BIGINT\"]')))"
+
+# Score of a query word matching a term exactly, as a prefix, or one edit away
+EXACT_SCORE = 3
+PREFIX_SCORE = 2
+FUZZY_SCORE = 1
+# Shorter words are too ambiguous to correct
+FUZZY_MIN_LENGTH = 4
+MAX_QUERY_WORDS = 8
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    """Split text into lowercase words the way the index does."""
+    return _WORD.findall(text.lower())
+
+
+def _prefix_range(prefix):
+    """Get the [low, high) term range that starts with ``prefix``."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _index(db, where, params):
+    """Add the terms of the sales matching ``where``, in term order."""
+    (added,) = db.execute(
+        f"""
+        INSERT INTO sales_search_terms (term, sale_id)
+        SELECT DISTINCT term, sale_id
+        FROM (SELECT {TERMS_SQL} AS term, id AS sale_id FROM sales WHERE {where})
+        WHERE term <> ''
+        ORDER BY term, sale_id
+        """,
+        params,
+    ).fetchone()
+    db.execute(
+        "UPDATE sales_search_state SET unsorted_postings = unsorted_postings + ?",
+        (added,),
+    )
+    sorted_postings, unsorted_postings = db.execute(
+        "SELECT sorted_postings, unsorted_postings FROM sales_search_state"
+    ).fetchone()
+    if unsorted_postings > max(
+        SEARCH_COMPACT_MIN_POSTINGS, SEARCH_UNSORTED_RATIO * sorted_postings
+    ):
+        compact_search_terms(db)
+
+
+@timed_query("compact_search_terms", lambda postings: postings)
+def compact_search_terms(db):
+    """Rewrite the index in (term, sale_id) order; return its posting count.
+
+    Appended postings sit in row groups whose min/max statistics span most
+    terms, so prefix and id range filters cannot skip them until this runs.
+    The rewrite goes to a new table, leaving no deleted rows behind.
+    """
+    db.execute(
+        """
+        CREATE OR REPLACE TEMP TABLE sorted_search_terms AS
+        SELECT term, sale_id FROM sales_search_terms ORDER BY term, sale_id
+        """
+    )
+    db.execute(
+        """
+        CREATE OR REPLACE TABLE sales_search_terms (
+            term VARCHAR NOT NULL,
+            sale_id BIGINT NOT NULL
+        )
+        """
+    )
+    (postings,) = db.execute(
+        """
+        INSERT INTO sales_search_terms
+        SELECT term, sale_id FROM sorted_search_terms ORDER BY term, sale_id
+        """
+    ).fetchone()
+    db.execute("DROP TABLE sorted_search_terms")
+    db.execute(
+        "UPDATE sales_search_state SET sorted_postings = ?, unsorted_postings = 0",
+        (postings,),
+    )
+    return postings
+
+
+def index_range(db, first_id, last_id):
+    """Index a contiguous range of newly inserted sales."""
+    _index(db, "id BETWEEN ? AND ?", [first_id, last_id])
+
+
+def index_rows(db, sale_ids):
+    """Index specific sales."""
+    _index(
+        db,
+        "id IN (SELECT unnest(from_json(?, '[\"BIGINT\"]')))",
+        [json.dumps(list(sale_ids))],
+    )
+
+
+def unindex_rows(db, sale_ids):
+    """Remove specific sales from the index, e.g. before re-indexing an update."""
+    db.execute(
+        f"DELETE FROM sales_search_terms WHERE {SALE_IDS_PREDICATE}",
+        (json.dumps(list(sale_ids)),),
+    )
+
+
+def parse_search_query(args):
+    """Build search options from request arguments."""
+    words = tokenize(args.get("q", ""))
+    if not words:
+        raise QueryError("q must contain at least one letter or digit")
+    if len(words) > MAX_QUERY_WORDS:
+        raise QueryError(f"q may contain at most {MAX_QUERY_WORDS} words")
+
+    try:
+        limit = int(args.get("limit", SEARCH_PAGE_SIZE))
+    except ValueError as e:
+        raise QueryError("Limit must be an integer") from e
+    if limit < 1:
+        raise QueryError("Limit must be positive")
+
+    cursor = args.get("cursor")
+    cursor = decode_cursor(cursor) if cursor else None
+    # Search pages are keyed by a numeric score
+    if cursor is not None and (
+        isinstance(cursor[0], bool) or not isinstance(cursor[0], (int, float))
+    ):
+        raise QueryError("Invalid cursor")
+    return {
+        "words": list(dict.fromkeys(words)),
+        "limit": min(limit, SEARCH_MAX_PAGE_SIZE),
+        "cursor": cursor,
+    }
+
+
+def _count_capped(db, predicate, params):
+    """Count postings matching ``predicate``, stopping past SEARCH_CANDIDATES."""
+    return db.execute(
+        f"""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM sales_search_terms WHERE {predicate} LIMIT ?
+        )
+        """,
+        params + [SEARCH_CANDIDATES + 1],
+    ).fetchone()[0]
+
+
+def _resolve_word(db, word):
+    """Work out how one query word selects and scores postings.
+
+    Returns ``(predicate, params, score, score_params, count)``, or None when
+    nothing matches even allowing for a typo. ``count`` is capped.
+    """
+    low, high = _prefix_range(word)
+    predicate = "term >= ? AND term < ?"
+    count = _count_capped(db, predicate, [low, high])
+    if count:
+        return (
+            predicate,
+            [low, high],
+            "CASE WHEN term = ? THEN ? ELSE ? END",
+            [word, EXACT_SCORE, PREFIX_SCORE],
+            count,
+        )
+    if len(word) < FUZZY_MIN_LENGTH:
+        return None
+
+    # No prefix match: try terms one edit away that share the first letter
+    low, high = _prefix_range(word[0])
+    corrections = db.execute(
+        """
+        SELECT term FROM (
+            SELECT DISTINCT term FROM sales_search_terms
+            WHERE term >= ? AND term < ? AND length(term) BETWEEN ? AND ?
+        )
+        WHERE damerau_levenshtein(term, ?) <= 1
+        """,
+        (low, high, len(word) - 1, len(word) + 1, word),
+    ).fetchall()
+    if not corrections:
+        return None
+    terms = [row[0] for row in corrections]
+    predicate = f"term IN ({', '.join('?' for _ in terms)})"
+    return predicate, terms, "?", [FUZZY_SCORE], _count_capped(db, predicate, terms)
+
+
+@timed_query("search_sales", lambda result: len(result[0]))
+def search_sales(db, words, limit=SEARCH_PAGE_SIZE, cursor=None, columns=READ_COLUMNS):
+    """Rank the sales that match every word.
+
+    Returns ``(rows, next_cursor, truncated)``.
+
+    Each word matches a term exactly, as a prefix (so results follow the
+    user's typing) or, failing both, with one typo. A sale scores the sum of
+    its best match per word. Pages are addressed by the (score, id) of the
+    last row seen, as in query_sales().
+
+    When even the word with the fewest matches has more than
+    SEARCH_CANDIDATES of them, only about that many of the newest are ranked,
+    so a query made of common words like a city name stays cheap; ``truncated``
+    is then True. In the sorted part of the index the id bound skips whole
+    row groups.
+    """
+    resolved = []
+    for word in words:
+        match = _resolve_word(db, word)
+        if match is None:
+            return [], None, False
+        resolved.append(match)
+
+    # Candidates are the sales matching the word with the fewest postings
+    driver = min(resolved, key=lambda match: match[4])
+    low_id, high_id, count = db.execute(
+        f"""
+        SELECT MIN(sale_id), MAX(sale_id), COUNT(*)
+        FROM sales_search_terms
+        WHERE {driver[0]}
+        """,
+        driver[1],
+    ).fetchone()
+    truncated = count > SEARCH_CANDIDATES
+    if truncated:
+        # Estimate the id above which about SEARCH_CANDIDATES of them lie
+        low_id = high_id - SEARCH_CANDIDATES * (high_id - low_id + 1) // count
+    candidates = f"""
+        SELECT sale_id FROM sales_search_terms
+        WHERE {driver[0]} AND sale_id BETWEEN ? AND ?
+    """
+
+    matches = []
+    params = []
+    for match in resolved:
+        predicate, predicate_params, score, score_params, _ = match
+        sql = f"""
+            SELECT sale_id, MAX({score}) AS score
+            FROM sales_search_terms
+            WHERE {predicate} AND sale_id BETWEEN ? AND ?
+        """
+        params.extend(score_params + predicate_params + [low_id, high_id])
+        if match is not driver:
+            sql += f" AND sale_id IN ({candidates})"
+            params.extend(driver[1] + [low_id, high_id])
+        matches.append(sql + " GROUP BY sale_id")
+    params.append(len(words))
+
+    page_clause = ""
+    if cursor is not None:
+        score, row_id = cursor
+        page_clause = "WHERE score < ? OR (score = ? AND sale_id < ?)"
+        params.extend([score, score, row_id])
+
+    rows = db.execute(
+        f"""
+        WITH ranked AS (
+            SELECT sale_id, SUM(score) AS score
+            FROM ({" UNION ALL ".join(matches)})
+            GROUP BY sale_id
+            HAVING COUNT(*) = ?
+        )
+        SELECT {", ".join(columns)}, ranked.score, sales.id
+        FROM (
+            SELECT * FROM ranked {page_clause}
+            ORDER BY score DESC, sale_id DESC
+            LIMIT ?
+        ) ranked
+        JOIN sales ON sales.id = ranked.sale_id
+        ORDER BY ranked.score DESC, sales.id DESC
+        """,
+        params + [limit + 1],
+    ).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][-2], rows[-1][-1])
+    return [row[:-2] for row in rows], next_cursor, truncated
@@ -0,0 +1,115 @@
+"""Read-only workbook snapshots published by the writer process.
+
+DuckDB lets one process open a file for writing, and no other process may
+open it at all while it does, not even read-only. So the writer copies each
+workbook into a new snapshot file after it commits, and reader processes
+open the newest snapshot read-only. A snapshot lands in
+SNAPSHOT_DIR/<workbook>/ and becomes visible once current.json, replaced
+atomically, names it.
+"""
+
+import json
+import os
+import time
+
+from backend.config.config import SNAPSHOT_DIR, SNAPSHOT_KEEP
+
+MANIFEST_NAME = "current.json"
+
+
+class SnapshotNotFoundError(Exception):
+    """Raised when a workbook has no published snapshot yet."""
+
+
+def snapshot_dir(workbook):
+    """Get the directory holding a workbook's snapshots."""
+    return os.path.join(SNAPSHOT_DIR, workbook)
+
+
+def manifest_path(workbook):
+    """Get the file naming a workbook's current snapshot."""
+    return os.path.join(snapshot_dir(workbook), MANIFEST_NAME)
+
+
+def has_snapshot(workbook):
+    """Whether a snapshot of the workbook has been published."""
+    return os.path.exists(manifest_path(workbook))
+
+
+def list_snapshot_workbooks():
+    """Get the names of every workbook with a published snapshot."""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    return sorted(name for name in os.listdir(SNAPSHOT_DIR) if has_snapshot(name))
+
+
+def read_manifest(workbook):
+    """Get ``{"path", "version", "published_at"}`` of the current snapshot."""
+    try:
+        with open(manifest_path(workbook)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise SnapshotNotFoundError(f"No snapshot of workbook {workbook}") from None
+    manifest["path"] = os.path.join(snapshot_dir(workbook), manifest["path"])
+    return manifest
+
+
+def manifest_mtime(workbook):
+    """Get when the current snapshot was published, or None; costs one stat."""
+    try:
+        return os.stat(manifest_path(workbook)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def publish_snapshot(db, workbook):
+    """Copy the database behind ``db`` into a new snapshot and make it current.
+
+    COPY FROM DATABASE reads one consistent view, so commits carry on while
+    it runs. Returns the data version the snapshot holds.
+    """
+    directory = snapshot_dir(workbook)
+    os.makedirs(directory, exist_ok=True)
+    # Zero-padded so that names sort by age
+    name = f"{time.time_ns():020d}.duckdb"
+    path = os.path.join(directory, name)
+
+    source = db.execute("SELECT current_database()").fetchone()[0]
+    # ATTACH takes no parameters
+    quoted = path.replace("'", "''")
+    db.execute(f"ATTACH '{quoted}' AS snapshot")
+    try:
+        try:
+            db.execute(f'COPY FROM DATABASE "{source}" TO snapshot')
+            version = db.execute(
+                "SELECT COALESCE(MAX(version), 0) FROM snapshot.sales_changes"
+            ).fetchone()[0]
+        finally:
+            db.execute("DETACH snapshot")
+    except Exception:
+        # Never leave a partial copy for prune_snapshots to count as a keeper
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    manifest = {"path": name, "version": version, "published_at": time.time()}
+    staging = os.path.join(directory, f".{MANIFEST_NAME}.tmp")
+    with open(staging, "w") as f:
+        json.dump(manifest, f)
+    os.replace(staging, manifest_path(workbook))
+    prune_snapshots(workbook)
+    return version
+
+
+def prune_snapshots(workbook, keep=SNAPSHOT_KEEP):
+    """Delete all but the newest ``keep`` snapshots of a workbook.
+
+    Readers still using a deleted file keep it open until they move on.
+    """
+    directory = snapshot_dir(workbook)
+    names = sorted(name for name in os.listdir(directory) if name.endswith(".duckdb"))
+    for name in names[: max(len(names) - keep, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
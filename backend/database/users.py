@@ -0,0 +1,117 @@
+"""User records, with a small in-process cache for logins.
+
+A login storm (everyone signing in at shift change) otherwise borrows a
+cursor and queries ``users`` for every attempt. Records are cached for
+USER_CACHE_TTL seconds, up to USER_CACHE_SIZE users; unknown usernames are
+not cached, so a user who signs up on another replica can log in at once.
+A reader process (DB_ROLE=reader) asks the writer about a username its
+snapshot does not have, since the signup may not be published yet.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from backend.config.config import DB_ROLE, USER_CACHE_SIZE, USER_CACHE_TTL
+from backend.database.db import open_workbook, pooled_connection
+from backend.utils.metrics import timed_query
+
+
+class UserCache:
+    """Thread-safe LRU of user records that expire after ``ttl`` seconds."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username):
+        """Get a cached record, or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, username, user):
+        """Cache a record, evicting the least recently used beyond max_size."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[username] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username):
+        """Forget a user, e.g. after their record changed."""
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Get cache size and hit counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+@timed_query("find_user", lambda user: int(user is not None))
+def find_user(db, username):
+    """Get ``(id, username, password_hash, email, name)`` for a user, or None."""
+    return db.execute(
+        """
+        SELECT id, username, password_hash, email, name
+        FROM users
+        WHERE username = ?
+        """,
+        (username,),
+    ).fetchone()
+
+
+def get_user(username):
+    """Get a user record, from the cache when possible."""
+    user = user_cache.get(username)
+    if user is None:
+        with pooled_connection() as db:
+            user = find_user(db, username)
+        if user is None and DB_ROLE == "reader":
+            with open_workbook() as workbook:
+                user = workbook.writer.run(find_user, username)
+        if user is not None:
+            user_cache.set(username, user)
+    return user
+
+
+def create_user(db, username, password_hash, email, name):
+    """Insert a user unless the username is taken; return whether it was added.
+
+    Run through the writer; call ``user_cache.invalidate`` once committed.
+    """
+    if db.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone():
+        return False
+    db.execute(
+        """
+        INSERT INTO users (id, username, password_hash, email, name)
+        VALUES (nextval('users_id_seq'), ?, ?, ?, ?)
+        """,
+        (username, password_hash, email, name),
+    )
+    return True
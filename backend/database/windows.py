@@ -0,0 +1,125 @@
+"""Offset-addressed windows of sales for the virtualized grid (``/rows``).
+
+A plain ``LIMIT ? OFFSET ?`` makes DuckDB sort past every skipped row, so
+deep windows get slower as the table grows. Instead, one pass per data
+version and ordering records a checkpoint every ROWS_CHECKPOINT_INTERVAL
+rows: the cursor key of the last row of each block. A window then starts
+from the checkpoint before its offset, as a keyset page, and skips fewer
+than ROWS_CHECKPOINT_INTERVAL rows, so every window costs about the same.
+"""
+
+import threading
+from collections import OrderedDict
+
+from backend.config.config import (
+    ROWS_CHECKPOINT_CACHE_SIZE,
+    ROWS_CHECKPOINT_INTERVAL,
+)
+from backend.database.sales import QueryError, build_where
+from backend.utils.metrics import timed_query
+
+
+class CheckpointCache:
+    """Thread-safe LRU of checkpoint lists keyed by ordering and data version."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Get cached checkpoints, or None."""
+        with self._lock:
+            checkpoints = self._entries.get(key)
+            if checkpoints is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return checkpoints
+
+    def set(self, key, checkpoints):
+        """Cache checkpoints, evicting the least recently used beyond max_size."""
+        with self._lock:
+            self._entries[key] = checkpoints
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Get cache size and hit counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+checkpoint_cache = CheckpointCache(ROWS_CHECKPOINT_CACHE_SIZE)
+
+
+def parse_offset(args):
+    """Read the window offset from request arguments."""
+    try:
+        offset = int(args.get("offset", 0))
+    except ValueError as e:
+        raise QueryError("Offset must be an integer") from e
+    if offset < 0:
+        raise QueryError("Offset must not be negative")
+    return offset
+
+
+@timed_query("count_sales", lambda total: 1)
+def count_sales(db, filters=None):
+    """Count the sales matching validated filters."""
+    clauses, params = build_where(filters or {})
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return db.execute(f"SELECT COUNT(*) FROM sales {where}", params).fetchone()[0]
+
+
+@timed_query("build_checkpoints", len)
+def build_checkpoints(db, filters, sort, direction):
+    """Get the cursor key of every ROWS_CHECKPOINT_INTERVAL-th row, in order."""
+    clauses, params = build_where(filters or {})
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = direction.upper()
+    return db.execute(
+        f"""
+        SELECT sort_key, id FROM (
+            SELECT CAST({sort} AS VARCHAR) AS sort_key, id,
+                row_number() OVER (ORDER BY {sort} {order}, id {order}) AS position
+            FROM sales
+            {where}
+        )
+        WHERE position % ? = 0
+        ORDER BY position
+        """,
+        params + [ROWS_CHECKPOINT_INTERVAL],
+    ).fetchall()
+
+
+def locate(
+    db, version, offset, filters=None, sort="date", direction="desc", workbook=None
+):
+    """Find where a window starts; return (cursor, rows to skip past it).
+
+    ``version`` must be the data version of the snapshot ``db`` reads, and
+    ``workbook`` the workbook it belongs to, so cached checkpoints always
+    match the rows they point into.
+    """
+    block = offset // ROWS_CHECKPOINT_INTERVAL
+    if block == 0:
+        return None, offset
+    key = (workbook, tuple(sorted((filters or {}).items())), sort, direction, version)
+    checkpoints = checkpoint_cache.get(key)
+    if checkpoints is None:
+        checkpoints = build_checkpoints(db, filters, sort, direction)
+        checkpoint_cache.set(key, checkpoints)
+    if not checkpoints:
+        return None, offset
+    # Checkpoint i is the last row of block i, so block b starts after b - 1
+    index = min(block, len(checkpoints)) - 1
+    return tuple(checkpoints[index]), offset - (index + 1) * ROWS_CHECKPOINT_INTERVAL
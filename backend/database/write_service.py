@@ -0,0 +1,142 @@
+"""The writer process: applies every write and publishes snapshots.
+
+Run with ``python write_server.py`` when the web workers are readers
+(DB_ROLE=reader). Readers connect with multiprocessing.connection,
+authenticated by WRITER_AUTHKEY, and send one JSON request at a time:
+
+    {"op": "add_sale", "workbook": ..., "args": [...], "kwargs": {},
+     "timeout": 30}
+    {"op": "create", "workbook": ..., "owner": ...}
+    {"op": "publish", "workbook": ...}
+
+Each gets ``{"result": ...}`` or ``{"error": type, "message": ...}`` back.
+Only the jobs in OPERATIONS can be run. They go to the workbook's
+group-commit writer, so writes from every reader stay serialized, and a
+publisher thread snapshots workbooks with new commits.
+"""
+
+import os
+import threading
+import time
+from multiprocessing.connection import AuthenticationError, Listener
+
+from backend.config.config import SNAPSHOT_INTERVAL
+from backend.database.db import (
+    add_member,
+    create_workbook,
+    open_workbook,
+    workbooks,
+)
+from backend.database.formulas import define_formula, delete_formula
+from backend.database.mutations import add_sale, add_sales, edit_sale
+from backend.database.remote import (
+    RemoteWriteError,
+    error_reply,
+    recv_message,
+    send_message,
+    writer_address,
+    writer_authkey,
+)
+from backend.database.users import create_user, find_user
+from backend.routes.transfer import run_import_job
+
+# The write jobs a reader may ask for, by name
+OPERATIONS = {
+    work.__name__: work
+    for work in (
+        add_sale,
+        add_sales,
+        edit_sale,
+        define_formula,
+        delete_formula,
+        create_user,
+        find_user,
+        add_member,
+        run_import_job,
+    )
+}
+
+
+def handle(message):
+    """Carry out one request from a reader; return the reply."""
+    try:
+        op, name = message["op"], message["workbook"]
+        if op == "create":
+            return {"result": create_workbook(name, message["owner"])}
+        if op == "publish":
+            # A reader is waiting for a write to reach the snapshots
+            with open_workbook(name) as workbook:
+                workbook.want_publish()
+            return {"result": None}
+        work = OPERATIONS.get(op)
+        if work is None:
+            raise RemoteWriteError(f"Unknown writer operation: {op}")
+        args, kwargs = message.get("args", []), message.get("kwargs", {})
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise RemoteWriteError("args must be a list and kwargs an object")
+        with open_workbook(name) as workbook:
+            result = workbook.writer.run(
+                work, *args, timeout=message.get("timeout"), **kwargs
+            )
+        return {"result": result}
+    except Exception as e:
+        return error_reply(e)
+
+
+def serve_connection(conn):
+    """Answer one reader connection's requests until it closes."""
+    with conn:
+        while True:
+            try:
+                message = recv_message(conn)
+            except (EOFError, OSError):
+                return
+            except ValueError as e:
+                reply = error_reply(RemoteWriteError(f"Malformed request: {e}"))
+            else:
+                reply = handle(message)
+            try:
+                send_message(conn, reply)
+            except (EOFError, OSError):
+                return
+            except (TypeError, ValueError) as e:
+                # The result has something JSON cannot carry
+                send_message(conn, error_reply(RemoteWriteError(str(e))))
+
+
+def publish_snapshots(interval=SNAPSHOT_INTERVAL):
+    """Snapshot every open workbook with new commits, every ``interval`` seconds."""
+    while True:
+        time.sleep(interval)
+        for workbook in workbooks.open_workbooks():
+            try:
+                workbook.publish(force=False)
+            except Exception as e:
+                print(f"Error publishing snapshot of {workbook.name}: {str(e)}")
+
+
+def serve(address=None, authkey=None):
+    """Accept reader connections, one thread each, until interrupted.
+
+    ``address`` is a Unix socket path or a (host, port); it defaults to
+    WRITER_SOCKET, else WRITER_HOST:WRITER_PORT.
+    """
+    address = address or writer_address()
+    authkey = authkey or writer_authkey()
+    if isinstance(address, str) and os.path.exists(address):
+        # Left behind by a writer that did not shut down cleanly
+        os.remove(address)
+    threading.Thread(
+        target=publish_snapshots, name="snapshot-publisher", daemon=True
+    ).start()
+    with Listener(address, authkey=authkey) as listener:
+        if isinstance(address, str):
+            os.chmod(address, 0o600)
+        print(f"Writer listening on {listener.address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, OSError) as e:
+                print(f"Rejected writer connection: {str(e)}")
+                continue
+            threading.Thread(target=serve_connection, args=(conn,), daemon=True).start()
@@ -0,0 +1,182 @@
+"""Single writer thread with group commit.
+
+Every mutation is a function of a cursor, submitted to the one writer thread
+that owns the process's writing cursor. Jobs that arrive within
+WRITER_BATCH_DELAY of each other run in one transaction with one commit, and
+each caller's future resolves once that commit is durable. Because only this
+thread writes, sequence-allocated ids within a statement are contiguous and
+transactions never conflict with each other.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import duckdb
+
+from backend.config.config import WRITE_TIMEOUT, WRITER_BATCH_DELAY, WRITER_BATCH_MAX
+
+
+class Writer:
+    """Applies queued write jobs on a dedicated thread, committing in groups."""
+
+    def __init__(
+        self,
+        open_cursor,
+        batch_delay=WRITER_BATCH_DELAY,
+        batch_max=WRITER_BATCH_MAX,
+        name="duckdb-writer",
+    ):
+        self._open_cursor = open_cursor
+        self.name = name
+        self.batch_delay = batch_delay
+        self.batch_max = batch_max
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._busy = False
+        self._jobs = 0
+        self._commits = 0
+        self._replays = 0
+
+    def _start(self):
+        """Start the writer thread on first use."""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._loop, name=self.name, daemon=True
+                    )
+                    self._thread.start()
+
+    def submit(self, work, *args, **kwargs):
+        """Queue ``work(db, *args, **kwargs)``; return a Future set once committed.
+
+        ``work`` runs inside a transaction shared with other jobs, so it must
+        not begin, commit or roll back. Raising discards only its own changes.
+        """
+        future = Future()
+        self._start()
+        self._queue.put((lambda db: work(db, *args, **kwargs), future))
+        return future
+
+    def run(self, work, *args, timeout=WRITE_TIMEOUT, **kwargs):
+        """Submit ``work`` and wait until it is committed; return its result."""
+        return self.submit(work, *args, **kwargs).result(timeout)
+
+    def idle(self):
+        """Whether no job is queued or running."""
+        return not self._busy and self._queue.empty()
+
+    def close(self):
+        """Stop the thread once the jobs queued so far are committed."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put((None, None))
+            thread.join()
+
+    def stats(self):
+        """Return counters for jobs, commits and replayed batches."""
+        return {
+            "queued": self._queue.qsize(),
+            "jobs": self._jobs,
+            "commits": self._commits,
+            "replays": self._replays,
+            "jobs_per_commit": (
+                round(self._jobs / self._commits, 2) if self._commits else 0.0
+            ),
+        }
+
+    def _collect(self):
+        """Wait for a job, then gather whatever else arrives within the delay."""
+        batch = [self._queue.get()]
+        self._busy = True
+        deadline = time.monotonic() + self.batch_delay
+        while len(batch) < self.batch_max and batch[-1][0] is not None:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(
+                    self._queue.get(timeout=remaining)
+                    if remaining > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        """Apply batches until close() queues the stop marker."""
+        db = self._open_cursor()
+        while True:
+            batch = self._collect()
+            stopping = batch[-1][0] is None
+            if stopping:
+                batch.pop()
+            pending = [job for job in batch if job[1].set_running_or_notify_cancel()]
+            try:
+                self._apply(db, pending)
+            except Exception as e:
+                # Never let one bad batch stop the writer
+                print(f"Error applying write batch: {str(e)}")
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+            self._busy = False
+            if stopping:
+                db.close()
+                return
+
+    def _apply(self, db, pending):
+        """Run jobs in one transaction, replaying the rest when one fails.
+
+        DuckDB has no savepoints, so a failing job rolls back the whole
+        transaction; the others are then run again without it.
+        """
+        while pending:
+            results = []
+            failed = None
+            db.begin()
+            for index, (work, future) in enumerate(pending):
+                try:
+                    results.append(work(db))
+                except Exception as e:
+                    failed = (index, e)
+                    break
+
+            if failed is not None:
+                _rollback(db)
+                index, error = failed
+                pending[index][1].set_exception(error)
+                pending = pending[:index] + pending[index + 1 :]
+                if pending:
+                    self._replays += 1
+                continue
+
+            try:
+                db.commit()
+            except Exception as e:
+                _rollback(db)
+                if len(pending) == 1:
+                    pending[0][1].set_exception(e)
+                    return
+                # A failed commit cannot be pinned on one job; apply each alone
+                self._replays += 1
+                for job in pending:
+                    self._apply(db, [job])
+                return
+
+            self._jobs += len(pending)
+            self._commits += 1
+            for (_, future), result in zip(pending, results):
+                future.set_result(result)
+            return
+
+
+def _rollback(db):
+    """Roll back, ignoring a transaction DuckDB has already aborted."""
+    try:
+        db.rollback()
+    except duckdb.Error:
+        pass
@@ -3,3 +3,8 @@
 from flask_socketio import SocketIO
 
 socketio = SocketIO()
+
+
+def workbook_room(workbook):
+    """Name of the Socket.IO room every connection to a workbook joins."""
+    return f"workbook:{workbook}"
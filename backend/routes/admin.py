@@ -0,0 +1,99 @@
+"""Administration routes."""
+
+from flask import Blueprint, jsonify, request, send_from_directory, session
+
+from backend.config.config import PROFILE_DIR, PROFILING_ENABLED
+from backend.database.db import get_db
+from backend.database.diagnostics import (
+    CANONICAL_QUERIES,
+    explain_canonical_queries,
+    get_indexes,
+)
+from backend.utils.auth import admin_required
+from backend.utils.profiling import (
+    ProfilingBusyError,
+    ProfilingError,
+    control,
+    list_profiles,
+)
+
+admin_bp = Blueprint("admin", __name__, url_prefix="/admin")
+
+
+@admin_bp.route("/query_plans")
+@admin_required
+def query_plans():
+    """Profile the app's canonical queries with EXPLAIN ANALYZE."""
+    try:
+        names = [name for name in request.args.get("queries", "").split(",") if name]
+        unknown = [name for name in names if name not in CANONICAL_QUERIES]
+        if unknown:
+            return jsonify({"error": f"Unknown queries: {', '.join(unknown)}"}), 400
+
+        db = get_db()
+        return jsonify(
+            {
+                "indexes": get_indexes(db),
+                "queries": explain_canonical_queries(db, session["username"], names),
+            }
+        )
+    except Exception as e:
+        print(f"Error explaining queries: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@admin_bp.route("/profiling", methods=["GET", "POST"])
+@admin_required
+def profiling():
+    """Show profiling state and saved profiles, or arm request profiling.
+
+    POST ``{"requests": 5, "path": "/write", "mode": "sample",
+    "format": "collapsed"}`` profiles the next five matching requests.
+    """
+    if not PROFILING_ENABLED:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    try:
+        if request.method == "POST":
+            data = request.get_json() or {}
+            control.arm(
+                int(data.get("requests", 1)),
+                path=data.get("path"),
+                mode=data.get("mode", "sample"),
+                fmt=data.get("format", "collapsed"),
+            )
+        return jsonify({**control.status(), "profiles": list_profiles()})
+    except (ProfilingError, ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error configuring profiling: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@admin_bp.route("/profiling/session", methods=["POST"])
+@admin_required
+def profiling_session():
+    """Sample every thread in this process for ``seconds``."""
+    if not PROFILING_ENABLED:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    try:
+        data = request.get_json() or {}
+        ends_at = control.start_session(
+            float(data.get("seconds", 30)), fmt=data.get("format", "collapsed")
+        )
+        return jsonify({"message": "Profiling session started", "ends_at": ends_at})
+    except ProfilingBusyError as e:
+        return jsonify({"error": str(e)}), 409
+    except (ProfilingError, ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error starting profiling session: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@admin_bp.route("/profiles/<name>")
+@admin_required
+def download_profile(name):
+    """Download a saved profile."""
+    if not PROFILING_ENABLED:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    return send_from_directory(PROFILE_DIR, name, as_attachment=True)
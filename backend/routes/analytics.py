@@ -0,0 +1,31 @@
+"""Aggregation routes."""
+
+from flask import Blueprint, jsonify, request
+
+from backend.database.db import get_db
+from backend.database.rollups import aggregate, parse_aggregate_query
+from backend.database.sales import QueryError, parse_sales_query
+from backend.utils.auth import login_required
+from backend.utils.cache import cached_response
+
+analytics_bp = Blueprint("analytics", __name__)
+
+
+@analytics_bp.route("/aggregate")
+@login_required
+@cached_response
+def aggregate_sales():
+    """Group, sum, count and pivot volume sold."""
+    try:
+        # Validate filters the same way as /read
+        parse_sales_query(request.args)
+        query = parse_aggregate_query(request.args)
+
+        columns, rows, source = aggregate(get_db(), **query)
+        return jsonify({"columns": columns, "rows": rows, "source": source})
+
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error aggregating data: {str(e)}")
+        return jsonify({"error": str(e)}), 500
@@ -2,10 +2,12 @@
 
 import duckdb
 from flask import Blueprint, jsonify, request, session
-from werkzeug.security import check_password_hash, generate_password_hash
 
-from backend.database.db import get_db
+from backend.config.config import WRITE_LOCK_REQUIRED
+from backend.database.db import open_workbook
+from backend.database.users import create_user, get_user, user_cache
 from backend.utils.auth import login_required
+from backend.utils.passwords import make_password_hash, verify_password
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -20,38 +22,20 @@ def signup():
         ):
             return jsonify({"error": "Missing required fields"}), 400
 
-        db = get_db()
-
-        # Check if username already exists
-        existing_user = db.execute(
-            """
-            SELECT 1 FROM users WHERE username = ?
-        """,
-            [data["username"]],
-        ).fetchone()
-
-        if existing_user:
-            return jsonify({"error": "Username already exists"}), 400
-
-        # Get next available ID
-        next_id = db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM users").fetchone()[0]
-
-        # Insert new user
-        db.execute(
-            """
-            INSERT INTO users (id, username, password_hash, email, name)
-            VALUES (?, ?, ?, ?, ?)
-        """,
-            (
-                next_id,
+        password_hash = make_password_hash(data["password"])
+        # Accounts live in the default workbook and sign in to every workbook
+        with open_workbook() as workbook:
+            created = workbook.writer.run(
+                create_user,
                 data["username"],
-                generate_password_hash(data["password"]),
+                password_hash,
                 data["email"],
                 data["name"],
-            ),
-        )
-
-        db.commit()
+            )
+        if not created:
+            return jsonify({"error": "Username already exists"}), 400
+        # Drop any stale record cached before the username was taken
+        user_cache.invalidate(data["username"])
         return jsonify({"message": "User created successfully"}), 201
     except duckdb.Error as e:
         print(f"Database error during signup: {str(e)}")
@@ -72,22 +56,10 @@ def login():
         if not username or not password:
             return jsonify({"error": "Username and password are required"}), 400
 
-        # Get database connection
-        db = get_db()
-        if not db:
-            return jsonify({"error": "Database connection failed"}), 503
-
-        # Get user from database
-        user = db.execute(
-            """
-            SELECT id, username, password_hash, email, name 
-            FROM users 
-            WHERE username = ?
-        """,
-            (username,),
-        ).fetchone()
-
-        if user and check_password_hash(user[2], password):
+        # Get user from the cache or database
+        user = get_user(username)
+
+        if user and verify_password(user[2], password):
             # Set session
             session["user_id"] = user[0]
             session["username"] = user[1]
@@ -129,5 +101,9 @@ def logout():
 def check_auth():
     """Check if user is authenticated."""
     return jsonify(
-        {"authenticated": "user_id" in session, "username": session.get("username")}
+        {
+            "authenticated": "user_id" in session,
+            "username": session.get("username"),
+            "write_lock_required": WRITE_LOCK_REQUIRED,
+        }
     ), 200
@@ -0,0 +1,92 @@
+"""Formula routes."""
+
+from flask import Blueprint, jsonify, request, session
+
+from backend.database.changes import get_data_version
+from backend.database.db import get_db, requested_workbook, writer
+from backend.database.formulas import define_formula, delete_formula, list_formulas
+from backend.database.sales import QueryError
+from backend.extensions import socketio, workbook_room
+from backend.utils.auth import login_required, write_access_required
+from backend.utils.cache import bump_version, cached_response
+
+formulas_bp = Blueprint("formulas", __name__)
+
+
+def broadcast_formulas_changed(version):
+    """Tell clients to reload, since the formula columns and cells changed."""
+    socketio.emit(
+        "data_updated",
+        {"message": "Formulas changed", "version": version, "reset": True},
+        room=workbook_room(requested_workbook()),
+    )
+
+
+@formulas_bp.route("/formulas")
+@login_required
+@cached_response
+def get_formulas():
+    """List formulas with the current values of summary cells."""
+    try:
+        db = get_db()
+        db.begin()
+        version = get_data_version(db)
+        formulas = list_formulas(db)
+        db.commit()
+        return jsonify({"version": version, "formulas": formulas})
+    except Exception as e:
+        print(f"Error reading formulas: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@formulas_bp.route("/formulas", methods=["POST"])
+@write_access_required
+def add_formula():
+    """Define a column formula or summary cell.
+
+    POST ``{"name": "share", "expression": "volume_sold / category_total"}``;
+    summary cells may also pass ``group_by``.
+    """
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict) or not data.get("name"):
+            return jsonify({"error": "name and expression are required"}), 400
+
+        username = session.get("username")
+        formula, version = writer.run(
+            define_formula,
+            data["name"],
+            data.get("expression"),
+            data.get("group_by"),
+            username,
+        )
+        bump_version(version)
+        broadcast_formulas_changed(version)
+        return jsonify(
+            {"message": "Formula added", "formula": formula, "version": version}
+        ), 201
+
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error adding formula: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@formulas_bp.route("/formulas/<name>", methods=["DELETE"])
+@write_access_required
+def remove_formula(name):
+    """Delete a formula that no other formula references."""
+    try:
+        outcome, result = writer.run(delete_formula, name)
+        if outcome == "missing":
+            return jsonify({"error": "Formula not found"}), 404
+        if outcome == "in_use":
+            return jsonify({"error": f"Formula is used by: {', '.join(result)}"}), 409
+        bump_version(result)
+        broadcast_formulas_changed(result)
+        return jsonify({"message": "Formula deleted", "version": result})
+
+    except Exception as e:
+        print(f"Error deleting formula: {str(e)}")
+        return jsonify({"error": str(e)}), 500
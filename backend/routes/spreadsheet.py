@@ -1,273 +1,536 @@
 """Spreadsheet routes."""
 
-from flask import Blueprint, jsonify, request, session
-
-from backend.database.db import get_db
+from flask import Blueprint, Response, jsonify, request, session
+from flask_socketio import join_room
+
+from backend.config.config import WRITE_BATCH_MAX_ROWS
+from backend.database.changes import get_changes_since, get_data_version
+from backend.database.columnar import (
+    COLUMN_NAMES,
+    COLUMNAR_COLUMNS,
+    dumps,
+    parse_format,
+    query_sales_columnar,
+)
+from backend.database.db import (
+    get_db,
+    requested_workbook,
+    workbook_exists,
+    workbook_role,
+    writer,
+)
+from backend.database.formulas import load_graph, parse_formula_columns
+from backend.database.mutations import add_sale, add_sales, edit_sale
 from backend.database.redis_client import (
     get_queue_status,
     get_redis,
+    release_write_access,
+    request_write_access,
+)
+from backend.database.sales import (
+    READ_COLUMNS,
+    SALE_FIELDS,
+    QueryError,
+    parse_sales_query,
+    query_sales,
+    validate_sale,
+)
+from backend.database.search import parse_search_query, search_sales
+from backend.database.windows import count_sales, locate, parse_offset
+from backend.extensions import socketio, workbook_room
+from backend.utils.auth import login_required, write_access_required
+from backend.utils.cache import bump_version, cached_json, cached_response
+from backend.utils.metrics import (
+    client_connected,
+    client_disconnected,
+    timed_broadcast,
 )
-from backend.extensions import socketio
-from backend.utils.auth import login_required
 
 spreadsheet_bp = Blueprint("spreadsheet", __name__)
 
 
+def user_room(username, workbook):
+    """Name of the Socket.IO room a user's connections to a workbook join."""
+    return f"user:{workbook}:{username}"
+
+
+def get_categories(db):
+    """Get every category name, sorted, for the grid's category picker."""
+    return db.execute("""
+        SELECT name FROM categories
+        ORDER BY name
+    """).fetchall()
+
+
+def formula_selects(db, names):
+    """Get SELECT expressions for the column formulas requested with a page."""
+    return load_graph(db).column_selects(names) if names else []
+
+
+def columnar_response(payload, formula_names=()):
+    """Encode a columnar page payload with orjson."""
+    payload.update(format="columnar", columns=COLUMN_NAMES + list(formula_names))
+    return Response(dumps(payload), mimetype="application/json")
+
+
 def broadcast_update():
-    """Broadcast queue status to all clients."""
+    """Publish one write-queue snapshot for the workbook's clients.
+
+    With a message queue configured this is a single publish to Redis, which
+    each replica relays to its own connected clients.
+    """
     try:
         redis_client = get_redis()
         if not redis_client:
             return
 
-        current_lock = redis_client.get("write_lock")
-        queue = redis_client.lrange("write_queue", 0, -1)
-
-        # Send queue status to all clients
-        for client in socketio.server.eio.clients:
-            username = client.get("username")
-            if username:
-                position = None
-                if current_lock == username:
-                    position = 0
-                elif username in queue:
-                    position = queue.index(username) + 1
-                socketio.emit(
-                    "queue_update", {"position": position}, room=client.get("sid")
-                )
+        workbook = requested_workbook()
+        active_users, queue = get_queue_status(redis_client, workbook)
+        with timed_broadcast("queue_update"):
+            socketio.emit(
+                "queue_update",
+                {"holder": active_users[0] if active_users else None, "queue": queue},
+                room=workbook_room(workbook),
+            )
     except Exception as e:
         print(f"Error broadcasting update: {str(e)}")
 
 
+def broadcast_data_update(version, sale_ids, changes=None, cells=None):
+    """Tell the workbook's clients the data changed, with rows if only a few.
+
+    ``changes`` holds the change entries the write job built (None past
+    DELTA_MAX_ROWS) and ``cells`` the summary cell values it recalculated.
+    """
+    payload = {
+        "message": "Data updated",
+        "version": version,
+        "previous_version": version - len(sale_ids),
+    }
+    if changes is not None:
+        payload["changes"] = changes
+    if cells:
+        payload["cells"] = cells
+    with timed_broadcast("data_updated"):
+        socketio.emit("data_updated", payload, room=workbook_room(requested_workbook()))
+
+
 @spreadsheet_bp.route("/read_data")
 @login_required
 def read_data_with_queue():
-    """Read data from the spreadsheet with queue status."""
+    """Read data from the spreadsheet with queue status.
+
+    The page and categories come from the versioned cache; the queue changes
+    without a write, so it is read on every request.
+    """
     try:
-        db = get_db()
-        redis = get_redis()
-
-        # Get sales data
-        sales_data = db.execute("""
-            SELECT date, invoice_number, customer_name, location, 
-                   product_name, category, volume_sold, unit, created_by
-            FROM sales
-            ORDER BY date DESC, invoice_number DESC
-        """).fetchall()
-
-        # Get categories
-        categories = db.execute("""
-            SELECT name, description
-            FROM categories
-            ORDER BY name
-        """).fetchall()
+        query = parse_sales_query(request.args)
+
+        def read_page():
+            db = get_db()
+            # Get one page of sales data
+            sales_data, next_cursor = query_sales(
+                db, columns=["date"] + READ_COLUMNS[1:], **query
+            )
+
+            # Get categories
+            categories = db.execute("""
+                SELECT name, description
+                FROM categories
+                ORDER BY name
+            """).fetchall()
+            return {
+                "sales_data": sales_data,
+                "next_cursor": next_cursor,
+                "categories": categories,
+            }
+
+        page = cached_json(read_page)
 
         # Get queue status
-        active_users, queue_users = get_queue_status(redis)
+        active_users, queue_users = get_queue_status(get_redis(), requested_workbook())
 
         return jsonify(
-            {
-                "sales_data": sales_data,
-                "categories": categories,
-                "active_users": active_users,
-                "queue_users": queue_users,
-            }
+            {**page, "active_users": active_users, "queue_users": queue_users}
         )
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error reading data: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
 @spreadsheet_bp.route("/write", methods=["POST"])
+@write_access_required
 def write_data():
-    """Write data to the spreadsheet."""
+    """Insert a sale unless its invoice number was taken in the meantime."""
     try:
         data = request.get_json()
         if not data:
             return jsonify({"error": "No data provided"}), 400
 
         # Validate required fields
-        required_fields = [
-            "date",
-            "invoice_number",
-            "customer_name",
-            "location",
-            "product_name",
-            "category",
-            "volume_sold",
-            "unit",
-        ]
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
+        error = validate_sale(data)
+        if error:
+            return jsonify({"error": error}), 400
 
         # Get the current user from session
         username = session.get("username")
-        if not username:
-            return jsonify({"error": "Not authenticated"}), 401
-
-        # Get the next ID
-        db = get_db()
-        cursor = db.execute("SELECT MAX(id) FROM sales")
-        max_id = cursor.fetchone()[0]
-        next_id = (max_id or 0) + 1
 
         # Insert the new sale
-        db.execute(
-            """
-            INSERT INTO sales (
-                id, date, invoice_number, customer_name, location,
-                product_name, category, volume_sold, unit, created_by
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-            (
-                next_id,
-                data["date"],  # Use the date directly from the request
-                data["invoice_number"],
-                data["customer_name"],
-                data["location"],
-                data["product_name"],
-                data["category"],
-                data["volume_sold"],
-                data["unit"],
-                username,
-            ),
-        )
-        db.commit()
+        result = writer.run(add_sale, data, username)
+        if result is None:
+            return jsonify({"error": "Invoice number already exists"}), 409
+        next_id, version, cells, changes = result
+        bump_version(version)
 
         # Broadcast the update to all connected clients
-        socketio.emit("data_updated", {"message": "Data updated"})
+        broadcast_data_update(version, [next_id], changes, cells)
 
-        return jsonify({"message": "Data written successfully"})
+        return jsonify(
+            {
+                "message": "Data written successfully",
+                "id": next_id,
+                "row_version": 1,
+                "version": version,
+            }
+        )
 
     except Exception as e:
         print(f"Error writing data: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
+@spreadsheet_bp.route("/write_batch", methods=["POST"])
+@write_access_required
+def write_batch():
+    """Write many rows to the spreadsheet in one transaction."""
+    try:
+        data = request.get_json()
+        rows = data.get("rows") if isinstance(data, dict) else data
+        if not rows or not isinstance(rows, list):
+            return jsonify({"error": "No rows provided"}), 400
+        if len(rows) > WRITE_BATCH_MAX_ROWS:
+            return jsonify(
+                {"error": f"A batch may contain at most {WRITE_BATCH_MAX_ROWS} rows"}
+            ), 400
+
+        # Get the current user from session
+        username = session.get("username")
+
+        # Validate every row, including invoice numbers repeated in the batch
+        errors = []
+        seen = {}
+        for index, row in enumerate(rows):
+            error = validate_sale(row)
+            if error:
+                errors.append({"index": index, "error": error})
+                continue
+            invoice = str(row["invoice_number"])
+            if invoice in seen:
+                errors.append(
+                    {
+                        "index": index,
+                        "error": f"Duplicate invoice number in batch (row {seen[invoice]})",
+                    }
+                )
+            else:
+                seen[invoice] = index
+
+        ids, result, cells, changes = writer.run(
+            add_sales, rows, username, errors, seen
+        )
+        if ids is None:
+            result.sort(key=lambda e: e["index"])
+            return jsonify({"error": "Batch rejected", "errors": result}), 400
+        version = result
+        bump_version(version)
+
+        # One broadcast for the whole batch
+        broadcast_data_update(version, ids, changes, cells)
+
+        return jsonify(
+            {"message": f"{len(ids)} rows written successfully", "version": version}
+        )
+
+    except Exception as e:
+        print(f"Error writing batch: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@spreadsheet_bp.route("/update", methods=["POST"])
+@write_access_required
+def update_data():
+    """Update a sale unless another editor changed it since it was read."""
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict) or "id" not in data or "row_version" not in data:
+            return jsonify({"error": "id and row_version are required"}), 400
+        try:
+            sale_id = int(data["id"])
+            row_version = int(data["row_version"])
+        except (TypeError, ValueError):
+            return jsonify({"error": "id and row_version must be integers"}), 400
+
+        changes = {field: data[field] for field, _ in SALE_FIELDS if field in data}
+        if not changes:
+            return jsonify({"error": "No fields to update"}), 400
+        error = validate_sale(changes, partial=True)
+        if error:
+            return jsonify({"error": error}), 400
+
+        outcome, result, cells, entries = writer.run(
+            edit_sale, sale_id, row_version, changes
+        )
+        if outcome == "missing":
+            return jsonify({"error": "Sale not found"}), 404
+        if outcome == "duplicate":
+            return jsonify({"error": "Invoice number already exists"}), 409
+        if outcome == "stale":
+            # Send the current row so the editor can merge or retry
+            return jsonify(
+                {
+                    "error": "This row was changed by another user",
+                    "row": result,
+                }
+            ), 409
+        version = result
+        bump_version(version)
+
+        # Broadcast the update to all connected clients
+        broadcast_data_update(version, [sale_id], entries, cells)
+
+        return jsonify(
+            {
+                "message": "Data updated successfully",
+                "id": sale_id,
+                "row_version": outcome,
+                "version": version,
+            }
+        )
+
+    except Exception as e:
+        print(f"Error updating data: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@socketio.on("connect")
+def handle_connect(auth=None):
+    """Join the connection to its workbook's room and the user's own room."""
+    workbook = requested_workbook()
+    if not workbook_exists(workbook):
+        return False
+    if workbook_role(workbook, session.get("username")) is None:
+        return False
+    client_connected()
+    join_room(workbook_room(workbook))
+    username = session.get("username")
+    if username:
+        join_room(user_room(username, workbook))
+
+
+@socketio.on("disconnect")
+def handle_disconnect(reason=None):
+    """Stop counting a disconnected client."""
+    client_disconnected()
+
+
 @socketio.on("request_write_access")
-def handle_write_access_request(data):
-    """Handle write access request from a user."""
+def handle_write_access_request(data=None):
+    """Handle write access request from the signed-in user.
+
+    The lock is taken in the session user's name; a username in ``data`` is
+    ignored, so a client cannot claim the lock for someone else.
+    """
     try:
-        username = data.get("username")
+        username = session.get("username")
         if not username:
-            return {"success": False, "message": "Username is required"}
+            return {"success": False, "message": "Please login first"}
 
         redis_client = get_redis()
         if not redis_client:
             return {"success": False, "message": "Failed to connect to Redis"}
 
-        # Check if user already has write access
-        current_lock = redis_client.get("write_lock")
-        if current_lock == username:
-            # User already has access, extend the lock
-            redis_client.expire("write_lock", 60)  # 60 seconds timeout
-            return {"success": True, "message": "Write access extended"}
-
-        # Check if any user has write access
-        if current_lock:
-            # Add user to queue if not already in it
-            if username not in redis_client.lrange("write_queue", 0, -1):
-                redis_client.rpush("write_queue", username)
-            queue_position = redis_client.llen("write_queue")
-            return {
-                "success": False,
-                "message": f"Write access is currently held by another user. You are #{queue_position} in queue",
-            }
-
-        # No one has write access, grant it to this user
-        redis_client.set("write_lock", username)
-        redis_client.expire("write_lock", 60)  # 60 seconds timeout
-        return {"success": True, "message": "Write access granted"}
+        success, message = request_write_access(
+            redis_client, username, workbook=requested_workbook()
+        )
+        # Broadcast update to the workbook's clients
+        broadcast_update()
+        return {"success": success, "message": message}
     except Exception as e:
         print(f"Error handling write access request: {str(e)}")
         return {"success": False, "message": str(e)}
 
 
 @socketio.on("release_write_access")
-def handle_write_access_release(data):
-    """Handle write access release from a user."""
+def handle_write_access_release(data=None):
+    """Handle write access release from the signed-in user."""
     try:
-        username = data.get("username")
+        username = session.get("username")
         if not username:
-            return {"success": False, "message": "Username is required"}
+            return {"success": False, "message": "Please login first"}
 
         redis_client = get_redis()
         if not redis_client:
             return {"success": False, "message": "Failed to connect to Redis"}
 
-        # Check if user has write access
-        current_lock = redis_client.get("write_lock")
-        if current_lock != username:
-            return {"success": False, "message": "You do not have write access"}
-
-        # Release write access
-        redis_client.delete("write_lock")
-
-        # Get next user in queue
-        next_user = redis_client.lpop("write_queue")
+        workbook = requested_workbook()
+        success, message, next_user = release_write_access(
+            redis_client, username, workbook=workbook
+        )
         if next_user:
-            # Grant write access to next user
-            redis_client.set("write_lock", next_user)
-            redis_client.expire("write_lock", 10)  # 10 seconds timeout
-            # Broadcast update to all clients
+            # Tell the next user directly, on whichever replica they are connected
+            socketio.emit(
+                "write_access_granted",
+                {"message": "Write access granted"},
+                room=user_room(next_user, workbook),
+            )
+        if success:
+            # Broadcast update to the workbook's clients
             broadcast_update()
-            return {
-                "success": True,
-                "message": f"Write access released and granted to {next_user}",
-            }
-
-        # Broadcast update to all clients
-        broadcast_update()
-        return {"success": True, "message": "Write access released"}
+        return {"success": success, "message": message}
     except Exception as e:
         print(f"Error handling write access release: {str(e)}")
         return {"success": False, "message": str(e)}
 
 
 @spreadsheet_bp.route("/read")
+@cached_response
 def read_data():
+    """Read a filtered, sorted page of sales data."""
     try:
         db = get_db()
 
-        # Get all sales data
-        cursor = db.execute("""
-            SELECT strftime('%Y-%m-%d', date) as date, invoice_number, customer_name, location, 
-                   product_name, category, volume_sold, unit, created_by
-            FROM sales
-            ORDER BY date DESC, id DESC
-        """)
-        sales_data = cursor.fetchall()
-
-        # Get all categories from the categories table
-        cursor = db.execute("""
-            SELECT name FROM categories 
-            ORDER BY name
-        """)
-        categories = cursor.fetchall()
-
-        # If no categories exist, insert default categories
-        if not categories:
-            db.execute("""
-                INSERT INTO categories (name, description) VALUES
-                    ('Water', 'Bottled water and mineral water'),
-                    ('Juice', 'Fruit juices and juice drinks'),
-                    ('Soda', 'Carbonated soft drinks'),
-                    ('Energy Drinks', 'Energy and sports drinks'),
-                    ('Tea', 'Bottled and canned tea'),
-                    ('Coffee', 'Bottled and canned coffee'),
-                    ('Milk', 'Dairy milk and milk-based drinks'),
-                    ('Dairy', 'Other dairy products like yogurt drinks and kefir'),
-                    ('Alcohol', 'Alcoholic beverages'),
-                    ('Other', 'Other types of beverages')
-            """)
-            db.commit()
-            # Fetch categories again after inserting defaults
-            cursor = db.execute("SELECT name FROM categories ORDER BY name")
-            categories = cursor.fetchall()
-
-        return jsonify({"sales_data": sales_data, "categories": categories})
+        # Incremental sync: only what changed after the client's version
+        since = request.args.get("since")
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return jsonify({"error": "since must be an integer version"}), 400
+            version, changes, reset = get_changes_since(db, since)
+            return jsonify({"version": version, "changes": changes, "reset": reset})
+
+        query = parse_sales_query(request.args)
+        fmt = parse_format(request.args)
+        formula_names = parse_formula_columns(request.args)
+
+        # Read the page and its version from one snapshot
+        db.begin()
+        version = get_data_version(db)
+        formulas = formula_selects(db, formula_names)
+
+        # Get one page of sales data
+        if fmt == "columnar":
+            sales_data, row_count, next_cursor = query_sales_columnar(
+                db, columns=COLUMNAR_COLUMNS + formulas, **query
+            )
+        else:
+            sales_data, next_cursor = query_sales(
+                db, columns=READ_COLUMNS + formulas, **query
+            )
+
+        categories = get_categories(db)
+        db.commit()
+
+        if fmt == "columnar":
+            return columnar_response(
+                {
+                    "version": version,
+                    "row_count": row_count,
+                    "sales_data": sales_data,
+                    "next_cursor": next_cursor,
+                    "categories": categories,
+                },
+                formula_names,
+            )
 
+        return jsonify(
+            {
+                "version": version,
+                "sales_data": sales_data,
+                "next_cursor": next_cursor,
+                "categories": categories,
+            }
+        )
+
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error reading data: {str(e)}")
         return jsonify({"error": str(e)}), 500
+
+
+@spreadsheet_bp.route("/rows")
+@cached_response
+def read_rows():
+    """Read the window of sales rows at an offset, with the total row count."""
+    try:
+        query = parse_sales_query(request.args)
+        offset = parse_offset(request.args)
+        fmt = parse_format(request.args)
+        formula_names = parse_formula_columns(request.args)
+        filters, sort, direction = query["filters"], query["sort"], query["direction"]
+
+        # Read the count, window and version from one snapshot
+        db = get_db()
+        db.begin()
+        version = get_data_version(db)
+        formulas = formula_selects(db, formula_names)
+        total = count_sales(db, filters)
+        cursor, skip = locate(
+            db, version, offset, filters, sort, direction, requested_workbook()
+        )
+        window = {
+            "filters": filters,
+            "sort": sort,
+            "direction": direction,
+            "limit": query["limit"],
+            "cursor": cursor,
+            "offset": skip,
+        }
+        if fmt == "columnar":
+            sales_data, row_count, _ = query_sales_columnar(
+                db, columns=COLUMNAR_COLUMNS + formulas, **window
+            )
+        else:
+            sales_data, _ = query_sales(db, columns=READ_COLUMNS + formulas, **window)
+            row_count = len(sales_data)
+        categories = get_categories(db)
+        db.commit()
+
+        payload = {
+            "version": version,
+            "total": total,
+            "offset": offset,
+            "row_count": row_count,
+            "sales_data": sales_data,
+            "categories": categories,
+        }
+        if fmt == "columnar":
+            return columnar_response(payload, formula_names)
+        return jsonify(payload)
+
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error reading rows: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@spreadsheet_bp.route("/search")
+@login_required
+@cached_response
+def search():
+    """Find sales by invoice, customer, product or location, best matches first."""
+    try:
+        query = parse_search_query(request.args)
+        rows, next_cursor, truncated = search_sales(get_db(), **query)
+        return jsonify(
+            {"results": rows, "next_cursor": next_cursor, "truncated": truncated}
+        )
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error searching data: {str(e)}")
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,160 @@
+"""Bulk import and export routes."""
+
+import os
+import shutil
+import tempfile
+import uuid
+
+from flask import Blueprint, Response, jsonify, request, session
+
+from backend.config.config import IMPORT_DIR
+from backend.database.db import requested_workbook, stream_cursor, writer
+from backend.database.exporter import (
+    EXPORT_FORMATS,
+    ExportError,
+    build_export_query,
+    check_format,
+    iter_export,
+)
+from backend.database.importer import SalesImportError, detect_format, load_file
+from backend.database.sales import QueryError, parse_sales_query
+from backend.extensions import socketio, workbook_room
+from backend.utils.auth import login_required, write_access_required
+from backend.utils.cache import bump_version
+
+transfer_bp = Blueprint("transfer", __name__)
+
+# Bytes copied per read while streaming an upload to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def release_after(chunks, release):
+    """Yield a streamed body, then return its cursor even if the client left."""
+    try:
+        yield from chunks
+    finally:
+        release()
+
+
+def emit_import_progress(room, import_id, stage, **details):
+    """Report import progress to a workbook's room over Socket.IO.
+
+    Progress is also reported from the writer thread, outside the request,
+    so the room is passed in.
+    """
+    socketio.emit(
+        "import_progress",
+        {"import_id": import_id, "stage": stage, **details},
+        room=room,
+    )
+
+
+def run_import_job(db, path, username, fmt, room, import_id):
+    """Load an import file; a write job, so it may run in the writer process.
+
+    The path must be readable there too (a shared IMPORT_DIR).
+    """
+    return load_file(
+        db,
+        path,
+        username,
+        fmt=fmt,
+        progress=lambda stage, **details: emit_import_progress(
+            room, import_id, stage, **details
+        ),
+    )
+
+
+def save_upload(import_id):
+    """Stream the uploaded file to disk; return (path, filename)."""
+    upload = request.files.get("file")
+    if upload is not None:
+        source, filename = upload.stream, upload.filename or ""
+    else:
+        source, filename = request.stream, request.args.get("filename", "")
+
+    fmt = detect_format(filename, request.args.get("format"))
+    fd, path = tempfile.mkstemp(
+        prefix=f"{import_id}_", suffix=f".{fmt}", dir=IMPORT_DIR
+    )
+    with os.fdopen(fd, "wb") as f:
+        shutil.copyfileobj(source, f, UPLOAD_CHUNK_SIZE)
+    return path, fmt
+
+
+@transfer_bp.route("/import", methods=["POST"])
+@write_access_required
+def import_sales():
+    """Import sales from an uploaded CSV or Parquet file."""
+    import_id = request.args.get("import_id") or uuid.uuid4().hex
+    room = workbook_room(requested_workbook())
+    path = None
+    try:
+        path, fmt = save_upload(import_id)
+        emit_import_progress(room, import_id, "uploaded", bytes=os.path.getsize(path))
+
+        # Large files can hold the writer far longer than WRITE_TIMEOUT
+        result = writer.run(
+            run_import_job,
+            path,
+            session["username"],
+            fmt,
+            room,
+            import_id,
+            timeout=None,
+        )
+        emit_import_progress(
+            room, import_id, "merged", rows=result["rows"], version=result["version"]
+        )
+        bump_version(result["version"])
+
+        # Imports are too large to ship as row deltas; clients reload instead
+        socketio.emit(
+            "data_updated",
+            {"message": "Data imported", "version": result["version"], "reset": True},
+            room=room,
+        )
+        return jsonify({"message": "Import complete", "import_id": import_id, **result})
+
+    except SalesImportError as e:
+        emit_import_progress(room, import_id, "failed", error=str(e))
+        return jsonify(
+            {"error": str(e), "errors": e.errors, "import_id": import_id}
+        ), 400
+    except Exception as e:
+        print(f"Error importing data: {str(e)}")
+        emit_import_progress(room, import_id, "failed", error=str(e))
+        return jsonify({"error": str(e), "import_id": import_id}), 500
+    finally:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+@transfer_bp.route("/export")
+@login_required
+def export_sales():
+    """Stream sales, filtered and sorted like /read, in the requested format."""
+    try:
+        fmt = check_format(request.args.get("format", "csv").lower())
+        query = parse_sales_query(request.args)
+        sql, params = build_export_query(
+            query["filters"], query["sort"], query["direction"]
+        )
+        mimetype, ext, _ = EXPORT_FORMATS[fmt]
+        headers = {"Content-Disposition": f"attachment; filename=sales.{ext}"}
+
+        db, release = stream_cursor()
+        try:
+            chunks = iter_export(db, fmt, sql, params)
+        except Exception:
+            release()
+            raise
+        return Response(
+            release_after(chunks, release), mimetype=mimetype, headers=headers
+        )
+
+    except (ExportError, QueryError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error exporting data: {str(e)}")
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,119 @@
+"""Workbook routes."""
+
+from flask import Blueprint, jsonify, request, session
+
+from backend.config.config import (
+    DEFAULT_WORKBOOK,
+    MAX_WORKBOOKS,
+    WORKBOOKS_PER_USER,
+)
+from backend.database.db import (
+    WorkbookNotFoundError,
+    add_member,
+    create_workbook,
+    list_members,
+    list_workbooks,
+    open_workbook,
+    pooled_connection,
+    workbook_exists,
+    workbook_role,
+)
+from backend.database.users import get_user
+from backend.utils.auth import login_required
+
+workbooks_bp = Blueprint("workbooks", __name__)
+
+
+@workbooks_bp.route("/workbooks")
+@login_required
+def get_workbooks():
+    """List every workbook."""
+    try:
+        return jsonify({"default": DEFAULT_WORKBOOK, "workbooks": list_workbooks()})
+    except Exception as e:
+        print(f"Error listing workbooks: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@workbooks_bp.route("/workbooks", methods=["POST"])
+@login_required
+def add_workbook():
+    """Create an empty workbook, owned by the user, in its own database file."""
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict) or "name" not in data:
+            return jsonify({"error": "name is required"}), 400
+        outcome = create_workbook(data["name"], session["username"])
+        if outcome == "exists":
+            return jsonify({"error": "Workbook already exists"}), 409
+        if outcome == "limit":
+            return (
+                jsonify(
+                    {
+                        "error": f"Each user can create up to {WORKBOOKS_PER_USER} "
+                        f"workbooks, and {MAX_WORKBOOKS} in all"
+                    }
+                ),
+                403,
+            )
+        return jsonify({"message": "Workbook created", "name": data["name"]}), 201
+    except WorkbookNotFoundError as e:
+        # Raised here for an invalid name
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error creating workbook: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+def _member_check(name, owner=False):
+    """Get an error response, or None if the user may see the members.
+
+    With ``owner``, only the workbook's owner passes.
+    """
+    if name == DEFAULT_WORKBOOK or not workbook_exists(name):
+        return jsonify({"error": f"Workbook not found: {name}"}), 404
+    role = workbook_role(name, session["username"])
+    if role is None or (owner and role != "owner"):
+        return jsonify({"error": f"No access to workbook: {name}"}), 403
+    return None
+
+
+@workbooks_bp.route("/workbooks/<name>/members")
+@login_required
+def get_members(name):
+    """List the users who can open a workbook."""
+    try:
+        error = _member_check(name)
+        if error:
+            return error
+        with pooled_connection(name) as db:
+            return jsonify({"members": list_members(db)})
+    except Exception as e:
+        print(f"Error listing workbook members: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@workbooks_bp.route("/workbooks/<name>/members", methods=["POST"])
+@login_required
+def share_workbook(name):
+    """Let another user open a workbook; only its owner may."""
+    try:
+        error = _member_check(name, owner=True)
+        if error:
+            return error
+        data = request.get_json()
+        if not isinstance(data, dict) or "username" not in data:
+            return jsonify({"error": "username is required"}), 400
+        username = data["username"]
+        if not isinstance(username, str) or get_user(username) is None:
+            return jsonify({"error": f"User not found: {username}"}), 404
+        with open_workbook(name) as workbook:
+            added = workbook.writer.run(
+                add_member, username, "member", session["username"]
+            )
+        if not added:
+            return jsonify({"error": f"{username} is already a member"}), 409
+        return jsonify({"message": "Member added", "username": username}), 201
+    except Exception as e:
+        print(f"Error adding workbook member: {str(e)}")
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,85 @@
+"""Shared fixtures: a migrated in-memory database and an app on temp files.
+
+The environment is set before anything imports ``backend.config``, so the
+tests never touch database/spreadsheet.db or need Redis.
+"""
+
+import itertools
+import os
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="spreadsheet-test-")
+os.environ.update(
+    DB_PATH=os.path.join(_TMP_DIR, "spreadsheet.db"),
+    WORKBOOK_DIR=os.path.join(_TMP_DIR, "workbooks"),
+    SNAPSHOT_DIR=os.path.join(_TMP_DIR, "snapshots"),
+    IMPORT_DIR=_TMP_DIR,
+    SOCKETIO_MESSAGE_QUEUE="",
+    SOCKETIO_LOGGER="False",
+    PASSWORD_HASH_WORKERS="0",
+    WRITER_BATCH_DELAY_MS="0",
+)
+
+import duckdb  # noqa: E402
+import pytest  # noqa: E402
+
+from backend.database.migrations import run_migrations  # noqa: E402
+
+_invoices = itertools.count(1)
+
+
+def make_sale(**overrides):
+    """Build a valid sale with a unique invoice number."""
+    sale = {
+        "date": "2024-01-02",
+        "invoice_number": f"TEST-{next(_invoices)}",
+        "customer_name": "Bob",
+        "location": "Austin",
+        "product_name": "Cola",
+        "category": "Soda",
+        "volume_sold": "10.50",
+        "unit": "L",
+    }
+    sale.update(overrides)
+    return sale
+
+
+@pytest.fixture
+def db():
+    """A migrated in-memory database."""
+    conn = duckdb.connect()
+    run_migrations(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope="session")
+def app():
+    from backend.app import create_app
+
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+def sign_in(app):
+    """Get a test client signed in as a fresh user."""
+    client = app.test_client()
+    username = f"user{next(_invoices)}"
+    client.post(
+        "/signup",
+        json={
+            "username": username,
+            "password": "secret",
+            "email": f"{username}@example.com",
+            "name": username,
+        },
+    )
+    client.post("/login", json={"username": username, "password": "secret"})
+    return client
+
+
+@pytest.fixture
+def client(app):
+    """A test client signed in as a fresh user."""
+    return sign_in(app)
@@ -0,0 +1,16 @@
+"""Tests for application setup."""
+
+from backend.app import message_queue
+
+
+def test_no_message_queue_by_default():
+    assert message_queue(None) is None
+
+
+def test_unreachable_redis_queue_falls_back_to_in_process():
+    # Nothing listens on port 1
+    assert message_queue("redis://127.0.0.1:1/0") is None
+
+
+def test_other_queues_are_kept():
+    assert message_queue("amqp://guest@localhost//") == "amqp://guest@localhost//"
@@ -0,0 +1,39 @@
+"""Tests for the query plan report."""
+
+import pytest
+
+from backend.database.diagnostics import CANONICAL_QUERIES, explain_canonical_queries
+from backend.database.mutations import add_sale
+from backend.test.conftest import make_sale
+from backend.utils import auth
+
+
+@pytest.mark.parametrize("customer", ["Bob's Market", "!!!"])
+def test_every_canonical_query_is_profiled(db, customer):
+    add_sale(db, make_sale(customer_name=customer), "tester")
+    report = explain_canonical_queries(db, "tester")
+    assert set(report) == set(CANONICAL_QUERIES)
+    assert report["read_first_page"][0]["operators"]
+    assert report["search_customer"]
+
+
+def test_empty_database_skips_search(db):
+    report = explain_canonical_queries(db, "tester", ["search_customer"])
+    assert report == {"search_customer": []}
+
+
+def test_query_plans_route(client, monkeypatch):
+    client.post("/write", json=make_sale())
+    response = client.get("/admin/query_plans?queries=read_customer")
+    assert response.status_code == 403
+
+    with client.session_transaction() as session:
+        monkeypatch.setattr(auth, "ADMIN_USERS", {session["username"]})
+    response = client.get("/admin/query_plans?queries=read_customer,search_customer")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert "idx_sales_customer" in {index["name"] for index in body["indexes"]}
+    profile = body["queries"]["read_customer"][0]
+    assert profile["latency_ms"] > 0
+    assert profile["operators"][0]["timing_ms"] >= 0
+    assert client.get("/admin/query_plans?queries=nope").status_code == 400
@@ -0,0 +1,61 @@
+"""Tests for streamed sales exports."""
+
+import csv
+import io
+import json
+
+import pyarrow.ipc
+import pyarrow.parquet
+import pytest
+
+from backend.database import exporter
+from backend.database.exporter import EXPORT_COLUMNS, build_export_query, iter_export
+from backend.database.sales import insert_sales
+from backend.test.conftest import make_sale
+
+
+@pytest.fixture
+def sales_db(db, monkeypatch):
+    # Several batches, so the output is assembled from more than one chunk
+    monkeypatch.setattr(exporter, "EXPORT_BATCH_ROWS", 4)
+    insert_sales(db, [make_sale(volume_sold=str(i)) for i in range(10)], "tester")
+    return db
+
+
+def export(db, fmt):
+    sql, params = build_export_query(sort="volume_sold", direction="asc")
+    chunks = list(iter_export(db, fmt, sql, params))
+    assert len(chunks) > 2
+    return b"".join(chunks)
+
+
+def test_csv(sales_db):
+    rows = list(csv.reader(io.StringIO(export(sales_db, "csv").decode())))
+    assert rows[0] == EXPORT_COLUMNS
+    assert [row[7] for row in rows[1:]] == [f"{i}.00" for i in range(10)]
+
+
+def test_ndjson(sales_db):
+    lines = export(sales_db, "ndjson").decode().splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [record["volume_sold"] for record in records] == list(range(10))
+    assert records[0]["date"] == "2024-01-02"
+
+
+def test_parquet(sales_db):
+    table = pyarrow.parquet.read_table(io.BytesIO(export(sales_db, "parquet")))
+    assert table.num_rows == 10
+    assert table.column_names == EXPORT_COLUMNS
+
+
+def test_arrow(sales_db):
+    table = pyarrow.ipc.open_stream(export(sales_db, "arrow")).read_all()
+    assert table.num_rows == 10
+
+
+def test_export_route_streams(client):
+    client.post("/write", json=make_sale())
+    response = client.get("/export?format=csv")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.get_data().startswith(b"id,date,")
@@ -0,0 +1,203 @@
+"""Tests for formulas and the incremental recalculation of summary cells."""
+
+import itertools
+
+import pytest
+
+from backend.database.formulas import define_formula, delete_formula, list_formulas
+from backend.database.mutations import add_sale, add_sales, edit_sale
+from backend.database.sales import QueryError, get_row_version
+from backend.test.conftest import make_sale
+
+_names = itertools.count(1)
+
+# (name, expression, group_by): aggregates folded in incrementally, MIN/MAX
+# rebuilt per group, and cells reading other cells per group and per row
+CELLS = [
+    ("total", "SUM(volume_sold)", None),
+    ("doubled", "total * 2", None),
+    ("by_category", "SUM(volume_sold)", "category"),
+    ("rows_by_category", "COUNT()", "category"),
+    ("avg_by_location", "AVG(volume_sold)", "location"),
+    ("low", "MIN(volume_sold)", "category"),
+    ("high", "MAX(volume_sold)", "category"),
+    ("share", "volume_sold / by_category", None),
+    ("share_total", "SUM(share)", "category"),
+]
+
+
+def values(db, name):
+    return dict(
+        db.execute(
+            "SELECT group_key, value FROM formula_values WHERE name = ?", (name,)
+        ).fetchall()
+    )
+
+
+def assert_matches_full_recompute(db):
+    """Each cell's stored values equal those of a copy defined from scratch."""
+    for name, expression, group_by in CELLS:
+        copy = f"{name}_full"
+        db.execute("DELETE FROM formula_values WHERE name = ?", (copy,))
+        db.execute("DELETE FROM formula_states WHERE name = ?", (copy,))
+        db.execute("DELETE FROM formulas WHERE name = ?", (copy,))
+        define_formula(db, copy, expression, group_by, "tester")
+        assert values(db, name) == pytest.approx(values(db, copy)), name
+
+
+@pytest.fixture
+def cells_db(db):
+    add_sales(
+        db,
+        [
+            make_sale(category="Soda", location="Austin", volume_sold="10"),
+            make_sale(category="Soda", location="Dallas", volume_sold="4"),
+            make_sale(category="Juice", location="Austin", volume_sold="7"),
+        ],
+        "tester",
+        [],
+        {},
+    )
+    for name, expression, group_by in CELLS:
+        define_formula(db, name, expression, group_by, "tester")
+    return db
+
+
+def test_cells_start_from_the_rows(cells_db):
+    assert values(cells_db, "total") == {"": 21}
+    assert values(cells_db, "doubled") == {"": 42}
+    assert values(cells_db, "by_category") == {"Soda": 14, "Juice": 7}
+    assert values(cells_db, "low") == {"Soda": 4, "Juice": 7}
+    assert values(cells_db, "share_total") == pytest.approx({"Soda": 1, "Juice": 1})
+
+
+def test_inserts_match_full_recompute(cells_db):
+    _, _, cells, _ = add_sale(
+        cells_db, make_sale(category="Water", volume_sold="2"), "tester"
+    )
+    assert cells["by_category"] == {"Water": 2}
+    assert cells["total"] == {"": 23}
+    add_sales(
+        cells_db,
+        [make_sale(category="Soda", volume_sold="1"), make_sale(volume_sold="30")],
+        "tester",
+        [],
+        {},
+    )
+    assert values(cells_db, "low")["Soda"] == 1
+    assert values(cells_db, "high")["Soda"] == 30
+    assert_matches_full_recompute(cells_db)
+
+
+def test_update_rebuilds_min_and_max(cells_db):
+    sale_id = cells_db.execute("SELECT id FROM sales WHERE volume_sold = 4").fetchone()[
+        0
+    ]
+    # Raising the minimum cannot be folded in; the group is recomputed
+    new_row_version, _, cells, _ = edit_sale(
+        cells_db, sale_id, 1, {"volume_sold": "12"}
+    )
+    assert new_row_version == 2
+    assert cells["low"] == {"Soda": 10}
+    assert cells["high"] == {"Soda": 12}
+    assert "avg_by_location" in cells
+    assert_matches_full_recompute(cells_db)
+
+
+def test_update_moves_a_row_between_groups(cells_db):
+    sale_id = cells_db.execute(
+        "SELECT id FROM sales WHERE category = 'Juice'"
+    ).fetchone()[0]
+    _, _, cells, _ = edit_sale(cells_db, sale_id, 1, {"category": "Tea"})
+    # The emptied group is dropped and the new one appears
+    assert cells["by_category"] == {"Juice": None, "Tea": 7}
+    assert "Juice" not in values(cells_db, "rows_by_category")
+    assert "total" not in cells
+    assert_matches_full_recompute(cells_db)
+
+
+def test_update_outcomes(cells_db):
+    sale_id = cells_db.execute("SELECT MIN(id) FROM sales").fetchone()[0]
+    assert edit_sale(cells_db, 0, 1, {"volume_sold": "1"})[0] == "missing"
+    taken = cells_db.execute(
+        "SELECT invoice_number FROM sales WHERE id <> ?", (sale_id,)
+    ).fetchone()[0]
+    assert edit_sale(cells_db, sale_id, 1, {"invoice_number": taken})[0] == (
+        "duplicate"
+    )
+    edit_sale(cells_db, sale_id, 1, {"volume_sold": "3"})
+    outcome, row, _, _ = edit_sale(cells_db, sale_id, 1, {"volume_sold": "5"})
+    assert outcome == "stale"
+    assert row[-1] == get_row_version(cells_db, sale_id) == 2
+
+
+@pytest.mark.parametrize(
+    "expression, group_by",
+    [
+        ("", None),
+        ("SUM(", None),
+        ("nope + 1", None),
+        ("SUM(SUM(volume_sold))", None),
+        ("volume_sold + SUM(volume_sold)", None),
+        ("volume_sold * 2", "category"),
+        ("SUM(volume_sold)", "nope"),
+        ("SUM(customer_name)", None),
+        ("by_category", "location"),
+    ],
+)
+def test_define_rejects(cells_db, expression, group_by):
+    with pytest.raises(QueryError):
+        define_formula(cells_db, "bad", expression, group_by, "tester")
+
+
+def test_define_rejects_taken_and_invalid_names(cells_db):
+    for name in ("total", "Total", "1x", "x" * 64):
+        with pytest.raises(QueryError):
+            define_formula(cells_db, name, "SUM(volume_sold)", None, "tester")
+
+
+def test_delete_refuses_formulas_in_use(cells_db):
+    assert delete_formula(cells_db, "missing") == ("missing", None)
+    outcome, dependents = delete_formula(cells_db, "by_category")
+    assert outcome == "in_use"
+    assert sorted(dependents) == ["share"]
+    assert delete_formula(cells_db, "share_total")[0] is None
+    assert "share_total" not in {f["name"] for f in list_formulas(cells_db)}
+
+
+def test_formula_routes(client):
+    name = f"liters_{next(_names)}"
+    response = client.post(
+        "/formulas", json={"name": name, "expression": "volume_sold * 3.785"}
+    )
+    assert response.status_code == 201
+    assert response.get_json()["formula"]["kind"] == "column"
+
+    # Taken names and bad expressions are refused
+    response = client.post("/formulas", json={"name": name, "expression": "1"})
+    assert response.status_code == 400
+    response = client.post("/formulas", json={"name": "x_y", "expression": "SUM("})
+    assert response.status_code == 400
+    assert client.post("/formulas", json={"expression": "1"}).status_code == 400
+
+    cell = f"cell_{next(_names)}"
+    client.post("/formulas", json={"name": cell, "expression": f"SUM({name})"})
+    assert client.delete(f"/formulas/{name}").status_code == 409
+    assert client.delete(f"/formulas/{cell}").status_code == 200
+    assert client.delete(f"/formulas/{cell}").status_code == 404
+    assert client.delete(f"/formulas/{name}").status_code == 200
+
+
+def test_read_pages_with_formula_columns(client):
+    name = f"liters_{next(_names)}"
+    client.post("/formulas", json={"name": name, "expression": "volume_sold * 2"})
+    for volume in ("1", "2", "3"):
+        client.post("/write", json=make_sale(volume_sold=volume))
+
+    url = f"/read?formulas={name}&sort=created_at&direction=desc&limit=2"
+    first = client.get(url).get_json()
+    second = client.get(f"{url}&cursor={first['next_cursor']}").get_json()
+    rows = first["sales_data"] + second["sales_data"]
+    assert [float(row[-1]) for row in rows[:3]] == [6, 4, 2]
+
+    assert client.get("/read?formulas=missing").status_code == 400
@@ -0,0 +1,14 @@
+"""Tests for password hashing in the worker pool."""
+
+from backend.utils import passwords
+
+
+def test_pool_hashes_and_shuts_down(monkeypatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_WORKERS", 1)
+    password_hash = passwords.make_password_hash("secret")
+    assert passwords.verify_password(password_hash, "secret")
+    assert not passwords.verify_password(password_hash, "wrong")
+    assert passwords._executor is not None
+
+    passwords.shutdown()
+    assert passwords._executor is None
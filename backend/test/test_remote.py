@@ -0,0 +1,118 @@
+"""Tests for the JSON protocol between readers and the writer process."""
+
+import os
+import threading
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+import pytest
+
+from backend.config.config import DEFAULT_WORKBOOK
+from backend.database import remote
+from backend.database.formulas import define_formula
+from backend.database.importer import SalesImportError
+from backend.database.mutations import add_sale
+from backend.database.remote import (
+    RemoteWriteError,
+    RemoteWriter,
+    WriterClient,
+    error_reply,
+    raise_error,
+    recv_message,
+    writer_authkey,
+)
+from backend.database.sales import QueryError
+from backend.database.write_service import handle, serve_connection
+from backend.test.conftest import make_sale
+
+AUTHKEY = b"test-key"
+
+
+@pytest.fixture
+def remote_writer(app, tmp_path):
+    """A RemoteWriter talking to this process's writer over a Unix socket."""
+    address = os.path.join(tmp_path, "writer.sock")
+    listener = Listener(address, authkey=AUTHKEY)
+
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+            except AuthenticationError:
+                continue
+            except OSError:
+                # Closed
+                return
+            threading.Thread(target=serve_connection, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    client = WriterClient(address, AUTHKEY)
+    yield RemoteWriter(DEFAULT_WORKBOOK, client), address
+    client.close()
+    listener.close()
+
+
+def test_authkey_is_required_outside_development(monkeypatch):
+    monkeypatch.setattr(remote, "WRITER_AUTHKEY", "")
+    monkeypatch.setattr(remote, "DEVELOPMENT", False)
+    with pytest.raises(RuntimeError):
+        writer_authkey()
+    monkeypatch.setattr(remote, "DEVELOPMENT", True)
+    assert writer_authkey() == remote.DEVELOPMENT_AUTHKEY
+    monkeypatch.setattr(remote, "WRITER_AUTHKEY", "secret")
+    assert writer_authkey() == b"secret"
+
+
+@pytest.mark.parametrize("op", ["__import__", "system", "serve", "handle"])
+def test_only_listed_operations_run(app, op):
+    reply = handle({"op": op, "workbook": DEFAULT_WORKBOOK, "args": ["id"]})
+    assert reply["error"] == "RemoteWriteError"
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        None,
+        [],
+        {"op": "add_sale"},
+        {"op": "add_sale", "workbook": DEFAULT_WORKBOOK, "args": {"a": 1}},
+    ],
+)
+def test_malformed_requests_get_errors(app, message):
+    assert "error" in handle(message)
+
+
+def test_errors_keep_their_type():
+    with pytest.raises(QueryError, match="bad"):
+        raise_error(error_reply(QueryError("bad")))
+    with pytest.raises(SalesImportError) as caught:
+        raise_error(error_reply(SalesImportError("rows", [{"row": 2}])))
+    assert caught.value.errors == [{"row": 2}]
+    with pytest.raises(RemoteWriteError, match="KeyError"):
+        raise_error(error_reply(KeyError("x")))
+
+
+def test_writes_round_trip(remote_writer):
+    writer, _ = remote_writer
+    sale_id, version, cells, changes = writer.run(add_sale, make_sale(), "tester")
+    assert version >= 1
+    assert changes[0]["id"] == sale_id
+    assert writer.stats()["calls"] == 1
+
+    with pytest.raises(QueryError):
+        writer.run(define_formula, "bad", "SUM(", None, "tester")
+    assert writer.stats()["errors"] == 1
+
+
+def test_pickles_are_not_loaded(remote_writer):
+    _, address = remote_writer
+    with Client(address, authkey=AUTHKEY) as conn:
+        conn.send(("run", DEFAULT_WORKBOOK, (print, ("hello",), {}, 1)))
+        reply = recv_message(conn)
+    assert reply["error"] == "RemoteWriteError"
+    assert "Malformed request" in reply["message"]
+
+
+def test_wrong_authkey_is_refused(remote_writer):
+    _, address = remote_writer
+    with pytest.raises(AuthenticationError):
+        Client(address, authkey=b"wrong")
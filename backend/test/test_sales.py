@@ -0,0 +1,183 @@
+"""Tests for sales paging, cursors and validation."""
+
+import pytest
+
+from backend.database.sales import (
+    QueryError,
+    decode_cursor,
+    encode_cursor,
+    insert_sales,
+    parse_sales_query,
+    query_sales,
+    update_sale,
+    validate_sale,
+)
+from backend.test.conftest import make_sale
+from backend.utils.cache import response_cache
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2024-01-02", 7)
+    assert decode_cursor(cursor, "date") == ("2024-01-02", 7)
+
+
+@pytest.mark.parametrize(
+    "sort, value",
+    [
+        ("date", "x"),
+        ("date", 5),
+        ("volume_sold", "x"),
+        ("volume_sold", "NaN"),
+        ("created_at", "yesterday"),
+        ("customer_name", None),
+    ],
+)
+def test_cursor_value_must_fit_sort_column(sort, value):
+    with pytest.raises(QueryError):
+        decode_cursor(encode_cursor(value, 5), sort)
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "WyJ4Il0", "WyJ4Iix0cnVlXQ"])
+def test_malformed_cursor(cursor):
+    with pytest.raises(QueryError):
+        decode_cursor(cursor, "date")
+
+
+def test_parse_sales_query_checks_cursor_against_sort():
+    cursor = encode_cursor("10.50", 3)
+    assert parse_sales_query({"sort": "volume_sold", "cursor": cursor})["cursor"]
+    with pytest.raises(QueryError):
+        parse_sales_query({"sort": "date", "cursor": cursor})
+
+
+def test_keyset_pages_cover_every_row_once(db):
+    sales = [
+        make_sale(date=f"2024-01-{day:02d}", volume_sold=str(day % 3))
+        for day in range(1, 26)
+    ]
+    insert_sales(db, sales, "tester")
+    for sort in ("date", "volume_sold", "invoice_number"):
+        for direction in ("asc", "desc"):
+            seen = []
+            cursor = None
+            while True:
+                rows, next_cursor = query_sales(
+                    db, sort=sort, direction=direction, limit=4, cursor=cursor
+                )
+                seen.extend(row[9] for row in rows)
+                if next_cursor is None:
+                    break
+                cursor = decode_cursor(next_cursor, sort)
+            assert sorted(seen) == list(range(1, 26))
+
+
+def test_read_rejects_cursor_of_wrong_type(client):
+    response = client.get("/read?cursor=WyJ4Iiw1XQ")
+    assert response.status_code == 400
+    response = client.get("/read?sort=volume_sold&cursor=WyJ4Iiw1XQ")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [
+        ("volume_sold", "nan"),
+        ("volume_sold", "inf"),
+        ("volume_sold", "1e3"),
+        ("volume_sold", 1e12),
+        ("volume_sold", "100000000"),
+        ("volume_sold", True),
+        ("volume_sold", "ten"),
+        ("date", "20240102"),
+        ("date", "2024-02-30"),
+        ("date", 20240102),
+    ],
+)
+def test_validate_sale_rejects(field, value):
+    assert validate_sale(make_sale(**{field: value})) is not None
+
+
+@pytest.mark.parametrize("volume", ["10", "10.25", 7, 2.5, "-3.5", "99999999.99"])
+def test_validate_sale_accepts(volume):
+    assert validate_sale(make_sale(volume_sold=volume)) is None
+
+
+def test_write_batch_reports_invalid_rows(client):
+    rows = [make_sale(), make_sale(volume_sold="nan"), make_sale(date="20240102")]
+    response = client.post("/write_batch", json={"rows": rows})
+    assert response.status_code == 400
+    assert [error["index"] for error in response.get_json()["errors"]] == [1, 2]
+
+
+def test_write_rejects_non_finite_volume(client):
+    response = client.post("/write", json=make_sale(volume_sold="inf"))
+    assert response.status_code == 400
+
+
+def test_update_sale_checks_row_version(db):
+    (sale_id,) = insert_sales(db, [make_sale()], "tester")
+    assert update_sale(db, sale_id, 1, {"volume_sold": "2.50"}) == 2
+    assert update_sale(db, sale_id, 1, {"volume_sold": "3.50"}) is None
+    assert update_sale(db, sale_id, 2, {"volume_sold": "3.50"}) == 3
+
+
+def test_update_conflicts(client):
+    sale_id = client.post("/write", json=make_sale()).get_json()["id"]
+    response = client.post(
+        "/update", json={"id": sale_id, "row_version": 1, "volume_sold": "7"}
+    )
+    assert response.status_code == 200
+    assert response.get_json()["row_version"] == 2
+
+    # An edit based on the old version is refused with the current row
+    response = client.post(
+        "/update", json={"id": sale_id, "row_version": 1, "volume_sold": "8"}
+    )
+    assert response.status_code == 409
+    assert response.get_json()["row"][-1] == 2
+
+    taken = make_sale()
+    client.post("/write", json=taken)
+    response = client.post(
+        "/update",
+        json={
+            "id": sale_id,
+            "row_version": 2,
+            "invoice_number": taken["invoice_number"],
+        },
+    )
+    assert response.status_code == 409
+
+    response = client.post(
+        "/update", json={"id": 0, "row_version": 1, "volume_sold": "1"}
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("field", ["customer_name", "invoice_number"])
+def test_update_indexed_columns(client, field):
+    sale = make_sale()
+    sale_id = client.post("/write", json=sale).get_json()["id"]
+    value = f"{sale[field]}-edited"
+    for row_version in (1, 2):
+        response = client.post(
+            "/update", json={"id": sale_id, "row_version": row_version, field: value}
+        )
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()["row_version"] == row_version + 1
+        value = sale[field]
+
+
+def test_read_data_page_is_cached(client):
+    client.post("/write", json=make_sale())
+    url = "/read_data?sort=created_at&limit=5"
+    first = client.get(url).get_json()
+    assert first["active_users"] == [] and first["categories"]
+
+    hits = response_cache.stats()["hits"]
+    assert client.get(url).get_json() == first
+    assert response_cache.stats()["hits"] == hits + 1
+
+    # A write makes the cached page stale
+    client.post("/write", json=make_sale(customer_name="Newest"))
+    assert client.get(url).get_json()["sales_data"][0] != first["sales_data"][0]
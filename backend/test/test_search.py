@@ -0,0 +1,84 @@
+"""Tests for the sales search index."""
+
+import pytest
+
+from backend.database import search
+from backend.database.sales import insert_sales
+from backend.database.search import compact_search_terms, index_range, search_sales
+from backend.test.conftest import make_sale
+
+
+def add_sales(db, sales):
+    ids = insert_sales(db, sales, "tester")
+    index_range(db, ids[0], ids[-1])
+    return ids
+
+
+def postings(db):
+    return db.execute("SELECT term, sale_id FROM sales_search_terms").fetchall()
+
+
+def search_state(db):
+    return db.execute(
+        "SELECT sorted_postings, unsorted_postings FROM sales_search_state"
+    ).fetchone()
+
+
+@pytest.fixture
+def compact_often(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_COMPACT_MIN_POSTINGS", 10)
+    monkeypatch.setattr(search, "SEARCH_UNSORTED_RATIO", 0.5)
+
+
+def test_appended_postings_are_counted(db):
+    add_sales(db, [make_sale(customer_name="Zed")])
+    add_sales(db, [make_sale(customer_name="Amy")])
+    sorted_postings, unsorted_postings = search_state(db)
+    assert sorted_postings == 0
+    assert unsorted_postings == len(postings(db))
+    assert postings(db) != sorted(postings(db))
+
+
+def test_compaction_sorts_the_index(db):
+    add_sales(db, [make_sale(customer_name="Zed")])
+    add_sales(db, [make_sale(customer_name="Amy")])
+    before = search_sales(db, ["amy"])
+
+    assert compact_search_terms(db) == len(postings(db))
+    assert postings(db) == sorted(postings(db))
+    assert search_state(db) == (len(postings(db)), 0)
+    assert search_sales(db, ["amy"]) == before
+
+
+def test_index_is_compacted_past_the_unsorted_ratio(db, compact_often):
+    add_sales(db, [make_sale(customer_name=name) for name in ("Zed", "Yan", "Xia")])
+    assert search_state(db)[1] == 0
+    assert postings(db) == sorted(postings(db))
+
+    # One more sale stays under half of the sorted postings
+    add_sales(db, [make_sale(customer_name="Amy")])
+    assert search_state(db)[1] > 0
+
+
+def test_search_reports_truncation(db, monkeypatch):
+    add_sales(db, [make_sale(customer_name=f"Acme {i}") for i in range(20)])
+
+    rows, _, truncated = search_sales(db, ["acme"], limit=50)
+    assert len(rows) == 20
+    assert not truncated
+
+    monkeypatch.setattr(search, "SEARCH_CANDIDATES", 5)
+    rows, _, truncated = search_sales(db, ["acme"], limit=50)
+    assert len(rows) < 20
+    assert truncated
+
+
+def test_search_route_returns_truncated(client):
+    client.post("/write", json=make_sale(customer_name="Quill"))
+    response = client.get("/search?q=quill")
+    assert response.status_code == 200
+    assert response.get_json()["truncated"] is False
+
+
+def test_search_rejects_empty_query(client):
+    assert client.get("/search?q=--").status_code == 400
@@ -0,0 +1,65 @@
+"""Tests for snapshot publishing and the readers' wait for fresh data."""
+
+import itertools
+import os
+
+import pytest
+
+from backend.config.config import WORKBOOK_DIR
+from backend.database import db as db_module
+from backend.database.db import SnapshotPool, Workbook
+from backend.database.mutations import add_sale
+from backend.database.snapshots import read_manifest
+from backend.test.conftest import make_sale
+
+_names = itertools.count(1)
+
+
+@pytest.fixture
+def workbook(monkeypatch):
+    # Copies are held back for far longer than the test takes
+    monkeypatch.setattr(db_module, "SNAPSHOT_MAX_LOAD", 0.001)
+    os.makedirs(WORKBOOK_DIR, exist_ok=True)
+    name = f"snapshots-{next(_names)}"
+    workbook = Workbook(name, os.path.join(WORKBOOK_DIR, f"{name}.duckdb"))
+    workbook.prepare()
+    yield workbook
+    workbook.close()
+
+
+def write(workbook):
+    return workbook.writer.run(add_sale, make_sale(), "tester")[1]
+
+
+def test_publishing_backs_off_unless_a_reader_waits(workbook):
+    assert workbook.publish()
+    write(workbook)
+    assert not workbook.publish(force=False)
+
+    workbook.want_publish()
+    assert workbook.publish(force=False)
+    # Nothing new was committed since
+    workbook.want_publish()
+    assert not workbook.publish(force=False)
+
+
+def test_snapshot_holds_the_committed_version(workbook):
+    version = write(workbook)
+    workbook.publish()
+    assert read_manifest(workbook.name)["version"] == version
+
+
+def test_readers_wait_for_a_version(workbook):
+    workbook.publish()
+    pool = SnapshotPool(workbook.name, poll_interval=0)
+    try:
+        version = pool.snapshot_version()
+        assert pool.wait_for(version, 0)
+        assert not pool.wait_for(version + 1, 0.05)
+
+        write(workbook)
+        workbook.publish()
+        assert pool.wait_for(version + 1, 1)
+        assert pool.snapshot_version() == version + 1
+    finally:
+        pool.close()
@@ -0,0 +1,37 @@
+"""Tests for the spreadsheet Socket.IO handlers."""
+
+from backend.extensions import socketio
+from backend.routes import spreadsheet
+
+
+def test_write_lock_is_taken_in_the_session_users_name(app, client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(spreadsheet, "get_redis", lambda: object())
+    monkeypatch.setattr(
+        spreadsheet,
+        "request_write_access",
+        lambda redis, username, workbook: calls.append(username) or (True, "ok"),
+    )
+    monkeypatch.setattr(
+        spreadsheet,
+        "release_write_access",
+        lambda redis, username, workbook: calls.append(username) or (True, "ok", None),
+    )
+    with client.session_transaction() as session:
+        username = session["username"]
+
+    socket = socketio.test_client(app, flask_test_client=client)
+    payload = {"username": "someone-else"}
+    assert socket.emit("request_write_access", payload, callback=True)["success"]
+    assert socket.emit("release_write_access", payload, callback=True)["success"]
+    assert calls == [username, username]
+    socket.disconnect()
+
+
+def test_write_lock_needs_a_login(app):
+    socket = socketio.test_client(app)
+    reply = socket.emit("request_write_access", {"username": "alice"}, callback=True)
+    assert reply == {"success": False, "message": "Please login first"}
+    reply = socket.emit("release_write_access", {"username": "alice"}, callback=True)
+    assert not reply["success"]
+    socket.disconnect()
@@ -0,0 +1,94 @@
+"""Tests for workbook ownership, sharing and creation limits."""
+
+import itertools
+
+import pytest
+
+from backend.database import db as db_module
+from backend.database.db import add_member, find_member
+from backend.extensions import socketio
+from backend.test.conftest import make_sale, sign_in
+
+_names = itertools.count(1)
+
+
+def username(client):
+    with client.session_transaction() as session:
+        return session["username"]
+
+
+def in_workbook(name):
+    return {"X-Workbook": name}
+
+
+@pytest.fixture
+def workbook(client):
+    name = f"owned-{next(_names)}"
+    assert client.post("/workbooks", json={"name": name}).status_code == 201
+    return name
+
+
+def test_workbook_without_members_is_shared(db):
+    assert find_member(db, "anyone") == "shared"
+    add_member(db, "alice", "owner", "alice")
+    assert find_member(db, "alice") == "owner"
+    assert find_member(db, "anyone") is None
+
+
+def test_only_members_open_a_workbook(app, client, workbook):
+    headers = in_workbook(workbook)
+    assert client.post("/write", json=make_sale(), headers=headers).status_code == 200
+    assert client.get("/read", headers=headers).status_code == 200
+
+    other = sign_in(app)
+    assert other.get("/read", headers=headers).status_code == 403
+    assert other.post("/write", json=make_sale(), headers=headers).status_code == 403
+    assert app.test_client().get("/read", headers=headers).status_code == 401
+    # The default workbook stays open to everyone
+    assert other.get("/read").status_code == 200
+
+
+def test_owner_shares_a_workbook(app, client, workbook):
+    other = sign_in(app)
+    members = f"/workbooks/{workbook}/members"
+    assert other.post(members, json={"username": username(other)}).status_code == 403
+
+    response = client.post(members, json={"username": username(other)})
+    assert response.status_code == 201
+    assert other.get("/read", headers=in_workbook(workbook)).status_code == 200
+    # Members cannot share it on
+    third = sign_in(app)
+    assert other.post(members, json={"username": username(third)}).status_code == 403
+
+    assert client.post(members, json={"username": username(other)}).status_code == 409
+    assert client.post(members, json={"username": "nobody"}).status_code == 404
+    assert other.get(members).get_json()["members"] == [
+        {"username": username(client), "role": "owner"},
+        {"username": username(other), "role": "member"},
+    ]
+    assert third.get(members).status_code == 403
+
+
+def test_creation_is_limited(app, monkeypatch):
+    monkeypatch.setattr(db_module, "WORKBOOKS_PER_USER", 1)
+    client = sign_in(app)
+    for status in (201, 403):
+        response = client.post("/workbooks", json={"name": f"mine-{next(_names)}"})
+        assert response.status_code == status
+
+    monkeypatch.setattr(db_module, "WORKBOOKS_PER_USER", 10)
+    monkeypatch.setattr(db_module, "MAX_WORKBOOKS", 0)
+    response = sign_in(app).post("/workbooks", json={"name": f"mine-{next(_names)}"})
+    assert response.status_code == 403
+
+
+def test_socket_needs_access(app, client, workbook):
+    socket = socketio.test_client(
+        app, query_string=f"workbook={workbook}", flask_test_client=client
+    )
+    assert socket.is_connected()
+    socket.disconnect()
+    other = socketio.test_client(
+        app, query_string=f"workbook={workbook}", flask_test_client=sign_in(app)
+    )
+    assert not other.is_connected()
@@ -0,0 +1,58 @@
+"""Tests for the group-commit writer."""
+
+import threading
+
+import duckdb
+import pytest
+
+from backend.database.writer import Writer
+
+
+@pytest.fixture
+def writer():
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE items (value INTEGER PRIMARY KEY)")
+    writer = Writer(conn.cursor, batch_delay=0.2)
+    yield writer, conn
+    writer.close()
+    conn.close()
+
+
+def insert(db, value):
+    db.execute("INSERT INTO items VALUES (?)", (value,))
+    return value
+
+
+def test_failed_job_is_dropped_and_the_batch_replayed(writer):
+    writer, conn = writer
+    # Hold the writer so the next three jobs land in one batch
+    started, release = threading.Event(), threading.Event()
+    blocker = writer.submit(lambda db: started.set() or release.wait())
+    started.wait()
+    futures = [writer.submit(insert, value) for value in (1, 1, 2)]
+    release.set()
+
+    assert blocker.result(5)
+    assert futures[0].result(5) == 1
+    with pytest.raises(duckdb.ConstraintException):
+        futures[1].result(5)
+    assert futures[2].result(5) == 2
+    assert conn.execute("SELECT value FROM items ORDER BY value").fetchall() == [
+        (1,),
+        (2,),
+    ]
+    assert writer.stats()["replays"] == 1
+
+
+def test_jobs_share_a_commit(writer):
+    writer, conn = writer
+    started, release = threading.Event(), threading.Event()
+    writer.submit(lambda db: started.set() or release.wait())
+    started.wait()
+    futures = [writer.submit(insert, value) for value in range(5)]
+    release.set()
+
+    assert [future.result(5) for future in futures] == list(range(5))
+    stats = writer.stats()
+    assert stats["jobs"] == 6
+    assert stats["commits"] == 2
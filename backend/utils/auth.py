@@ -6,6 +6,10 @@ from functools import wraps
 
 from flask import jsonify, session
 
+from backend.config.config import ADMIN_USERS, WRITE_LOCK_REQUIRED
+from backend.database.db import requested_workbook
+from backend.database.redis_client import check_write_access, get_redis
+
 
 def hash_password(password, salt=None):
     """Hash password with salt."""
@@ -26,3 +30,40 @@ def login_required(f):
         return f(*args, **kwargs)
 
     return decorated_function
+
+
+def admin_required(f):
+    """Decorator to require a login listed in ADMIN_USERS."""
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        username = session.get("username")
+        if not username:
+            return jsonify({"error": "Please login first"}), 401
+        if username not in ADMIN_USERS:
+            return jsonify({"error": "Admin access required"}), 403
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+def write_access_required(f):
+    """Decorator to require login, and the workbook's write lock when enforced."""
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        username = session.get("username")
+        if not username:
+            return jsonify({"error": "Please login first"}), 401
+        if WRITE_LOCK_REQUIRED:
+            redis_client = get_redis()
+            if not redis_client:
+                return jsonify({"error": "Failed to connect to Redis"}), 503
+            has_access, message = check_write_access(
+                redis_client, username, workbook=requested_workbook()
+            )
+            if not has_access:
+                return jsonify({"error": message}), 423
+        return f(*args, **kwargs)
+
+    return decorated_function
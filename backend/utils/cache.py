@@ -0,0 +1,249 @@
+"""Response cache keyed by data version, with ETag/304 revalidation.
+
+Responses are cached under (workbook, path, query string, data version).
+Every workbook has its own data version. A write bumps it, which makes the
+workbook's older entries unreachable at once. Entries live in a per-process
+LRU bounded by size and can also be shared between pods through Redis.
+
+A reader process (DB_ROLE=reader) keys responses on the data version of the
+snapshot it reads instead, which may trail the writer's by a moment; see
+db.wait_for_snapshot() for how a session still reads its own writes.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, request
+
+from backend.config.config import (
+    DB_ROLE,
+    DEFAULT_WORKBOOK,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_REDIS,
+    RESPONSE_CACHE_TTL,
+)
+from backend.database.changes import get_data_version
+from backend.database.db import (
+    current_workbook,
+    pooled_connection,
+    remember_write,
+    requested_workbook,
+)
+from backend.database.redis_client import get_redis
+
+VERSION_KEY = "data_version"
+CACHE_KEY_PREFIX = "response_cache:"
+
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by the total size of its values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Get a (body, mimetype) entry and mark it recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, body, mimetype):
+        """Store an entry, evicting least recently used ones to stay in budget."""
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[key] = (body, mimetype)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self, prefix=None):
+        """Drop every entry, or those whose key starts with ``prefix``."""
+        with self._lock:
+            if prefix is None:
+                self._entries.clear()
+                self._size = 0
+                return
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._size -= len(self._entries.pop(key)[0])
+
+    def stats(self):
+        """Get cache size and hit counters."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+response_cache = LRUCache(RESPONSE_CACHE_MAX_BYTES)
+
+# Workbook -> data version
+_versions = {}
+_version_lock = threading.Lock()
+
+
+def _version_key(workbook):
+    """Redis key of a workbook's shared data version."""
+    return VERSION_KEY if workbook == DEFAULT_WORKBOOK else f"{VERSION_KEY}:{workbook}"
+
+
+def _load_version(workbook):
+    """Read a workbook's data version from the database (once per process)."""
+    with pooled_connection(workbook) as db:
+        return get_data_version(db)
+
+
+def get_version():
+    """Get the request's workbook data version, without DuckDB when possible."""
+    if DB_ROLE == "reader":
+        # Responses hold what the snapshot holds, not the latest commit
+        return current_workbook().pool.snapshot_version()
+    workbook = requested_workbook()
+    if RESPONSE_CACHE_REDIS:
+        redis_client = get_redis()
+        if redis_client:
+            shared = redis_client.get(_version_key(workbook))
+            if shared is not None:
+                return int(shared)
+    version = _versions.get(workbook)
+    if version is None:
+        with _version_lock:
+            version = _versions.get(workbook)
+            if version is None:
+                version = _versions[workbook] = _load_version(workbook)
+    return version
+
+
+def bump_version(version):
+    """Record a committed write so the workbook's older responses go stale."""
+    if DB_ROLE == "reader":
+        # This session's next reads wait for a snapshot holding the write
+        remember_write(version)
+    workbook = requested_workbook()
+    with _version_lock:
+        current = _versions.get(workbook)
+        if current is not None and version <= current:
+            return
+        _versions[workbook] = version
+    response_cache.clear(f"{workbook}:")
+    if RESPONSE_CACHE_REDIS:
+        redis_client = get_redis()
+        if redis_client:
+            # Only ever move the shared version forward
+            redis_client.eval(
+                "if tonumber(redis.call('GET', KEYS[1]) or '0') < tonumber(ARGV[1]) "
+                "then redis.call('SET', KEYS[1], ARGV[1]) end",
+                1,
+                _version_key(workbook),
+                version,
+            )
+
+
+def _cache_key(version):
+    """Build the cache key for the current request at a data version."""
+    args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return f"{requested_workbook()}:{request.path}?{args}@{version}"
+
+
+def _make_etag(key):
+    """Derive a strong ETag from a cache key."""
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _lookup(key):
+    """Find a cached entry locally, then in Redis when sharing is enabled."""
+    entry = response_cache.get(key)
+    if entry is None and RESPONSE_CACHE_REDIS:
+        redis_client = get_redis()
+        if redis_client:
+            shared = redis_client.hgetall(CACHE_KEY_PREFIX + key)
+            if shared:
+                entry = (shared["body"].encode(), shared["mimetype"])
+                response_cache.set(key, *entry)
+    return entry
+
+
+def _store(key, body, mimetype):
+    """Cache an entry locally, and in Redis when sharing is enabled."""
+    response_cache.set(key, body, mimetype)
+    if RESPONSE_CACHE_REDIS:
+        redis_client = get_redis()
+        if redis_client:
+            redis_key = CACHE_KEY_PREFIX + key
+            pipe = redis_client.pipeline()
+            pipe.hset(redis_key, mapping={"body": body, "mimetype": mimetype})
+            pipe.expire(redis_key, RESPONSE_CACHE_TTL)
+            pipe.execute()
+
+
+def cached_response(view):
+    """Serve a GET view from the versioned cache and honour If-None-Match."""
+
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        version = get_version()
+        key = _cache_key(version)
+        etag = _make_etag(key)
+
+        # Weak comparison: compression turns the ETag weak (see compression.py)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        entry = _lookup(key)
+        if entry is None:
+            result = view(*args, **kwargs)
+            response = result if isinstance(result, Response) else None
+            if response is None or response.status_code != 200:
+                return result
+            body = response.get_data()
+            # Only cache if no write landed while the view was running
+            if get_version() == version:
+                _store(key, body, response.mimetype)
+            entry = (body, response.mimetype)
+
+        response = Response(entry[0], mimetype=entry[1])
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    return decorated_function
+
+
+def cached_json(build):
+    """Get ``build()``'s result through the versioned cache.
+
+    For views that add state the data version does not cover, like the
+    write queue, to cached data, so cached_response cannot cache them whole.
+    The result must be JSON serializable; a cached one comes back decoded.
+    """
+    version = get_version()
+    key = _cache_key(version)
+    entry = _lookup(key)
+    if entry is not None:
+        return current_app.json.loads(entry[0])
+    value = build()
+    # Only cache if no write landed while building it
+    if get_version() == version:
+        _store(key, current_app.json.dumps(value).encode(), "application/json")
+    return value
@@ -0,0 +1,94 @@
+"""gzip and brotli compression of responses, negotiated by Accept-Encoding.
+
+Brotli is offered when the ``brotli`` package is installed. Responses from
+the versioned response cache carry a strong ETag, so their compressed bodies
+are cached too, keyed by ETag and encoding. A repeat read then costs neither
+a query nor a compression. Compressed responses get a weak ETag, because the
+bytes differ from the identity encoding.
+"""
+
+import gzip
+
+from flask import request
+
+from backend.config.config import (
+    COMPRESS_BROTLI_QUALITY,
+    COMPRESS_CACHE_MAX_BYTES,
+    COMPRESS_GZIP_LEVEL,
+    COMPRESS_MIN_BYTES,
+)
+from backend.database.db import run_blocking
+from backend.utils.cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Offered encodings, preferred first when the client rates them equally
+ENCODINGS = ["br", "gzip"] if brotli is not None else ["gzip"]
+COMPRESSIBLE_MIMETYPES = {
+    "application/javascript",
+    "application/json",
+    "application/x-ndjson",
+    "image/svg+xml",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+}
+
+compressed_cache = LRUCache(COMPRESS_CACHE_MAX_BYTES)
+
+
+def compress(body, encoding):
+    """Compress a body with gzip or brotli."""
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def _compressible(response):
+    """Whether a response is a complete, uncompressed body worth compressing."""
+    return (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and not response.is_streamed
+        and "Content-Encoding" not in response.headers
+        and response.mimetype in COMPRESSIBLE_MIMETYPES
+    )
+
+
+def init_app(app):
+    """Compress responses for clients that accept it."""
+
+    @app.after_request
+    def compress_response(response):
+        if not _compressible(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(ENCODINGS)
+        body = response.get_data()
+        if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+            return response
+
+        etag, weak = response.get_etag()
+        key = f"{etag}:{encoding}" if etag and not weak else None
+        entry = compressed_cache.get(key) if key else None
+        if entry is not None:
+            compressed = entry[0]
+        else:
+            # Large bodies take a while; keep the event loop free meanwhile
+            if run_blocking:
+                compressed = run_blocking(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            if key:
+                compressed_cache.set(key, compressed, encoding)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        if etag:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,159 @@
+"""Prometheus metrics for requests, DuckDB, Redis, the write lock and Socket.IO.
+
+Metrics live in the process-wide default registry and are served by
+``/metrics``. Label children are resolved once where possible, so each
+observation is a lock-protected add of a few microseconds.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, request
+from prometheus_client import Counter, Gauge, Histogram
+
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)  # fmt: skip
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # fmt: skip
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+FANOUT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+)
+QUERY_SECONDS = Histogram(
+    "duckdb_query_duration_seconds",
+    "DuckDB query latency by query name",
+    ["query"],
+    buckets=QUERY_BUCKETS,
+)
+QUERY_ROWS = Histogram(
+    "duckdb_query_rows",
+    "Rows returned by DuckDB queries by query name",
+    ["query"],
+    buckets=ROW_BUCKETS,
+)
+REDIS_SECONDS = Histogram(
+    "redis_command_duration_seconds",
+    "Redis round-trip latency by command; its count is the command count",
+    ["command"],
+    buckets=FAST_BUCKETS,
+)
+REDIS_ERRORS = Counter(
+    "redis_command_errors_total", "Redis commands that raised", ["command"]
+)
+LOCK_QUEUE_DEPTH = Gauge(
+    "write_lock_queue_depth", "Users waiting for the write lock, as last seen"
+)
+LOCK_WAIT_SECONDS = Histogram(
+    "write_lock_wait_seconds",
+    "Time from joining the write lock queue to being granted the lock",
+    buckets=(0, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600),
+)
+BROADCAST_SECONDS = Histogram(
+    "socketio_broadcast_duration_seconds",
+    "Time to emit a broadcast by event",
+    ["event"],
+    buckets=FAST_BUCKETS,
+)
+BROADCAST_FANOUT = Histogram(
+    "socketio_broadcast_fanout",
+    "Clients connected to this process when a broadcast was emitted",
+    ["event"],
+    buckets=FANOUT_BUCKETS,
+)
+CONNECTED_CLIENTS = Gauge(
+    "socketio_connected_clients", "Socket.IO clients connected to this process"
+)
+
+_clients = 0
+_clients_lock = threading.Lock()
+
+
+def init_app(app):
+    """Time every request by its route pattern."""
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(
+                time.perf_counter() - started
+            )
+        return response
+
+
+def timed_query(name, count_rows=len):
+    """Decorate a query function to record its duration and rows returned.
+
+    ``count_rows`` maps the function's result to a row count.
+    """
+    seconds = QUERY_SECONDS.labels(name)
+    rows = QUERY_ROWS.labels(name)
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            started = time.perf_counter()
+            result = f(*args, **kwargs)
+            seconds.observe(time.perf_counter() - started)
+            rows.observe(count_rows(result))
+            return result
+
+        return decorated_function
+
+    return decorator
+
+
+@contextmanager
+def timed_redis(command):
+    """Record one Redis round trip."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        REDIS_ERRORS.labels(command).inc()
+        raise
+    finally:
+        REDIS_SECONDS.labels(command).observe(time.perf_counter() - started)
+
+
+def observe_lock(queue_depth, waited_ms=None):
+    """Record the write lock queue depth and, when granted, how long it took."""
+    LOCK_QUEUE_DEPTH.set(queue_depth)
+    if waited_ms is not None:
+        LOCK_WAIT_SECONDS.observe(max(waited_ms, 0) / 1000)
+
+
+def client_connected():
+    """Count a Socket.IO connection."""
+    global _clients
+    with _clients_lock:
+        _clients += 1
+        CONNECTED_CLIENTS.set(_clients)
+
+
+def client_disconnected():
+    """Count a Socket.IO disconnection."""
+    global _clients
+    with _clients_lock:
+        _clients = max(_clients - 1, 0)
+        CONNECTED_CLIENTS.set(_clients)
+
+
+@contextmanager
+def timed_broadcast(event):
+    """Record a broadcast's duration and how many local clients it reaches."""
+    BROADCAST_FANOUT.labels(event).observe(_clients)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        BROADCAST_SECONDS.labels(event).observe(time.perf_counter() - started)
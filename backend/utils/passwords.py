@@ -0,0 +1,83 @@
+"""Password hashing in a small process pool.
+
+Werkzeug's scrypt/PBKDF2 hashes take tens of milliseconds of CPU each. Run
+on request threads, a burst of logins keeps the server busy hashing, and
+under eventlet or gevent it blocks the event loop outright. With
+PASSWORD_HASH_WORKERS above zero the hashing runs in worker processes
+instead, and the request thread (or green thread) just waits for the result.
+"""
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from backend.config.config import PASSWORD_HASH_TIMEOUT, PASSWORD_HASH_WORKERS
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _exit_with_parent():
+    """Stop a worker once the server is gone, however it exited."""
+
+    def watch():
+        multiprocessing.parent_process().join()
+        os._exit(0)
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def _get_executor():
+    """Start the worker processes on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Spawned, not forked: the server has DuckDB and threads open
+                _executor = ProcessPoolExecutor(
+                    PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_exit_with_parent,
+                )
+    return _executor
+
+
+def _run(func, *args):
+    """Run ``func`` in the pool, or inline when the pool is disabled or broken."""
+    global _executor
+    if PASSWORD_HASH_WORKERS <= 0:
+        return func(*args)
+    try:
+        return _get_executor().submit(func, *args).result(PASSWORD_HASH_TIMEOUT)
+    except BrokenProcessPool as e:
+        print(f"Warning: password hashing pool failed, restarting: {str(e)}")
+        with _executor_lock:
+            _executor = None
+        return func(*args)
+
+
+def make_password_hash(password):
+    """Hash a new password."""
+    return _run(generate_password_hash, password)
+
+
+def verify_password(password_hash, password):
+    """Check a password against its stored hash."""
+    return _run(check_password_hash, password_hash, password)
+
+
+def shutdown():
+    """Stop the worker processes; runs at interpreter exit."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+atexit.register(shutdown)
@@ -0,0 +1,382 @@
+"""Opt-in profiling of live requests and time-boxed process-wide sessions.
+
+With PROFILING_ENABLED, an admin can profile one request by sending an
+``X-Profile: sample`` (or ``cprofile``) header, or arm profiling of the next
+few requests to a path for everyone. A session instead samples every thread
+of the process for a fixed time, which covers the Socket.IO handlers and
+the writer thread.
+
+The sampler reads ``sys._current_frames()`` from a real OS thread and
+writes collapsed stacks (for flamegraph.pl or speedscope) or a speedscope
+JSON file to PROFILE_DIR. ``cprofile`` writes a pstats file instead. Under
+eventlet or gevent every request shares one OS thread, so a per-request
+sample also catches other requests running alongside it.
+"""
+
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import g, request, session
+
+from backend.config.config import (
+    ADMIN_USERS,
+    ASYNC_MODE,
+    PROFILE_DIR,
+    PROFILE_INTERVAL,
+    PROFILE_MAX_SECONDS,
+)
+
+MODES = ("sample", "cprofile")
+FORMATS = ("collapsed", "speedscope")
+EXTENSIONS = {
+    "collapsed": ".collapsed.txt",
+    "speedscope": ".speedscope.json",
+    "cprofile": ".prof",
+}
+
+
+class ProfilingError(ValueError):
+    """Raised for invalid profiling options."""
+
+
+class ProfilingBusyError(ProfilingError):
+    """Raised when a profiling session is already running."""
+
+
+def _real_threading():
+    """Get (start_new_thread, get_ident, sleep) working on OS threads.
+
+    Under eventlet or gevent the patched versions would make the sampler a
+    greenlet, which only runs when the request it samples yields.
+    """
+    if ASYNC_MODE == "eventlet":
+        from eventlet import patcher
+
+        thread = patcher.original("_thread")
+        return thread.start_new_thread, thread.get_ident, patcher.original("time").sleep
+    if ASYNC_MODE == "gevent":
+        from gevent import monkey
+
+        start_new_thread, get_ident = monkey.get_original(
+            "_thread", ["start_new_thread", "get_ident"]
+        )
+        return start_new_thread, get_ident, monkey.get_original("time", "sleep")
+    import _thread
+
+    return _thread.start_new_thread, _thread.get_ident, time.sleep
+
+
+class Sampler:
+    """Counts the (wall-clock) stacks of threads every ``interval`` seconds.
+
+    ``thread_id`` limits sampling to one thread. Otherwise each stack is
+    rooted at its thread's name so handlers on different threads stay apart.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.samples = 0
+        # Threads that are part of the profiler itself
+        self.ignored = set()
+        self.started = None
+        self.elapsed = 0.0
+        self._stop = False
+        self._done = False
+
+    def start(self):
+        """Start sampling on a new OS thread."""
+        start_new_thread, _, _ = _real_threading()
+        self.started = time.perf_counter()
+        start_new_thread(self._run, ())
+
+    def stop(self):
+        """Stop sampling and wait (briefly) for the sampler to finish."""
+        _, _, sleep = _real_threading()
+        self._stop = True
+        deadline = time.perf_counter() + 1
+        while not self._done and time.perf_counter() < deadline:
+            sleep(self.interval / 2)
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self):
+        _, get_ident, sleep = _real_threading()
+        own = get_ident()
+        names = {}
+        try:
+            while not self._stop:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own or thread_id in self.ignored:
+                        continue
+                    if self.thread_id is not None and thread_id != self.thread_id:
+                        continue
+                    stack = _stack(frame)
+                    if self.thread_id is None:
+                        if thread_id not in names:
+                            names = {t.ident: t.name for t in threading.enumerate()}
+                        name = names.get(thread_id, f"thread-{thread_id}")
+                        stack = (f"[{name}]",) + stack
+                    self.stacks[stack] += 1
+                self.samples += 1
+                sleep(self.interval)
+        finally:
+            self._done = True
+
+
+def _stack(frame):
+    """Describe a frame and its callers, outermost first."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+def collapsed(stacks):
+    """Render stack counts in the collapsed format, one stack per line."""
+    return "".join(
+        f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common()
+    )
+
+
+def speedscope(stacks, name, period):
+    """Render stack counts as a speedscope profile of ``period``-second samples."""
+    frames = []
+    index = {}
+    samples = []
+    weights = []
+    for stack, count in stacks.most_common():
+        sample = []
+        for entry in stack:
+            if entry not in index:
+                index[entry] = len(frames)
+                frames.append({"name": entry})
+            sample.append(index[entry])
+        samples.append(sample)
+        weights.append(count * period)
+    return json.dumps(
+        {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+            "name": name,
+        }
+    )
+
+
+def _file_name(label, extension):
+    """Build a unique, sortable profile file name."""
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", label).strip("-")[:60] or "profile"
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return f"{stamp}-{slug}-{uuid.uuid4().hex[:6]}{extension}"
+
+
+def save_samples(sampler, label, fmt):
+    """Write a sampler's stacks to PROFILE_DIR; return the file name."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = _file_name(label, EXTENSIONS[fmt])
+    if fmt == "speedscope":
+        # Weigh samples by the real time between them, sampling included
+        period = sampler.elapsed / max(sampler.samples, 1)
+        body = speedscope(sampler.stacks, label, period)
+    else:
+        body = collapsed(sampler.stacks)
+    with open(os.path.join(PROFILE_DIR, name), "w") as f:
+        f.write(body)
+    return name
+
+
+def save_cprofile(profiler, label):
+    """Write a cProfile profiler's stats to PROFILE_DIR; return the file name."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = _file_name(label, EXTENSIONS["cprofile"])
+    profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+    return name
+
+
+def list_profiles():
+    """List saved profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    entries = [
+        entry
+        for entry in os.scandir(PROFILE_DIR)
+        if entry.is_file() and entry.name.endswith(tuple(EXTENSIONS.values()))
+    ]
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    return [{"name": entry.name, "bytes": entry.stat().st_size} for entry in entries]
+
+
+def _validate(mode, fmt):
+    """Check a profiling mode and output format."""
+    if mode not in MODES:
+        raise ProfilingError(f"mode must be one of: {', '.join(MODES)}")
+    if fmt not in FORMATS:
+        raise ProfilingError(f"format must be one of: {', '.join(FORMATS)}")
+
+
+class ProfilingControl:
+    """Armed request profiling and the current process-wide session."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._armed = None
+        self._session = None
+
+    def arm(self, count, path=None, mode="sample", fmt="collapsed"):
+        """Profile the next ``count`` requests whose path starts with ``path``."""
+        _validate(mode, fmt)
+        if count < 0:
+            raise ProfilingError("requests must not be negative")
+        with self._lock:
+            self._armed = (
+                {"remaining": count, "path": path or "/", "mode": mode, "format": fmt}
+                if count
+                else None
+            )
+
+    def take(self, path):
+        """Claim one armed profile for a request path; return (mode, format)."""
+        with self._lock:
+            armed = self._armed
+            if armed is None or not path.startswith(armed["path"]):
+                return None
+            armed["remaining"] -= 1
+            if not armed["remaining"]:
+                self._armed = None
+            return armed["mode"], armed["format"]
+
+    def start_session(self, seconds, fmt="collapsed", interval=PROFILE_INTERVAL):
+        """Sample every thread for ``seconds``; return the file it will write."""
+        _validate("sample", fmt)
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise ProfilingError(f"seconds must be between 0 and {PROFILE_MAX_SECONDS}")
+        with self._lock:
+            if self._session is not None:
+                raise ProfilingBusyError("A profiling session is already running")
+            sampler = Sampler(interval)
+            ends_at = time.time() + seconds
+            self._session = {
+                "sampler": sampler,
+                "ends_at": ends_at,
+                "format": fmt,
+                "label": f"session-{seconds:g}s",
+            }
+        sampler.start()
+        start_new_thread, _, _ = _real_threading()
+        start_new_thread(self._finish_session, (seconds,))
+        return ends_at
+
+    def _finish_session(self, seconds):
+        """Stop the session after its time box and save what it sampled."""
+        _, get_ident, sleep = _real_threading()
+        running = self._session
+        running["sampler"].ignored.add(get_ident())
+        sleep(seconds)
+        running["sampler"].stop()
+        try:
+            name = save_samples(running["sampler"], running["label"], running["format"])
+            print(f"Saved profiling session to {name}")
+        except Exception as e:
+            print(f"Error saving profiling session: {str(e)}")
+        finally:
+            with self._lock:
+                self._session = None
+
+    def status(self):
+        """Describe armed request profiling and any running session."""
+        with self._lock:
+            armed = dict(self._armed) if self._armed else None
+            running = self._session
+            return {
+                "armed": armed,
+                "session": (
+                    {"ends_at": running["ends_at"], "format": running["format"]}
+                    if running
+                    else None
+                ),
+            }
+
+
+control = ProfilingControl()
+
+
+def _requested_profile():
+    """Get the (mode, format) to profile this request with, if any."""
+    header = request.headers.get("X-Profile")
+    if header and session.get("username") in ADMIN_USERS:
+        mode = "cprofile" if header.lower() == "cprofile" else "sample"
+        fmt = request.headers.get("X-Profile-Format", "collapsed")
+        return mode, fmt if fmt in FORMATS else "collapsed"
+    return control.take(request.path)
+
+
+def init_app(app):
+    """Profile requests that ask for it or were armed by an admin."""
+
+    @app.before_request
+    def start_profile():
+        profile = _requested_profile()
+        if profile is None:
+            return
+        mode, fmt = profile
+        if mode == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            # Under eventlet/gevent every request shares the OS thread
+            thread_id = threading.get_ident() if ASYNC_MODE == "threading" else None
+            profiler = Sampler(thread_id=thread_id)
+            profiler.start()
+        g.profile = (mode, fmt, profiler)
+
+    @app.after_request
+    def save_profile(response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+        mode, fmt, profiler = profile
+        label = f"{request.method} {request.path}"
+        try:
+            if mode == "cprofile":
+                profiler.disable()
+                name = save_cprofile(profiler, label)
+            else:
+                profiler.stop()
+                name = save_samples(profiler, label, fmt)
+            response.headers["X-Profile-File"] = name
+        except Exception as e:
+            print(f"Error saving request profile: {str(e)}")
+        return response
+
+    @app.teardown_request
+    def stop_profile(error=None):
+        # A request that raised never reached save_profile
+        profile = g.pop("profile", None)
+        if profile is not None:
+            mode, _, profiler = profile
+            if mode == "cprofile":
+                profiler.disable()
+            else:
+                profiler.stop()
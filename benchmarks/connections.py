@@ -0,0 +1,272 @@
+"""Connection-scaling benchmark for each serving mode.
+
+For every mode, the app is started through serve.py against a scratch
+database. The benchmark then holds N Socket.IO connections open and drives
+authenticated HTTP reads while they stay connected. It also counts how many
+connections receive the broadcast that follows a write.
+
+    python benchmarks/connections.py --modes threading,eventlet,gevent \\
+        --clients 100,500,1000 --duration 10
+
+The client side runs on gevent so that thousands of sockets fit in one
+process. It needs ``gevent``, ``websocket-client`` and ``requests``.
+"""
+
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import resource  # noqa: E402
+import statistics  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+
+import gevent  # noqa: E402
+import requests  # noqa: E402
+import websocket  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER = {
+    "username": "bench",
+    "password": "bench-password",
+    "email": "bench@example.com",
+    "name": "Bench",
+}
+
+
+def raise_fd_limit():
+    """Allow as many open sockets as the hard limit permits."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def start_server(mode, port, db_path, env=None):
+    """Start serve.py in a subprocess and wait until /health answers.
+
+    ``env`` adds settings on top of the benchmark defaults.
+    """
+    env = dict(
+        os.environ,
+        ASYNC_MODE=mode,
+        DB_PATH=db_path,
+        SOCKETIO_MESSAGE_QUEUE="",
+        SOCKETIO_LOGGER="false",
+        FLASK_DEBUG="false",
+        **(env or {}),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "serve.py", "--mode", mode, "--port", str(port)],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health", timeout=1).ok:
+                return process
+        except requests.RequestException:
+            pass
+        gevent.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def login(base_url, seed_rows):
+    """Create the benchmark user, log in and seed some sales rows."""
+    session = requests.Session()
+    session.post(f"{base_url}/signup", json=USER, timeout=30)
+    session.post(f"{base_url}/login", json=USER, timeout=30).raise_for_status()
+    rows = [
+        {
+            "date": f"2024-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}",
+            "invoice_number": f"BENCH-{i}",
+            "customer_name": f"Customer {i % 50}",
+            "location": f"Location {i % 10}",
+            "product_name": f"Product {i % 20}",
+            "category": "Electronics",
+            "volume_sold": i % 100 + 1,
+            "unit": "pcs",
+        }
+        for i in range(seed_rows)
+    ]
+    if rows:
+        session.post(f"{base_url}/write_batch", json={"rows": rows}, timeout=120)
+    return session
+
+
+class SocketClient:
+    """A minimal Engine.IO v4 / Socket.IO v5 client over a raw WebSocket."""
+
+    def __init__(self, port):
+        self.port = port
+        self.connected = False
+        self.broadcasts = 0
+        self.ws = None
+
+    def run(self):
+        """Connect, then answer pings and count broadcasts until closed."""
+        try:
+            self.ws = websocket.create_connection(
+                f"ws://127.0.0.1:{self.port}/socket.io/?EIO=4&transport=websocket",
+                timeout=30,
+            )
+            self.ws.recv()  # Engine.IO open packet
+            self.ws.send("40")
+            if not self.ws.recv().startswith("40"):
+                return
+            self.connected = True
+            while True:
+                packet = self.ws.recv()
+                if packet == "2":
+                    self.ws.send("3")
+                elif packet.startswith('42["data_updated"'):
+                    self.broadcasts += 1
+        except Exception:
+            pass
+        finally:
+            self.connected = False
+
+    def close(self):
+        if self.ws is not None:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+
+
+def http_load(session, base_url, workers, duration):
+    """Drive GET /read_data from ``workers`` greenlets; return latencies and errors."""
+    latencies = []
+    errors = [0]
+    deadline = time.monotonic() + duration
+
+    def worker():
+        # Each greenlet needs its own connection pool
+        local = requests.Session()
+        local.cookies.update(session.cookies)
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                response = local.get(f"{base_url}/read_data?limit=100", timeout=30)
+                if response.ok:
+                    latencies.append(time.monotonic() - started)
+                else:
+                    errors[0] += 1
+            except requests.RequestException:
+                errors[0] += 1
+
+    gevent.joinall([gevent.spawn(worker) for _ in range(workers)])
+    return latencies, errors[0]
+
+
+def run_level(session, base_url, port, clients, workers, duration):
+    """Measure one mode at one connection count."""
+    sockets = [SocketClient(port) for _ in range(clients)]
+    greenlets = [gevent.spawn(client.run) for client in sockets]
+    # Give the server time to accept everyone
+    deadline = time.monotonic() + max(10, clients / 50)
+    while time.monotonic() < deadline:
+        if all(s.connected for s in sockets):
+            break
+        gevent.sleep(0.2)
+    connected = sum(s.connected for s in sockets)
+
+    latencies, errors = http_load(session, base_url, workers, duration)
+
+    try:
+        session.post(
+            f"{base_url}/write",
+            json={
+                "date": "2024-06-01",
+                "invoice_number": f"BROADCAST-{clients}-{time.time_ns()}",
+                "customer_name": "Broadcast",
+                "location": "Bench",
+                "product_name": "Probe",
+                "category": "Electronics",
+                "volume_sold": 1,
+                "unit": "pcs",
+            },
+            timeout=30,
+        )
+    except requests.RequestException:
+        pass
+    gevent.sleep(3)
+    delivered = sum(s.broadcasts > 0 for s in sockets)
+    still_connected = sum(s.connected for s in sockets)
+
+    # Stop the readers first; closing waits on the lock a blocked recv holds
+    gevent.killall(greenlets, timeout=5)
+    for client in sockets:
+        client.close()
+
+    latencies.sort()
+    return {
+        "clients": clients,
+        "connected": connected,
+        "still_connected": still_connected,
+        "requests_per_second": round(len(latencies) / duration, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "p99_ms": (
+            round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1)
+            if latencies
+            else None
+        ),
+        "http_errors": errors,
+        "broadcast_delivered": delivered,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modes", default="threading,eventlet,gevent")
+    parser.add_argument("--clients", default="100,500,1000")
+    parser.add_argument("--workers", type=int, default=20, help="HTTP load greenlets")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load")
+    parser.add_argument("--seed-rows", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    print(f"Open file limit: {raise_fd_limit()}")
+    results = []
+    for index, mode in enumerate(args.modes.split(",")):
+        port = args.port + index
+        with tempfile.TemporaryDirectory() as scratch:
+            server = start_server(mode, port, os.path.join(scratch, "bench.db"))
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                session = login(base_url, args.seed_rows)
+                for clients in [int(c) for c in args.clients.split(",")]:
+                    result = run_level(
+                        session, base_url, port, clients, args.workers, args.duration
+                    )
+                    result["mode"] = mode
+                    results.append(result)
+                    if not args.json:
+                        print(
+                            f"{mode:>9} {clients:>6} clients: "
+                            f"{result['connected']:>6} connected, "
+                            f"{result['still_connected']:>6} still connected, "
+                            f"{result['requests_per_second']:>8} req/s, "
+                            f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+                            f"{result['http_errors']} errors, "
+                            f"broadcast reached {result['broadcast_delivered']}"
+                        )
+            finally:
+                server.kill()
+                server.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Seeded synthetic data for benchmarks.
+
+Builds a database with ``users``, ``categories`` and ``sales`` rows through the
+normal migrations and import path, so the rollups, search index and change
+log match what the app would have built itself. The same seed and row count
+give the same data on the same DuckDB version.
+
+    python benchmarks/datagen.py bench.db --rows 1000000 --seed 42
+
+Every generated user logs in with BENCH_PASSWORD.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import duckdb
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.database.changes import record_reset  # noqa: E402
+from backend.database.importer import drop_stage, merge_stage  # noqa: E402
+from backend.database.migrations import DEFAULT_CATEGORIES, run_migrations  # noqa: E402
+from backend.database.rollups import add_range_to_rollups  # noqa: E402
+from backend.database.search import index_range  # noqa: E402
+
+BENCH_PASSWORD = "bench-password"
+# Rows merged per transaction, which bounds the memory a 10M-row build needs
+CHUNK_ROWS = 1_000_000
+# Sale dates fall in the DAYS days starting at FIRST_DATE
+FIRST_DATE = "2020-01-01"
+DAYS = 5 * 365
+
+NAME_WORDS = [
+    "Acme", "Apex", "Atlas", "Blue", "Bright", "Cedar", "Coastal", "Crown",
+    "Delta", "Eagle", "Evergreen", "First", "Golden", "Granite", "Harbor",
+    "Iron", "Liberty", "Maple", "Metro", "North", "Oak", "Pacific", "Pioneer",
+    "Prime", "Red", "River", "Silver", "Summit", "Sun", "United", "Valley",
+    "West",
+]  # fmt: skip
+BUSINESS_WORDS = [
+    "Market", "Foods", "Grocers", "Trading", "Stores", "Supply", "Mart",
+    "Wholesale", "Distributors", "Deli", "Cafe", "Kitchen",
+]  # fmt: skip
+PLACE_WORDS = [
+    "Springfield", "Riverside", "Fairview", "Franklin", "Greenville", "Bristol",
+    "Clinton", "Salem", "Madison", "Georgetown", "Arlington", "Ashland",
+    "Dover", "Oxford", "Milton", "Newport", "Jackson", "Burlington",
+    "Manchester", "Hudson",
+]  # fmt: skip
+PRODUCT_WORDS = [
+    "Classic", "Zero", "Diet", "Original", "Light", "Extra", "Organic",
+    "Vanilla", "Cherry", "Lemon", "Mango", "Berry", "Mint", "Caramel", "Honey",
+    "Citrus",
+]  # fmt: skip
+UNITS = ["pcs", "cases", "bottles", "cans", "liters", "kg"]
+
+
+def scale(rows):
+    """Get (users, customers, locations, products, categories) for a row count."""
+    return (
+        min(max(rows // 20_000, 5), 500),
+        min(max(rows // 50, 100), 200_000),
+        min(max(rows // 5_000, 20), 2_000),
+        min(max(rows // 1_000, 50), 5_000),
+        min(max(rows // 100_000, len(DEFAULT_CATEGORIES)), 100),
+    )
+
+
+def _names(rng, count, first, second, fmt):
+    """Draw ``count`` distinct names from two word lists and a number."""
+    names = set()
+    while len(names) < count:
+        names.add(
+            fmt.format(rng.choice(first), rng.choice(second), rng.randrange(1000))
+        )
+    return sorted(names)
+
+
+def vocabulary(rows, seed):
+    """Build the users and value lists the sales rows are drawn from."""
+    rng = random.Random(seed)
+    users, customers, locations, products, categories = scale(rows)
+    extra = categories - len(DEFAULT_CATEGORIES)
+    return {
+        "users": [f"user{i:04d}" for i in range(1, users + 1)],
+        "customers": _names(rng, customers, NAME_WORDS, BUSINESS_WORDS, "{} {} {}"),
+        "locations": _names(
+            rng,
+            locations,
+            PLACE_WORDS,
+            ["North", "South", "East", "West", "Central"],
+            "{} {} {}",
+        ),
+        "products": _names(rng, products, PRODUCT_WORDS, PRODUCT_WORDS, "{} {} {}"),
+        "categories": [name for _, name, _ in DEFAULT_CATEGORIES]
+        + [f"Category {i:03d}" for i in range(1, extra + 1)],
+    }
+
+
+def _pick(column, salt, skewed=False):
+    """SQL picking a list element per row from a hash of the row and seed.
+
+    With ``skewed``, low positions come up far more often, the way a few
+    customers and products account for most sales.
+    """
+    fraction = f"((hash(i, $seed, {salt}) % 1000000) / 1000000.0)"
+    if skewed:
+        fraction = f"({fraction} * {fraction})"
+    return f"{column}[1 + CAST(floor({fraction} * len({column})) AS BIGINT)]"
+
+
+def _stage_chunk(db, table, start, count, seed, vocab):
+    """Create a staging table of generated sales, shaped like an import."""
+    db.execute(
+        f"""
+        CREATE TEMP TABLE {table} AS
+        SELECT
+            i AS source_row,
+            CAST(
+                DATE '{FIRST_DATE}' + CAST(hash(i, $seed, 1) % {DAYS} AS INTEGER)
+                AS VARCHAR
+            ) AS date,
+            'INV-' || $seed || '-' || lpad(CAST(i AS VARCHAR), 9, '0') AS invoice_number,
+            {_pick("customers", 2, skewed=True)} AS customer_name,
+            {_pick("locations", 3)} AS location,
+            {_pick("products", 4, skewed=True)} AS product_name,
+            {_pick("categories", 5)} AS category,
+            CAST(1 + hash(i, $seed, 6) % 50000 / 100.0 AS VARCHAR) AS volume_sold,
+            {_pick("units", 7)} AS unit,
+            {_pick("users", 8)} AS created_by
+        FROM range($start, $stop) t(i),
+            (
+                SELECT
+                    from_json($customers, '["VARCHAR"]') AS customers,
+                    from_json($locations, '["VARCHAR"]') AS locations,
+                    from_json($products, '["VARCHAR"]') AS products,
+                    from_json($categories, '["VARCHAR"]') AS categories,
+                    from_json($units, '["VARCHAR"]') AS units,
+                    from_json($users, '["VARCHAR"]') AS users
+            )
+        """,
+        {
+            "seed": seed,
+            "start": start,
+            "stop": start + count,
+            "customers": json.dumps(vocab["customers"]),
+            "locations": json.dumps(vocab["locations"]),
+            "products": json.dumps(vocab["products"]),
+            "categories": json.dumps(vocab["categories"]),
+            "units": json.dumps(UNITS),
+            "users": json.dumps(vocab["users"]),
+        },
+    )
+
+
+def _add_users(db, users):
+    """Insert the benchmark users, all with BENCH_PASSWORD."""
+    db.execute(
+        """
+        INSERT INTO users (id, username, password_hash, email, name)
+        SELECT nextval('users_id_seq'), username, ?, username || '@example.com',
+            'Bench ' || username
+        FROM (SELECT unnest(from_json(?, '["VARCHAR"]')) AS username)
+        """,
+        (generate_password_hash(BENCH_PASSWORD), json.dumps(users)),
+    )
+
+
+def _add_categories(db, categories):
+    """Insert the categories beyond the seeded defaults."""
+    next_id = len(DEFAULT_CATEGORIES) + 1
+    extra = categories[len(DEFAULT_CATEGORIES) :]
+    if extra:
+        db.executemany(
+            "INSERT OR IGNORE INTO categories (id, name, description) VALUES (?, ?, ?)",
+            [(next_id + i, name, f"Generated {name}") for i, name in enumerate(extra)],
+        )
+
+
+def generate(path, rows, seed=42, progress=None):
+    """Create a database at ``path`` with ``rows`` generated sales.
+
+    Returns a summary of what was generated.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+    report = progress or (lambda message: None)
+    vocab = vocabulary(rows, seed)
+
+    db = duckdb.connect(path)
+    try:
+        run_migrations(db)
+        db.begin()
+        _add_users(db, vocab["users"])
+        _add_categories(db, vocab["categories"])
+        db.commit()
+
+        for start in range(0, rows, CHUNK_ROWS):
+            count = min(CHUNK_ROWS, rows - start)
+            db.begin()
+            _stage_chunk(db, "bench_stage", start, count, seed, vocab)
+            first_id, inserted = merge_stage(db, "bench_stage", vocab["users"][0])
+            drop_stage(db, "bench_stage")
+            add_range_to_rollups(db, first_id, first_id + inserted - 1)
+            index_range(db, first_id, first_id + inserted - 1)
+            db.commit()
+            report(f"{start + count}/{rows} sales")
+
+        db.begin()
+        record_reset(db)
+        db.commit()
+        db.execute("CHECKPOINT")
+    finally:
+        db.close()
+
+    return {
+        "rows": rows,
+        "seed": seed,
+        "users": len(vocab["users"]),
+        "customers": len(vocab["customers"]),
+        "categories": len(vocab["categories"]),
+        "duckdb": duckdb.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="DuckDB file to create")
+    parser.add_argument("--rows", type=int, default=10_000, help="Sales rows")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="Replace an existing file")
+    args = parser.parse_args()
+
+    if args.force:
+        for suffix in ("", ".wal"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+
+    started = time.monotonic()
+    summary = generate(
+        args.path,
+        args.rows,
+        args.seed,
+        progress=lambda message: print(
+            f"[{time.monotonic() - started:7.1f}s] {message}"
+        ),
+    )
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
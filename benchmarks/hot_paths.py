@@ -0,0 +1,328 @@
+"""Latency of the app's hot paths at several data sizes.
+
+For each size, a seeded dataset is generated once (see datagen.py) and kept
+in ``--data-dir``. Each run works on a scratch copy, in a fresh process, so
+sizes do not share caches. Requests go through Flask's test client, which
+times the application without the network.
+
+    python benchmarks/hot_paths.py --sizes 10000,1000000,10000000 \\
+        --output results.json
+    python benchmarks/hot_paths.py --sizes 10000 --baseline results.json
+
+Results are JSON with the commit, environment and per-path latency
+percentiles, so runs from different commits can be compared. Paths that need
+Redis are reported as skipped when it is not reachable.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.datagen import BENCH_PASSWORD, generate  # noqa: E402
+
+DEFAULT_SIZES = "10000,1000000,10000000"
+
+
+def summarize(latencies, errors):
+    """Turn latencies in seconds into millisecond percentiles."""
+    if not latencies:
+        return {"count": 0, "errors": errors}
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return round(
+            latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 3
+        )
+
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "min_ms": round(latencies[0] * 1000, 3),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+def measure(operation, iterations, warmup):
+    """Time ``operation(i)``, which returns whether the call succeeded."""
+    for i in range(warmup):
+        operation(-1 - i)
+    latencies = []
+    errors = 0
+    for i in range(iterations):
+        started = time.perf_counter()
+        ok = operation(i)
+        elapsed = time.perf_counter() - started
+        if ok:
+            latencies.append(elapsed)
+        else:
+            errors += 1
+    return summarize(latencies, errors)
+
+
+def run_worker(iterations, warmup):
+    """Time every hot path against the database in DB_PATH; return results."""
+    from backend.app import create_app
+    from backend.database.changes import get_data_version
+    from backend.database.db import get_db
+    from backend.database.redis_client import get_redis
+    from backend.extensions import socketio
+    from backend.routes.spreadsheet import broadcast_data_update, broadcast_update
+    from backend.utils.cache import response_cache
+
+    app = create_app()
+    client = app.test_client()
+    with app.app_context():
+        username = get_db().execute("SELECT MIN(username) FROM users").fetchone()[0]
+    credentials = {"username": username, "password": BENCH_PASSWORD}
+    if client.post("/login", json=credentials).status_code != 200:
+        raise RuntimeError(f"Cannot log in as {username}")
+
+    def get_db_once(i):
+        with app.app_context():
+            return get_db() is not None
+
+    def login(i):
+        return client.post("/login", json=credentials).status_code == 200
+
+    def read(i):
+        # Every request misses the response cache
+        response_cache.clear()
+        return client.get("/read?limit=100").status_code == 200
+
+    def read_cached(i):
+        return client.get("/read?limit=100").status_code == 200
+
+    def read_data(i):
+        return client.get("/read_data?limit=100").status_code == 200
+
+    written = []
+
+    def write(i):
+        response = client.post(
+            "/write",
+            json={
+                "date": "2024-06-01",
+                "invoice_number": f"BENCH-{time.time_ns()}-{i}",
+                "customer_name": "Bench Customer",
+                "location": "Bench Location",
+                "product_name": "Bench Product",
+                "category": "Soda",
+                "volume_sold": 10,
+                "unit": "pcs",
+            },
+        )
+        if response.status_code != 200:
+            return False
+        written.append(response.get_json()["id"])
+        return True
+
+    def broadcast_data(i):
+        with app.app_context():
+            db = get_db()
+            broadcast_data_update(db, get_data_version(db), written[-1:], "insert")
+        return True
+
+    results = {
+        "get_db": measure(get_db_once, iterations, warmup),
+        "login": measure(login, iterations, warmup),
+        "read": measure(read, iterations, warmup),
+        "read_cached": measure(read_cached, iterations, warmup),
+        "read_data": measure(read_data, iterations, warmup),
+        "write": measure(write, iterations, warmup),
+        "broadcast_data_update": measure(broadcast_data, iterations, warmup),
+    }
+
+    if get_redis() is None:
+        for name in ("write_access_handlers", "broadcast_update"):
+            results[name] = {"skipped": "Redis is not reachable"}
+        return results
+
+    sockets = socketio.test_client(app, flask_test_client=client)
+
+    def write_access(i):
+        granted = sockets.emit(
+            "request_write_access", {"username": username}, callback=True
+        )
+        released = sockets.emit(
+            "release_write_access", {"username": username}, callback=True
+        )
+        return granted["success"] and released["success"]
+
+    def broadcast(i):
+        broadcast_update()
+        return True
+
+    results["write_access_handlers"] = measure(write_access, iterations, warmup)
+    results["broadcast_update"] = measure(broadcast, iterations, warmup)
+    sockets.disconnect()
+    return results
+
+
+def dataset(data_dir, rows, seed):
+    """Get the path of the generated dataset for a size, building it if needed."""
+    path = os.path.join(data_dir, f"sales-{rows}-seed{seed}.db")
+    if not os.path.exists(path):
+        print(f"Generating {rows} rows into {path}")
+        started = time.monotonic()
+        generate(path + ".tmp", rows, seed)
+        os.replace(path + ".tmp", path)
+        print(f"Generated in {time.monotonic() - started:.1f}s")
+    return path
+
+
+def run_size(path, rows, iterations, warmup):
+    """Benchmark one dataset in a fresh process on a scratch copy."""
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = os.path.join(scratch, "bench.db")
+        shutil.copyfile(path, db_path)
+        result_path = os.path.join(scratch, "result.json")
+        env = dict(
+            os.environ,
+            DB_PATH=db_path,
+            SOCKETIO_MESSAGE_QUEUE="",
+            SOCKETIO_LOGGER="false",
+            FLASK_DEBUG="false",
+        )
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--worker",
+                result_path,
+                "--iterations",
+                str(iterations),
+                "--warmup",
+                str(warmup),
+            ],
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        with open(result_path) as f:
+            return json.load(f)
+
+
+def git_commit():
+    """Get the current commit, marked dirty when the tree has changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except OSError:
+        return None
+
+
+def environment():
+    """Describe where the benchmark ran."""
+    from importlib.metadata import version
+
+    return {
+        "python": platform.python_version(),
+        "duckdb": version("duckdb"),
+        "flask": version("flask"),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(baseline, report):
+    """Print the p50 change of every path against a baseline report."""
+    before = {size["rows"]: size["results"] for size in baseline["sizes"]}
+    print(f"Against {baseline.get('commit')}:")
+    for size in report["sizes"]:
+        old = before.get(size["rows"])
+        if old is None:
+            continue
+        for name, result in size["results"].items():
+            if "p50_ms" not in result or "p50_ms" not in old.get(name, {}):
+                continue
+            change = (result["p50_ms"] / old[name]["p50_ms"] - 1) * 100
+            print(
+                f"{size['rows']:>10} {name:<22} {old[name]['p50_ms']:>10.3f} -> "
+                f"{result['p50_ms']:>10.3f} ms ({change:+.1f}%)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Sales row counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument(
+        "--data-dir",
+        default=os.path.join(ROOT, "benchmarks", "data"),
+        help="Where generated datasets are kept between runs",
+    )
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Report to compare this run against")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        results = run_worker(args.iterations, args.warmup)
+        with open(args.worker, "w") as f:
+            json.dump(results, f)
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    report = {
+        "commit": git_commit(),
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "environment": environment(),
+        "seed": args.seed,
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "sizes": [],
+    }
+    for rows in [int(size) for size in args.sizes.split(",")]:
+        path = dataset(args.data_dir, rows, args.seed)
+        print(f"Benchmarking {rows} rows")
+        results = run_size(path, rows, args.iterations, args.warmup)
+        report["sizes"].append({"rows": rows, "results": results})
+        for name, result in results.items():
+            if "skipped" in result:
+                print(f"  {name:<22} skipped: {result['skipped']}")
+            else:
+                print(
+                    f"  {name:<22} p50 {result['p50_ms']:>9.3f} ms  "
+                    f"p99 {result['p99_ms']:>9.3f} ms  {result['errors']} errors"
+                )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
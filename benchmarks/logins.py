@@ -0,0 +1,188 @@
+"""Login-storm benchmark: concurrent logins with and without the fast path.
+
+For every serving mode and configuration, the app is started through
+serve.py against a scratch database with ``--users`` accounts. Then
+``--workers`` clients log in back to back for ``--duration`` seconds while a
+probe polls ``/check_auth``, which shows whether logins starve other
+requests. The configurations are:
+
+- ``inline``: no user cache, passwords hashed on the request thread
+- ``cache``: user records cached, passwords hashed on the request thread
+- ``cache+pool``: user records cached, passwords hashed in worker processes
+
+    python benchmarks/logins.py --modes threading,eventlet --workers 50
+
+Like connections.py, the client side runs on gevent.
+"""
+
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import statistics  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+
+import gevent  # noqa: E402
+import requests  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.connections import raise_fd_limit, start_server  # noqa: E402
+
+PASSWORD = "bench-password"
+CONFIGS = {
+    "inline": {"USER_CACHE_SIZE": "0", "PASSWORD_HASH_WORKERS": "0"},
+    "cache": {"PASSWORD_HASH_WORKERS": "0"},
+    "cache+pool": {},
+}
+
+
+def percentiles(latencies):
+    """Summarize latencies in seconds as millisecond percentiles."""
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        index = min(int(len(latencies) * p), len(latencies) - 1)
+        return round(latencies[index] * 1000, 1)
+
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def create_users(base_url, count):
+    """Sign up ``count`` benchmark users; return their usernames."""
+    usernames = [f"login{i:04d}" for i in range(count)]
+    session = requests.Session()
+    for username in usernames:
+        session.post(
+            f"{base_url}/signup",
+            json={
+                "username": username,
+                "password": PASSWORD,
+                "email": f"{username}@example.com",
+                "name": username,
+            },
+            timeout=60,
+        ).raise_for_status()
+    return usernames
+
+
+def login_storm(base_url, usernames, workers, duration, probe_interval):
+    """Log in from ``workers`` greenlets while probing another endpoint."""
+    logins = []
+    probes = []
+    errors = [0]
+    deadline = time.monotonic() + duration
+
+    def worker(offset):
+        # Each greenlet needs its own connection pool
+        session = requests.Session()
+        attempt = offset
+        while time.monotonic() < deadline:
+            username = usernames[attempt % len(usernames)]
+            attempt += workers
+            started = time.monotonic()
+            try:
+                response = session.post(
+                    f"{base_url}/login",
+                    json={"username": username, "password": PASSWORD},
+                    timeout=60,
+                )
+                if response.ok:
+                    logins.append(time.monotonic() - started)
+                else:
+                    errors[0] += 1
+            except requests.RequestException:
+                errors[0] += 1
+
+    def probe():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                if session.get(f"{base_url}/check_auth", timeout=60).ok:
+                    probes.append(time.monotonic() - started)
+            except requests.RequestException:
+                pass
+            gevent.sleep(probe_interval)
+
+    greenlets = [gevent.spawn(worker, i) for i in range(workers)]
+    greenlets.append(gevent.spawn(probe))
+    gevent.joinall(greenlets)
+    return logins, probes, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modes", default="threading,eventlet")
+    parser.add_argument("--configs", default=",".join(CONFIGS))
+    parser.add_argument("--users", type=int, default=50, help="Distinct accounts")
+    parser.add_argument("--workers", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load")
+    parser.add_argument(
+        "--probe-interval", type=float, default=0.05, help="Seconds between probes"
+    )
+    parser.add_argument("--port", type=int, default=5200)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    results = []
+    port = args.port
+    for mode in args.modes.split(","):
+        for config in args.configs.split(","):
+            port += 1
+            with tempfile.TemporaryDirectory() as scratch:
+                server = start_server(
+                    mode, port, os.path.join(scratch, "bench.db"), CONFIGS[config]
+                )
+                try:
+                    base_url = f"http://127.0.0.1:{port}"
+                    usernames = create_users(base_url, args.users)
+                    logins, probes, errors = login_storm(
+                        base_url,
+                        usernames,
+                        args.workers,
+                        args.duration,
+                        args.probe_interval,
+                    )
+                finally:
+                    server.terminate()
+                    server.wait()
+            result = {
+                "mode": mode,
+                "config": config,
+                "logins_per_second": round(len(logins) / args.duration, 1),
+                "login": percentiles(logins),
+                "probe": percentiles(probes),
+                "errors": errors,
+            }
+            results.append(result)
+            if not args.json:
+                print(
+                    f"{mode:>9} {config:>10}: "
+                    f"{result['logins_per_second']:>7} logins/s, "
+                    f"login p50 {result['login']['p50_ms']} / "
+                    f"p99 {result['login']['p99_ms']} ms, "
+                    f"probe p50 {result['probe']['p50_ms']} / "
+                    f"p99 {result['probe']['p99_ms']} ms, "
+                    f"{errors} errors"
+                )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Payload size and encoding time of /read in the row and columnar formats.
+
+Loads one large page (100K rows by default) from a seeded dataset and, for
+each format, times fetching the page from DuckDB, encoding it as JSON and
+compressing it with each encoding. It also times the whole cold request
+through Flask's test client, with the response caches cleared.
+
+    python benchmarks/read_formats.py --rows 100000 --iterations 5
+
+The columnar format needs the ``columnar`` extra; brotli is measured when
+the ``brotli`` package is installed.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.hot_paths import dataset  # noqa: E402
+
+FORMATS = ["rows", "columnar"]
+
+
+def timed(func, iterations):
+    """Run ``func`` repeatedly; return (median milliseconds, last result)."""
+    times = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - started)
+    return round(statistics.median(times) * 1000, 1), result
+
+
+def run(rows, iterations):
+    """Measure both formats against the database in DB_PATH."""
+    from flask import jsonify
+
+    from backend.app import create_app
+    from backend.database.columnar import dumps, query_sales_columnar
+    from backend.database.db import get_db
+    from backend.database.sales import query_sales
+    from backend.utils.cache import response_cache
+    from backend.utils.compression import ENCODINGS, compress, compressed_cache
+
+    app = create_app()
+    client = app.test_client()
+    fetchers = {
+        "rows": lambda db: query_sales(db, limit=rows)[0],
+        "columnar": lambda db: query_sales_columnar(db, limit=rows)[0],
+    }
+    encoders = {
+        "rows": lambda data: jsonify({"sales_data": data}).get_data(),
+        "columnar": lambda data: dumps({"sales_data": data}),
+    }
+
+    results = []
+    for fmt in FORMATS:
+        with app.app_context():
+            db = get_db()
+            fetch_ms, data = timed(lambda: fetchers[fmt](db), iterations)
+            encode_ms, body = timed(lambda: encoders[fmt](data), iterations)
+        for encoding in ["identity"] + ENCODINGS:
+            compress_ms, wire = 0.0, body
+            if encoding != "identity":
+                compress_ms, wire = timed(lambda: compress(body, encoding), iterations)
+
+            def request():
+                response_cache.clear()
+                compressed_cache.clear()
+                return client.get(
+                    f"/read?limit={rows}&format={fmt}",
+                    headers={"Accept-Encoding": encoding},
+                )
+
+            request_ms, response = timed(request, iterations)
+            results.append(
+                {
+                    "format": fmt,
+                    "encoding": encoding,
+                    "fetch_ms": fetch_ms,
+                    "encode_ms": encode_ms,
+                    "compress_ms": compress_ms,
+                    "body_bytes": len(wire),
+                    "request_ms": request_ms,
+                    "response_bytes": len(response.data),
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000, help="Rows per page")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument(
+        "--data-dir",
+        default=os.path.join(ROOT, "benchmarks", "data"),
+        help="Where generated datasets are kept between runs",
+    )
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.worker, "w") as f:
+            json.dump(run(args.rows, args.iterations), f)
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    path = dataset(args.data_dir, args.rows, args.seed)
+    # Measure in a fresh process, configured for a scratch copy
+    with tempfile.TemporaryDirectory() as scratch:
+        db_path = os.path.join(scratch, "bench.db")
+        shutil.copyfile(path, db_path)
+        result_path = os.path.join(scratch, "result.json")
+        env = dict(
+            os.environ,
+            DB_PATH=db_path,
+            SALES_MAX_PAGE_SIZE=str(args.rows),
+            SOCKETIO_MESSAGE_QUEUE="",
+            SOCKETIO_LOGGER="false",
+            FLASK_DEBUG="false",
+        )
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--worker",
+                result_path,
+                "--rows",
+                str(args.rows),
+                "--iterations",
+                str(args.iterations),
+            ],
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        with open(result_path) as f:
+            results = json.load(f)
+
+    print(
+        f"{'format':>9} {'encoding':>9} {'fetch':>8} {'encode':>8} {'compress':>9} "
+        f"{'request':>9} {'bytes':>11}"
+    )
+    for result in results:
+        print(
+            f"{result['format']:>9} {result['encoding']:>9} "
+            f"{result['fetch_ms']:>6} ms {result['encode_ms']:>6} ms "
+            f"{result['compress_ms']:>7} ms {result['request_ms']:>7} ms "
+            f"{result['response_bytes']:>11,}"
+        )
+
+
+if __name__ == "__main__":
+    main()
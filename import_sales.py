@@ -0,0 +1,47 @@
+"""Import sales from a CSV or Parquet file straight into the database."""
+
+import argparse
+import time
+
+import duckdb
+
+from backend.config.config import DB_PATH
+from backend.database.importer import SalesImportError, import_file
+from backend.database.migrations import run_migrations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="CSV or Parquet file to import")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="File format")
+    parser.add_argument(
+        "--user", default="import", help="created_by for rows without one"
+    )
+    parser.add_argument("--db", default=DB_PATH, help="Path to the DuckDB file")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+
+    def progress(stage, **details):
+        elapsed = time.monotonic() - started
+        info = ", ".join(f"{k}={v}" for k, v in details.items())
+        print(f"[{elapsed:7.2f}s] {stage} {info}")
+
+    conn = duckdb.connect(args.db)
+    try:
+        run_migrations(conn)
+        result = import_file(
+            conn, args.path, args.user, fmt=args.format, progress=progress
+        )
+        print(f"Imported {result['rows']} rows (data version {result['version']})")
+    except SalesImportError as e:
+        print(f"Import failed: {str(e)}")
+        for error in e.errors:
+            print(f"  {error['error']}: {error['rows']} rows, e.g. {error['sample']}")
+        raise SystemExit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Apply pending database schema migrations."""
+
+from backend.database.migrations import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Run the application on an eventlet or gevent event loop for production.
+
+Every WebSocket is a green thread rather than an OS thread, and DuckDB calls
+are handed to a worker thread pool so they do not block the loop.
+
+    python serve.py --mode eventlet --port 5000
+
+Under gunicorn use a single worker per process with the matching worker
+class, e.g. ``ASYNC_MODE=eventlet gunicorn -k eventlet -w 1 serve:app``.
+"""
+
+import argparse
+import os
+
+# threading runs Werkzeug's threaded server, as a baseline for benchmarks
+MODES = ["eventlet", "gevent", "threading"]
+
+
+def patch(mode):
+    """Make the standard library cooperative before anything else imports it."""
+    os.environ["ASYNC_MODE"] = mode
+    if mode == "eventlet":
+        import eventlet
+
+        eventlet.monkey_patch()
+    elif mode == "gevent":
+        from gevent import monkey
+
+        monkey.patch_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--mode",
+        choices=MODES,
+        default=os.environ.get("ASYNC_MODE", "eventlet"),
+        help="Event loop to serve on",
+    )
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=5000, help="Port to listen on")
+    args = parser.parse_args()
+
+    patch(args.mode)
+
+    from backend.app import create_app
+    from backend.extensions import socketio
+
+    app = create_app()
+    print(f"Serving with {args.mode} on http://{args.host}:{args.port}")
+    socketio.run(
+        app,
+        host=args.host,
+        port=args.port,
+        debug=False,
+        log_output=False,
+        allow_unsafe_werkzeug=args.mode == "threading",
+    )
+
+
+if __name__ == "__main__":
+    main()
+elif __name__ != "__mp_main__" and os.environ.get("ASYNC_MODE") in (
+    "eventlet",
+    "gevent",
+):
+    # Imported by gunicorn, whose eventlet/gevent worker has already patched.
+    # Password hashing workers re-import this module as __mp_main__; skip it.
+    from backend.app import create_app
+
+    app = create_app()
@@ -6,7 +6,7 @@ setup(
     packages=find_packages(),
     install_requires=[
         "flask",
-        "duckdb",
+        "duckdb>=1.2.0",
         "redis",
         "werkzeug",
     ],
@@ -0,0 +1,52 @@
+"""Run the writer process for web workers started with DB_ROLE=reader.
+
+It owns the read-write DuckDB files, applies the writes every reader sends
+it, and publishes the read-only snapshots the readers query.
+
+    WRITER_AUTHKEY=... python write_server.py --port 5055
+    WRITER_AUTHKEY=... python write_server.py --socket /run/spreadsheet/writer.sock
+"""
+
+import argparse
+import os
+
+
+def main():
+    # Before anything reads the configuration
+    os.environ["DB_ROLE"] = "writer"
+
+    from backend.config.config import WRITER_HOST, WRITER_PORT, WRITER_SOCKET
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default=WRITER_HOST, help="Interface to bind")
+    parser.add_argument(
+        "--port", type=int, default=WRITER_PORT, help="Port to listen on"
+    )
+    parser.add_argument(
+        "--socket", default=WRITER_SOCKET, help="Listen on this Unix socket instead"
+    )
+    args = parser.parse_args()
+
+    from backend.database.remote import writer_authkey
+
+    # Refuse to start without a shared secret, before opening any workbook
+    authkey = writer_authkey()
+
+    from backend.app import create_app
+    from backend.database.db import workbooks
+    from backend.database.write_service import serve
+
+    # Sets up Socket.IO, so import progress still reaches clients, and opens
+    # (and migrates) the default workbook
+    create_app()
+    try:
+        serve(args.socket or (args.host, args.port), authkey)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Commits queued so far are written and published before exiting
+        workbooks.close_all()
+
+
+if __name__ == "__main__":
+    main()